@@ -24,6 +24,9 @@ from uuid import UUID
 import asyncpg
 from pydantic import BaseModel
 
+from db_2025.common.instrumentation import instrumented
+from db_2025.common.repository import CrudRepository
+
 # Base Models (as provided)
 class Provider(BaseModel):
     id: UUID
@@ -49,183 +52,67 @@ class Key(BaseModel):
     created_at: datetime
     cost_per_query: float
 
-# Repository Classes
-class ProviderRepository:
-    def __init__(self, pool: asyncpg.Pool):
-        self.pool = pool
+# Repository Classes (CRUD statements generated by CrudRepository)
+@instrumented('ai_proxy.providers')
+class ProviderRepository(CrudRepository):
+    model = Provider
+    table = 'ai.providers'
+    prefix = 'ai_proxy.providers'
+    order_by = ('name', 'id')
+    key_types = (str, UUID)
 
     async def create(self, name: str, url: str) -> Provider:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "INSERT INTO ai.providers (name, url) VALUES ($1, $2) RETURNING *",
-                name, url
-            )
-            return Provider(**row)
-
-    async def get_by_id(self, id: UUID) -> Provider | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "SELECT * FROM ai.providers WHERE id = $1",
-                id
-            )
-            return Provider(**row) if row else None
-
-    async def get_all(self, limit: int = 10, offset: int = 0) -> list[Provider]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT * FROM ai.providers ORDER BY name LIMIT $1 OFFSET $2",
-                limit, offset
-            )
-            return [Provider(**row) for row in rows]
+        return await self._insert(name=name, url=url)
 
     async def update(self, id: UUID, name: str, url: str) -> Provider | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "UPDATE ai.providers SET name = $2, url = $3 WHERE id = $1 RETURNING *",
-                id, name, url
-            )
-            return Provider(**row) if row else None
-
-    async def delete(self, id: UUID) -> bool:
-        async with self.pool.acquire() as conn:
-            result = await conn.execute(
-                "DELETE FROM ai.providers WHERE id = $1",
-                id
-            )
-            return result != "DELETE 0"
-
-class ModelRepository:
-    def __init__(self, pool: asyncpg.Pool):
-        self.pool = pool
+        return await self._update_values(id, name=name, url=url)
+
+@instrumented('ai_proxy.models')
+class ModelRepository(CrudRepository):
+    model = Model
+    table = 'ai.models'
+    prefix = 'ai_proxy.models'
+    order_by = ('name', 'id')
+    key_types = (str, UUID)
 
     async def create(self, name: str, description: str | None = None) -> Model:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "INSERT INTO ai.models (name, description) VALUES ($1, $2) RETURNING *",
-                name, description
-            )
-            return Model(**row)
-
-    async def get_by_id(self, id: UUID) -> Model | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "SELECT * FROM ai.models WHERE id = $1",
-                id
-            )
-            return Model(**row) if row else None
-
-    async def get_all(self, limit: int = 10, offset: int = 0) -> list[Model]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT * FROM ai.models ORDER BY name LIMIT $1 OFFSET $2",
-                limit, offset
-            )
-            return [Model(**row) for row in rows]
+        return await self._insert(name=name, description=description)
 
     async def update(self, id: UUID, name: str, description: str | None = None) -> Model | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "UPDATE ai.models SET name = $2, description = $3 WHERE id = $1 RETURNING *",
-                id, name, description
-            )
-            return Model(**row) if row else None
-
-    async def delete(self, id: UUID) -> bool:
-        async with self.pool.acquire() as conn:
-            result = await conn.execute(
-                "DELETE FROM ai.models WHERE id = $1",
-                id
-            )
-            return result != "DELETE 0"
-
-class UserRepository:
-    def __init__(self, pool: asyncpg.Pool):
-        self.pool = pool
+        return await self._update_values(id, name=name, description=description)
+
+@instrumented('ai_proxy.users')
+class UserRepository(CrudRepository):
+    model = User
+    table = 'ai.users'
+    prefix = 'ai_proxy.users'
+    generated = ('id', 'created_at')
+    order_by = ('created_at', 'id')
+    key_types = (datetime.fromisoformat, int)
+    descending = True
 
     async def create(self, name: str, active: bool) -> User:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "INSERT INTO ai.users (name, active) VALUES ($1, $2) RETURNING *",
-                name, active
-            )
-            return User(**row)
-
-    async def get_by_id(self, id: int) -> User | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "SELECT * FROM ai.users WHERE id = $1",
-                id
-            )
-            return User(**row) if row else None
-
-    async def get_all(self, limit: int = 10, offset: int = 0) -> list[User]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT * FROM ai.users ORDER BY created_at DESC LIMIT $1 OFFSET $2",
-                limit, offset
-            )
-            return [User(**row) for row in rows]
+        return await self._insert(name=name, active=active)
 
     async def update(self, id: int, name: str, active: bool) -> User | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "UPDATE ai.users SET name = $2, active = $3 WHERE id = $1 RETURNING *",
-                id, name, active
-            )
-            return User(**row) if row else None
-
-    async def delete(self, id: int) -> bool:
-        async with self.pool.acquire() as conn:
-            result = await conn.execute(
-                "DELETE FROM ai.users WHERE id = $1",
-                id
-            )
-            return result != "DELETE 0"
-
-class KeyRepository:
-    def __init__(self, pool: asyncpg.Pool):
-        self.pool = pool
+        return await self._update_values(id, name=name, active=active)
+
+@instrumented('ai_proxy.keys')
+class KeyRepository(CrudRepository):
+    model = Key
+    table = 'ai.keys'
+    prefix = 'ai_proxy.keys'
+    generated = ('id', 'created_at')
+    order_by = ('created_at', 'id')
+    key_types = (datetime.fromisoformat, UUID)
+    descending = True
 
     async def create(self, api_key: str, model_id: UUID, provider_id: UUID,
                     cost_per_query: float) -> Key:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "INSERT INTO ai.keys (api_key, model_id, provider_id, cost_per_query) "
-                "VALUES ($1, $2, $3, $4) RETURNING *",
-                api_key, model_id, provider_id, cost_per_query
-            )
-            return Key(**row)
-
-    async def get_by_id(self, id: UUID) -> Key | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "SELECT * FROM ai.keys WHERE id = $1",
-                id
-            )
-            return Key(**row) if row else None
-
-    async def get_all(self, limit: int = 10, offset: int = 0) -> list[Key]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT * FROM ai.keys ORDER BY created_at DESC LIMIT $1 OFFSET $2",
-                limit, offset
-            )
-            return [Key(**row) for row in rows]
+        return await self._insert(api_key=api_key, model_id=model_id, provider_id=provider_id,
+                                 cost_per_query=cost_per_query)
 
     async def update(self, id: UUID, api_key: str, model_id: UUID,
                     provider_id: UUID, cost_per_query: float) -> Key | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "UPDATE ai.keys SET api_key = $2, model_id = $3, provider_id = $4, "
-                "cost_per_query = $5 WHERE id = $1 RETURNING *",
-                id, api_key, model_id, provider_id, cost_per_query
-            )
-            return Key(**row) if row else None
-
-    async def delete(self, id: UUID) -> bool:
-        async with self.pool.acquire() as conn:
-            result = await conn.execute(
-                "DELETE FROM ai.keys WHERE id = $1",
-                id
-            )
-            return result != "DELETE 0"
\ No newline at end of file
+        return await self._update_values(id, api_key=api_key, model_id=model_id, provider_id=provider_id,
+                                        cost_per_query=cost_per_query)
@@ -3,6 +3,9 @@ from pydantic import BaseModel
 from uuid import UUID
 
 from db_2025.basics.model import User
+from db_2025.common.counts import CountService, CountMode
+from db_2025.common.instrumentation import instrumented
+from db_2025.common.repository import CrudRepository
 
 
 
@@ -22,36 +25,20 @@ class User(BaseModel):
 
 """
 
-class UserRepository:
-    def __init__(self, pool: asyncpg.Pool):
-        self.pool = pool
+@instrumented('basics.users')
+class UserRepository(CrudRepository):
+    model = User
+    table = 'users'
+    prefix = 'basics.users'
+    order_by = ('name', 'id')
+    key_types = (str, UUID)
 
-    async def create(self, name: str, age: int, active: bool = True) -> User:
-        query = """
-            INSERT INTO users (name, age, active)
-            VALUES ($1, $2, $3)
-            RETURNING *
-        """
-        async with self.pool.acquire() as connection:
-            record = await connection.fetchrow(query, name, age, active)
-            return User(**record)
-
-    async def get_by_id(self, user_id: UUID) -> User | None:
-        query = "SELECT * FROM users WHERE id = $1"
-        async with self.pool.acquire() as connection:
-            record = await connection.fetchrow(query, user_id)
-            return User(**record) if record else None
-
-    async def get_all(self, limit: int = 10, offset: int = 0) -> list[User]:
-        query = """
-            SELECT * FROM users 
-            ORDER BY name 
-            LIMIT $1 OFFSET $2
-        """
-        async with self.pool.acquire() as connection:
-            records = await connection.fetch(query, limit, offset)
-            return [User(**record) for record in records]
+    def __init__(self, pool: asyncpg.Pool, counts: CountService | None = None):
+        super().__init__(pool)
+        self.counts = counts or CountService(pool)
 
+    async def create(self, name: str, age: int, active: bool = True) -> User:
+        return await self._insert(name=name, age=age, active=active)
 
     async def update(self, user_id: UUID, name: str | None = None, age: int | None = None, active: bool | None = True) -> User | None:
         # Build the SET clause dynamically based on provided parameters
@@ -75,6 +62,7 @@ class UserRepository:
         if not updates:
             return await self.get_by_id(user_id)
 
+        # partial update: not the generated statement of CrudRepository
         query = f"""
             UPDATE users 
             SET {', '.join(updates)}
@@ -84,17 +72,9 @@ class UserRepository:
 
         async with self.pool.acquire() as connection:
             record = await connection.fetchrow(query, *params)
-            return User(**record) if record else None
-
-    async def delete(self, user_id: UUID) -> bool:
-        query = "DELETE FROM users WHERE id = $1 RETURNING id"
-        async with self.pool.acquire() as connection:
-            record = await connection.fetchrow(query, user_id)
-            return bool(record)
+            return self.to_model(record)
 
     # non-generated
 
-    async def get_user_count(self) -> int:
-        async with self.pool.acquire() as connection:
-            total = await connection.fetchval("SELECT COUNT(*) FROM users")
-            return total
+    async def get_user_count(self, mode: CountMode = CountMode.EXACT) -> int:
+        return await self.counts.count('users', mode)
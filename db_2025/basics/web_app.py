@@ -1,16 +1,17 @@
-import os
 from asyncio import gather, create_task
 
 import pytest
-from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from loguru import logger
 from pydantic import BaseModel, PositiveInt, ValidationError
 from uuid import UUID
-import asyncpg
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from db_2025.basics.model import User as UserModel
+from db_2025.common.counts import CountMode
+from db_2025.common.db import get_db_connection_pool
+from db_2025.common.instrumentation import prometheus_text, snapshot
 from user_repo import UserRepository  # Assuming the provided code is in user_repo.py
 
 app = FastAPI()
@@ -57,22 +58,8 @@ repo: UserRepository = None
 async def startup():
     global repo
 
-    load_dotenv()
-    db_url = os.getenv('DB_URL')
-
-    try:
-        db_pool: asyncpg.pool.Pool = await asyncpg.create_pool(
-            db_url,
-            min_size=5,
-            max_size=10,
-            timeout=30,
-            command_timeout=5,
-        )
-        logger.info("database connected!")
-        repo = UserRepository(db_pool)
-    except Exception as e:
-        logger.error(f"Error connecting to DB, {e}")
-        raise RuntimeError('meh...')
+    db_pool = await get_db_connection_pool()  # RuntimeError if the DB is not available
+    repo = UserRepository(db_pool)
 
 
 @app.on_event("shutdown")
@@ -87,6 +74,16 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return prometheus_text()
+
+
+@app.get("/metrics/snapshot")
+async def metrics_snapshot():
+    return snapshot()
+
+
 # CRUD Endpoints
 @app.post("/users", response_model=UserModel)
 async def create_user(user: UserCreate):
@@ -103,15 +100,25 @@ async def get_user(user_id: UUID):
 
 
 @app.get("/users", response_model=dict)
-async def get_all_users(limit: int = 10, offset: int = 0):
-    t1 = create_task(repo.get_all(limit=limit, offset=offset))
-    t2 = create_task(repo.get_user_count())
+async def get_all_users(limit: int = 10, offset: int = 0, cursor: str | None = None):
+    """
+    Pass `next_cursor` of the previous page as `cursor` (keyset pagination); `offset` is deprecated.
+    """
+    if offset:
+        t1 = create_task(repo.get_all(limit=limit, offset=offset))
+    else:
+        t1 = create_task(repo.get_page(limit=limit, cursor=cursor))
+    t2 = create_task(repo.get_user_count(CountMode.CACHED))  # no full scan of users on every page
 
-    users, n_users = await gather(t1, t2)
+    try:
+        page, n_users = await gather(t1, t2)
+    except ValueError as e:  # malformed cursor
+        raise HTTPException(status_code=400, detail=str(e))
+    users, next_cursor = (page, None) if offset else page
 
     # users = await repo.get_all(limit=limit, offset=offset)
     # n_users = await repo.get_user_count()
-    return {'users': users, 'total': n_users}
+    return {'users': users, 'total': n_users, 'next_cursor': next_cursor}
 
 
 @app.put("/users/{user_id}", response_model=UserModel)
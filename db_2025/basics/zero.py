@@ -1,13 +1,12 @@
-import os
 from asyncio import run
 from uuid import UUID, uuid4
 
-import asyncpg
 from asyncpg import Record
-from dotenv import load_dotenv
-from loguru import logger
 from pydantic import BaseModel
 
+from db_2025.common.cursor import fetch_page
+from db_2025.common.db import get_db_connection_pool
+
 
 class User(BaseModel):
     id: UUID
@@ -23,28 +22,28 @@ async def get_users(pool, page: int, limit: int) -> list[User]:
     return users
 
 
+async def get_users_after(pool, limit: int, cursor: str | None = None) -> tuple[list[User], str | None]:
+    """
+    Same order as get_users, but with keyset pagination: the next page starts after the last user
+    of the previous one (cursor), so page 10000 is as fast as page 1; OFFSET reads and drops all earlier rows.
+    """
+    async with pool.acquire() as c:
+        rows, next_cursor = await fetch_page(c, 'users', ('name', 'age', 'id'), (str, int, UUID), limit, cursor)
+        users: list[User] = [User(**row) for row in rows]
+    return users, next_cursor
+
+
 async def main():
-    load_dotenv()
-    db_url = os.getenv('DB_URL')
-    logger.info(f'using {db_url=}')
-
-    try:
-        pool: asyncpg.pool.Pool = await asyncpg.create_pool(
-            db_url,
-            min_size=5,
-            max_size=10,
-            timeout=30,
-            command_timeout=5,
-        )
-        logger.info("database connected!")
-    except Exception as e:
-        logger.error(f"Error connecting to DB, {e}")
-        raise RuntimeError('meh...')
+    pool = await get_db_connection_pool()
 
     async with pool.acquire() as c:
         # rows: list[Record] = await c.fetch("select * from users")
         # users: list[User] = [User(**row) for row in rows]
         users = await get_users(pool, 2, 10)
+        # keyset: pages 0, 1, 2
+        cursor = None
+        for _ in range(3):
+            users, cursor = await get_users_after(pool, 10, cursor)
 
     for u in users:
         print(u)
@@ -0,0 +1,101 @@
+import asyncio
+import re
+from enum import StrEnum
+
+from asyncpg import Pool
+from loguru import logger
+
+from db_2025.common.general import ts
+
+"""
+Row counts of whole tables. SELECT COUNT(*) reads the whole table on Postgres, so list endpoints
+should not run it on every request; CountService offers three modes:
+
+- exact:    SELECT COUNT(*)
+- estimate: pg_class.reltuples, maintained by (auto)vacuum/analyze (summed over the partitions of
+            a partitioned table); free, but may be off by a few percent
+- cached:   exact count, remembered for `ttl_s`; a stale value is returned at once while a fresh one
+            is computed in the background (only the first call per table waits for the scan)
+"""
+
+TABLE_NAME = re.compile(r'^[a-z_][a-z0-9_]*(\.[a-z_][a-z0-9_]*)?$')
+
+
+class CountMode(StrEnum):
+    EXACT = 'exact'
+    ESTIMATE = 'estimate'
+    CACHED = 'cached'
+
+
+class CountService:
+    def __init__(self, pool: Pool, ttl_s: float = 60):
+        self.pool = pool
+        self.ttl_s = ttl_s
+        self._cached: dict[str, tuple[int, float]] = {}  # table -> (count, timestamp)
+        self._refreshing: dict[str, asyncio.Task] = {}
+
+    async def count(self, table: str, mode: CountMode = CountMode.EXACT) -> int:
+        """
+        :param table: table name, optionally with schema (e.g. 'ai.users')
+        """
+        if not TABLE_NAME.match(table):
+            raise ValueError(f'invalid table name: {table}')
+        match mode:
+            case CountMode.EXACT:
+                return await self.exact(table)
+            case CountMode.ESTIMATE:
+                return await self.estimate(table)
+            case CountMode.CACHED:
+                return await self.cached(table)
+        raise ValueError(f'unknown count mode: {mode}')
+
+    async def exact(self, table: str) -> int:
+        async with self.pool.acquire() as conn:
+            n = await conn.fetchval(f"SELECT COUNT(*) FROM {table}")
+        self._cached[table] = (n, ts())
+        return n
+
+    async def estimate(self, table: str) -> int:
+        """
+        Planner's estimate; falls back to the exact count for tables never analyzed (reltuples = -1).
+        A partitioned table has no statistics of its own (always -1): its estimate is the sum over its
+        partitions, those never analyzed (e.g. created ahead, still empty) counting as 0; it falls back
+        to the exact count only if none of them was analyzed.
+        """
+        async with self.pool.acquire() as conn:
+            n = await conn.fetchval("""
+                SELECT CASE WHEN c.relkind = 'p' THEN (
+                           SELECT CASE WHEN bool_or(p.reltuples >= 0) THEN SUM(GREATEST(p.reltuples, 0)) ELSE -1 END
+                           FROM pg_inherits i JOIN pg_class p ON p.oid = i.inhrelid
+                           WHERE i.inhparent = c.oid)
+                       ELSE c.reltuples END::bigint
+                FROM pg_class c WHERE c.oid = $1::regclass
+            """, table)
+        if n is None or n < 0:
+            logger.debug(f'no statistics for {table}, counting rows')
+            return await self.exact(table)
+        return n
+
+    async def cached(self, table: str) -> int:
+        if table not in self._cached:
+            return await self.exact(table)
+        n, counted_at = self._cached[table]
+        if ts() - counted_at > self.ttl_s and table not in self._refreshing:
+            task = asyncio.create_task(self.exact(table))
+            self._refreshing[table] = task
+            task.add_done_callback(lambda t: self._refresh_done(table, t))
+        return n
+
+    def invalidate(self, table: str | None = None):
+        """
+        Forgets the cached count of the table (or of all tables).
+        """
+        if table is None:
+            self._cached.clear()
+        else:
+            self._cached.pop(table, None)
+
+    def _refresh_done(self, table: str, task: asyncio.Task):
+        self._refreshing.pop(table, None)
+        if not task.cancelled() and task.exception():
+            logger.warning(f'refreshing count of {table} failed: {task.exception()}')
@@ -0,0 +1,84 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections.abc import Callable, Sequence
+
+from asyncpg import Connection, DataError, Record
+
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET (which makes Postgres read and discard all skipped rows), a page starts right after
+the sort key of the last row of the previous page:
+
+    SELECT * FROM t WHERE (a, b, id) > ($2, $3, $4) ORDER BY a, b, id LIMIT $1
+
+so every page costs the same, given an index on (a, b, id). The sort key must be unique (end it with the
+primary key) and its columns NOT NULL (row comparisons with NULLs are never true).
+
+The first key column is also bounded on its own (`a >= $2 AND (a, b, id) > ...`): the row comparison alone
+does not let Postgres prune the partitions of a table partitioned by that column (e.g. invoices by issue_date).
+
+Cursors are opaque to the clients: the sort key of the last row, as url-safe base64 of a JSON list.
+"""
+
+
+def encode_cursor(*key) -> str:
+    """
+    :param key: values of the sort key columns (dates, UUIDs etc. are sent as strings)
+    """
+    return urlsafe_b64encode(json.dumps(key, default=str).encode()).decode()
+
+
+def decode_cursor(cursor: str, types: Sequence[Callable]) -> tuple:
+    """
+    :param types: converters of the key columns, e.g. (int, str, UUID, date.fromisoformat)
+    :return: values of the sort key; ValueError if the cursor is malformed
+    """
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return tuple(convert(value) for convert, value in zip(types, values))
+    except (ValueError, TypeError, AttributeError, OverflowError) as e:  # e.g. int(1e999) is OverflowError
+        raise ValueError(f'invalid cursor: {cursor}') from e
+
+
+def keyset_query(table: str, key: Sequence[str], after: bool, descending: bool = False) -> str:
+    """
+    SELECT of one page of the table, ordered by the key columns; $1 is the page size and,
+    if `after`, $2, $3, ... are the key of the last row of the previous page.
+    """
+    columns = ', '.join(key)
+    direction = ' DESC' if descending else ''
+    query = f'SELECT * FROM {table}'
+    if after:
+        placeholders = ', '.join(f'${i + 2}' for i in range(len(key)))
+        query += f" WHERE {key[0]} {'<=' if descending else '>='} $2" \
+                 f" AND ({columns}) {'<' if descending else '>'} ({placeholders})"
+    order_by = ', '.join(f'{column}{direction}' for column in key)
+    return f'{query} ORDER BY {order_by} LIMIT $1'
+
+
+async def fetch_page(conn: Connection, table: str, key: Sequence[str], types: Sequence[Callable], limit: int,
+                     cursor: str | None = None, descending: bool = False) -> tuple[list[Record], str | None]:
+    """
+    Fetches one page of the table with keyset pagination.
+
+    :param key: sort key columns (unique together, NOT NULL)
+    :param types: converters of the key columns (see decode_cursor)
+    :param cursor: next_cursor returned with the previous page; None for the first page
+    :return: rows of the page, and the cursor of the next page (None if this page is the last one);
+             ValueError if the cursor is malformed
+    """
+    after = decode_cursor(cursor, types) if cursor else ()
+    query = keyset_query(table, key, after=bool(after), descending=descending)
+    try:
+        records = await conn.fetch(query, limit + 1, *after)  # one more row tells if there is a next page
+    except DataError as e:  # a decoded value Postgres rejects, e.g. a NUL character in a text key
+        if not after:
+            raise
+        raise ValueError(f'invalid cursor: {cursor}') from e
+    if len(records) <= limit:
+        return records, None
+    records = records[:limit]
+    return records, encode_cursor(*(records[-1][column] for column in key))
@@ -0,0 +1,113 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable, Iterable, Mapping
+
+"""
+Batching of single-key lookups (the "dataloader" pattern).
+
+Code rendering related objects tends to look them up one by one (`await repo.get_plan(s.plan_id)` for each
+subscription), which costs one query and one connection per object. A DataLoader collects the keys
+requested by `load()` during one iteration of the event loop and fetches them with a single call of its
+batch function (typically a repository's get_many, i.e. `WHERE id = ANY($1)`):
+
+    plans = DataLoader(by_key(repo.get_many_plans))
+    await asyncio.gather(*(plans.load(s.plan_id) for s in subscriptions))   # one query
+
+Loaded values are cached by key, so a loader should live as long as one request (the cache is not
+invalidated by writes).
+"""
+
+BatchLoad = Callable[[list], Awaitable[Mapping]]  # keys -> {key: value}; missing keys -> None
+
+
+class DataLoader:
+    def __init__(self, batch_load: BatchLoad, max_batch_size: int = 1000):
+        """
+        :param batch_load: fetches the values of the keys, returning them by key (keys without a value may
+                           be left out)
+        :param max_batch_size: larger batches are split into several calls of batch_load
+        """
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self._cache: dict[Hashable, asyncio.Future] = {}
+        self._queue: dict[Hashable, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()  # batches in flight (the loop keeps only weak references)
+        self.batches = 0  # calls of batch_load so far
+
+    def load(self, key: Hashable) -> Awaitable:
+        """
+        :return: awaitable of the value of the key (None if there is none)
+        """
+        if key in self._cache:
+            return self._cache[key]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        future.add_done_callback(lambda f: self._forget_cancelled(key, f))
+        self._cache[key] = future
+        if not self._queue:
+            # runs after all callbacks already scheduled, i.e. once the other tasks of this tick asked for theirs
+            loop.call_soon(self._dispatch)
+        self._queue[key] = future
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> list:
+        """
+        :return: values of the keys, in their order (None for the missing ones)
+        """
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, key: Hashable, value):
+        """
+        Puts an already known value into the cache (e.g. objects returned by a list query).
+        """
+        if key not in self._cache:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            self._cache[key] = future
+
+    def clear(self, key: Hashable | None = None):
+        """
+        Forgets the cached value of the key (or all of them), e.g. after the object was modified.
+        """
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+    def _dispatch(self):
+        queue, self._queue = self._queue, {}
+        keys = list(queue)
+        for i in range(0, len(keys), self.max_batch_size):
+            batch = {key: queue[key] for key in keys[i:i + self.max_batch_size]}
+            task = asyncio.create_task(self._load_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _forget_cancelled(self, key: Hashable, future: asyncio.Future):
+        # e.g. the task awaiting load() was cancelled; a later load of the key fetches it again
+        if future.cancelled() and self._cache.get(key) is future:
+            del self._cache[key]
+
+    async def _load_batch(self, batch: dict[Hashable, asyncio.Future]):
+        self.batches += 1
+        try:
+            values = await self.batch_load(list(batch))
+        except Exception as e:
+            for key, future in batch.items():
+                self._cache.pop(key, None)  # not cached, a later load may retry
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(values.get(key))
+
+
+def by_key(get_many: Callable[[list], Awaitable[list]], key: str = 'id') -> BatchLoad:
+    """
+    Batch function of a get_many returning a list of objects (e.g. CrudRepository.get_many).
+    """
+
+    async def batch_load(keys: list) -> dict:
+        return {getattr(item, key): item for item in await get_many(keys)}
+
+    return batch_load
@@ -1,32 +1,374 @@
+import asyncio
 import os
+from collections import deque
+from contextvars import ContextVar
+from functools import partial
+from time import perf_counter
 
 import asyncpg
 from dotenv import load_dotenv
 from loguru import logger
 from asyncpg.pool import Pool
+from pydantic import BaseModel
 
+from db_2025.common.general import ts
+from db_2025.common.instrumentation import Histogram, add_collector, histogram_lines, record_pool_wait
+from db_2025.common.queries import PreparedConnection, registry
 
-async def get_db_connection_pool() -> Pool:
+"""
+Connection pool shared by all packages.
+
+Sizes and timeouts come from the environment (see PoolSettings.from_env). The pool is wrapped in
+InstrumentedPool, which tracks how long acquire() waits for a free connection, in-use / idle connections
+and acquire timeouts, warns when the 95th percentile of recent waits goes over DB_POOL_WAIT_WARN_MS,
+and - if DB_POOL_MAX_SIZE_LIMIT is set - grows the pool while it is saturated.
+
+With DB_REPLICA_URL set, get_replica_pool connects to a read replica; repositories route their reads there
+through PoolRouter.
+"""
+
+RECENT_WAITS = 1000  # waits taken into account in the p95 check
+CHECK_EVERY_S = 10
+
+
+class PoolSettings(BaseModel):
+    min_size: int = 5
+    max_size: int = 10
+    timeout: float = 30  # connecting
+    command_timeout: float = 5
+    statement_cache_size: int = 100
+    max_size_limit: int | None = None  # grow max_size up to this while the pool is saturated
+    grow_step: int = 5
+    wait_warn_ms: float = 100
+    hot_prefixes: tuple[str, ...] | None = None  # packages whose hot statements are prepared (None: all)
+
+    @classmethod
+    def from_env(cls) -> 'PoolSettings':
+        """
+        DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT, DB_COMMAND_TIMEOUT, DB_STATEMENT_CACHE_SIZE,
+        DB_POOL_MAX_SIZE_LIMIT, DB_POOL_WAIT_WARN_MS; unset ones keep the defaults.
+        """
+        env = {
+            'min_size': 'DB_POOL_MIN_SIZE',
+            'max_size': 'DB_POOL_MAX_SIZE',
+            'timeout': 'DB_POOL_TIMEOUT',
+            'command_timeout': 'DB_COMMAND_TIMEOUT',
+            'statement_cache_size': 'DB_STATEMENT_CACHE_SIZE',
+            'max_size_limit': 'DB_POOL_MAX_SIZE_LIMIT',
+            'wait_warn_ms': 'DB_POOL_WAIT_WARN_MS',
+        }
+        return cls(**{field: os.environ[var] for field, var in env.items() if os.getenv(var)})
+
+
+class _TimedAcquire:
+    """
+    Like asyncpg's PoolAcquireContext (usable with `async with` and `await`), recording the wait for a connection.
+    """
+
+    def __init__(self, owner: 'InstrumentedPool', timeout: float | None):
+        self.owner = owner
+        self.pool: Pool | None = None
+        self.timeout = timeout
+        self.conn = None
+
+    async def _acquire(self):
+        self.pool = self.owner.pool  # the pool at acquire time; the connection goes back to it, even after a resize
+        self.owner.check_out(self.pool)
+        st = perf_counter()
+        try:
+            conn = await self.pool.acquire(timeout=self.timeout)
+        except BaseException as e:  # also cancelled
+            self.owner.check_in(self.pool)
+            if isinstance(e, asyncio.TimeoutError):
+                self.owner.timeouts += 1
+                logger.warning(f'pool {self.owner.name}: timeout acquiring a connection ({self.owner.stats()})')
+            raise
+        self.owner.record_acquire(perf_counter() - st)
+        return conn
+
+    async def __aenter__(self):
+        self.conn = await self._acquire()
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        conn, self.conn = self.conn, None
+        self.owner.in_use -= 1
+        try:
+            await self.pool.release(conn)
+        finally:
+            self.owner.check_in(self.pool)
+
+    def __await__(self):
+        return self._acquire_detached().__await__()
+
+    async def _acquire_detached(self):
+        conn = await self._acquire()
+        self.owner.owning_pools[conn] = self.pool  # for InstrumentedPool.release
+        return conn
+
+
+class InstrumentedPool:
+    """
+    asyncpg pool whose acquire() records the time spent waiting for a free connection, per repository call
+    (see common.instrumentation) and for the pool as a whole; everything else is delegated to the pool.
+    """
+
+    def __init__(self, pool: Pool, db_url: str, settings: PoolSettings, name: str = 'default'):
+        self.pool = pool
+        self.db_url = db_url
+        self.settings = settings
+        self.name = name
+        self.wait = Histogram()
+        self.recent_waits: deque[float] = deque(maxlen=RECENT_WAITS)
+        self.acquired = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self._checked_at = ts()
+        self._resizing: asyncio.Task | None = None
+        self.owning_pools: dict[object, Pool] = {}  # connections acquired with `await acquire()` -> their pool
+        self._checked_out: dict[Pool, int] = {}  # connections out of (or being acquired from) each pool
+        self._draining: dict[Pool, asyncio.Event] = {}  # pools replaced by resize -> set when all are back
+        _pools.append(self)
+
+    def acquire(self, *, timeout: float | None = None) -> _TimedAcquire:
+        return _TimedAcquire(self, timeout)
+
+    async def release(self, conn, *, timeout: float | None = None):
+        self.in_use -= 1
+        pool = self.owning_pools.pop(conn, self.pool)  # the pool before a resize, if the connection came from it
+        try:
+            await pool.release(conn, timeout=timeout)
+        finally:
+            self.check_in(pool)
+
+    def check_out(self, pool: Pool):
+        self._checked_out[pool] = self._checked_out.get(pool, 0) + 1
+
+    def check_in(self, pool: Pool):
+        self._checked_out[pool] -= 1
+        if not self._checked_out[pool]:
+            del self._checked_out[pool]
+            if pool in self._draining:
+                self._draining[pool].set()
+
+    def record_acquire(self, wait_s: float):
+        self.acquired += 1
+        self.in_use += 1
+        self.wait.observe(wait_s)
+        self.recent_waits.append(wait_s)
+        record_pool_wait(wait_s)
+        if ts() - self._checked_at > CHECK_EVERY_S:
+            self._checked_at = ts()
+            self.check_saturation()
+
+    def wait_p95_ms(self) -> float:
+        if not self.recent_waits:
+            return 0
+        waits = sorted(self.recent_waits)
+        return waits[int(0.95 * (len(waits) - 1))] * 1000
+
+    def check_saturation(self):
+        """
+        Warns if the p95 of recent acquire waits is over the threshold; grows the pool (up to max_size_limit)
+        if, in addition, all its connections are in use.
+        """
+        p95 = self.wait_p95_ms()
+        if p95 <= self.settings.wait_warn_ms:
+            return
+        logger.warning(f'pool {self.name}: p95 acquire wait {p95:.1f}ms > {self.settings.wait_warn_ms}ms '
+                       f'({self.stats()})')
+        limit = self.settings.max_size_limit
+        max_size = self.settings.max_size
+        if limit and max_size < limit and self.in_use >= max_size and self._resizing is None:
+            self._resizing = asyncio.create_task(self.resize(max_size=min(max_size + self.settings.grow_step, limit)))
+            self._resizing.add_done_callback(self._resize_done)
+
+    async def resize(self, min_size: int | None = None, max_size: int | None = None):
+        """
+        asyncpg pools have a fixed size, so a new pool is created and swapped in. New acquires go to the new
+        pool; the old one is drained - closed only when the connections taken from it, and the acquires already
+        waiting on it, are back (closing it earlier would close connections still in use).
+        """
+        settings = self.settings.model_copy(update={k: v for k, v in
+                                                    {'min_size': min_size, 'max_size': max_size}.items() if v})
+        if settings.min_size > settings.max_size:
+            raise ValueError(f'min_size {settings.min_size} > max_size {settings.max_size}')
+        old, self.pool = self.pool, await _create_pool(self.db_url, settings)
+        self.settings = settings
+        self.recent_waits.clear()
+        logger.info(f'pool {self.name} resized to {settings.min_size}..{settings.max_size}')
+        if self._checked_out.get(old):
+            drained = self._draining[old] = asyncio.Event()
+            try:
+                await drained.wait()
+            finally:
+                del self._draining[old]
+        await old.close()
+
+    def _resize_done(self, task: asyncio.Task):
+        self._resizing = None
+        if not task.cancelled() and task.exception():
+            logger.warning(f'resizing pool {self.name} failed: {task.exception()}')
+
+    async def close(self):
+        if self in _pools:
+            _pools.remove(self)
+        await self.pool.close()
+
+    def stats(self) -> dict:
+        return {
+            'size': self.pool.get_size(),
+            'max_size': self.settings.max_size,
+            'in_use': self.in_use,
+            'idle': self.pool.get_idle_size(),
+            'acquired': self.acquired,
+            'timeouts': self.timeouts,
+            'wait_avg_ms': round(self.wait.sum_s / self.wait.count * 1000, 3) if self.wait.count else 0,
+            'wait_p95_ms': round(self.wait_p95_ms(), 3),
+        }
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+
+_pools: list[InstrumentedPool] = []
+
+
+def _prometheus_lines() -> list[str]:
+    lines = ['# HELP db_pool_acquire_seconds Time spent in pool acquire().',
+             '# TYPE db_pool_acquire_seconds histogram']
+    for p in _pools:
+        lines += histogram_lines('db_pool_acquire_seconds', f'pool="{p.name}"', p.wait)
+    gauges = {'size': 'Open connections.', 'max_size': 'Maximum size of the pool.',
+              'in_use': 'Connections in use.', 'idle': 'Idle connections.'}
+    counters = {'acquired': 'Connections acquired.', 'timeouts': 'Acquire timeouts.'}
+    stats = [(p.name, p.stats()) for p in _pools]
+    for key, help_text in gauges.items():
+        lines += [f'# HELP db_pool_{key} {help_text}', f'# TYPE db_pool_{key} gauge']
+        lines += [f'db_pool_{key}{{pool="{name}"}} {s[key]}' for name, s in stats]
+    for key, help_text in counters.items():
+        lines += [f'# HELP db_pool_{key}_total {help_text}', f'# TYPE db_pool_{key}_total counter']
+        lines += [f'db_pool_{key}_total{{pool="{name}"}} {s[key]}' for name, s in stats]
+    return lines
+
+
+add_collector(_prometheus_lines)
+
+
+# time of the last write in the current task (see PoolRouter)
+_last_write_at: ContextVar[float] = ContextVar('last_write_at', default=0)
+
+
+class _WriteAcquire:
+    """
+    `async with` acquire of a primary connection for writes: the time of the write is recorded when the
+    connection is released, i.e. when the write is done, however long it took.
+    """
+
+    def __init__(self, acquire):
+        self.acquire = acquire
+
+    async def __aenter__(self):
+        return await self.acquire.__aenter__()
+
+    async def __aexit__(self, *exc):
+        try:
+            await self.acquire.__aexit__(*exc)
+        finally:
+            _last_write_at.set(ts())
+
+
+class PoolRouter:
+    """
+    Writes (acquire) go to the primary pool, reads (acquire_read) to the replica, if there is one.
+
+    Read-your-writes: for `read_your_writes_s` after a write is done, reads of the same task (an HTTP request,
+    an import) go to the primary too, so they see the write regardless of the replication lag.
+    Reads which must always see the latest data use acquire_primary_read: primary, but not counted as a write.
     """
-    Creates connection pool to the DB; DB_URL is taken from envvar (and also .env).
+
+    def __init__(self, primary: Pool, replica: Pool | None = None, read_your_writes_s: float = 1):
+        self.primary = primary
+        self.replica = replica
+        self.read_your_writes_s = read_your_writes_s
+
+    def acquire(self, *, timeout: float | None = None) -> _WriteAcquire:
+        """
+        Connection to the primary, for writes (use with `async with`).
+        """
+        return _WriteAcquire(self.primary.acquire(timeout=timeout))
+
+    def acquire_primary_read(self, *, timeout: float | None = None):
+        """
+        Connection to the primary for reads, e.g. lookups before a write; reads of the task after it
+        still go to the replica.
+        """
+        return self.primary.acquire(timeout=timeout)
+
+    def acquire_read(self, *, timeout: float | None = None):
+        if self.replica is None or ts() - _last_write_at.get() < self.read_your_writes_s:
+            return self.primary.acquire(timeout=timeout)
+        return self.replica.acquire(timeout=timeout)
+
+    async def close(self):
+        await self.primary.close()
+        if self.replica is not None:
+            await self.replica.close()
+
+    def __getattr__(self, name):
+        return getattr(self.primary, name)
+
+
+async def _create_pool(db_url: str, settings: PoolSettings) -> Pool:
+    return await asyncpg.create_pool(
+        db_url,
+        min_size=settings.min_size,
+        max_size=settings.max_size,
+        timeout=settings.timeout,
+        command_timeout=settings.command_timeout,
+        statement_cache_size=settings.statement_cache_size,
+        connection_class=PreparedConnection,
+        init=partial(registry.prepare_hot, prefixes=settings.hot_prefixes) if settings.statement_cache_size else None,
+    )
+
+
+async def get_db_connection_pool(settings: PoolSettings | None = None, name: str = 'default',
+                                 url_env: str = 'DB_URL', hot_prefixes: tuple[str, ...] | None = None
+                                 ) -> InstrumentedPool:
+    """
+    Creates connection pool to the DB; DB_URL (or `url_env`) is taken from envvar (and also .env).
+    Hot statements of the query registry are prepared on every new connection;
+    DB_STATEMENT_CACHE_SIZE sets the size of asyncpg's per-connection statement cache
+    (0 disables it, and preparing, e.g. behind pgbouncer in transaction mode).
+    :param settings: pool sizes and timeouts; by default from the environment (PoolSettings.from_env)
+    :param hot_prefixes: prepare only the hot statements of these packages, e.g. ('subscriptions',)
+                         (overrides settings.hot_prefixes)
     :return: connection pool or RuntimeError if connecting to the DB is not possible
     """
     load_dotenv()
-    db_url = os.getenv('DB_URL')
+    db_url = os.getenv(url_env)
     if db_url is None:
-        raise RuntimeError('DB_URL is not set')
+        raise RuntimeError(f'{url_env} is not set')
     logger.info(f'using {db_url=}')
+    settings = settings or PoolSettings.from_env()
+    if hot_prefixes is not None:
+        settings = settings.model_copy(update={'hot_prefixes': hot_prefixes})
 
     try:
-        pool = await asyncpg.create_pool(
-            db_url,
-            min_size=5,
-            max_size=10,
-            timeout=30,
-            command_timeout=5,
-        )
-        logger.info("database connected!")
-        return pool
+        pool = await _create_pool(db_url, settings)
+        logger.info(f"database connected! (pool {settings.min_size}..{settings.max_size})")
+        return InstrumentedPool(pool, db_url, settings, name)
     except Exception as e:
         logger.error(f"Error connecting to DB, {e}")
         raise RuntimeError('meh...')
+
+
+async def get_replica_pool(settings: PoolSettings | None = None,
+                           hot_prefixes: tuple[str, ...] | None = None) -> InstrumentedPool | None:
+    """
+    Pool of the read replica at DB_REPLICA_URL; None if it is not set (reads then go to the primary).
+    """
+    load_dotenv()
+    if not os.getenv('DB_REPLICA_URL'):
+        return None
+    return await get_db_connection_pool(settings, name='replica', url_env='DB_REPLICA_URL', hot_prefixes=hot_prefixes)
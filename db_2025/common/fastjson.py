@@ -0,0 +1,41 @@
+import json
+from collections.abc import Mapping, Sequence
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+try:
+    import orjson
+except ImportError:  # optional; the standard json module is used instead (about 3x slower)
+    orjson = None
+
+"""
+JSON encoding of DB rows without building pydantic models first, for list endpoints which return
+rows as they are (see CrudRepository.get_page_json). Types are encoded as pydantic would: UUIDs as
+strings, dates / datetimes in ISO 8601, NUMERIC (Decimal) as numbers.
+"""
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, separators=(',', ':')).encode()
+
+
+def rows_json(records: Sequence[Mapping], fields: Sequence[str]) -> bytes:
+    """
+    JSON array of objects with the given fields of the rows (other columns are left out).
+    """
+    if records and tuple(records[0].keys()) == tuple(fields):
+        return dumps([dict(record) for record in records])
+    return dumps([{name: record[name] for name in fields} for record in records])
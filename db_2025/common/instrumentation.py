@@ -0,0 +1,241 @@
+import contextlib
+import functools
+import inspect
+from bisect import bisect_left
+from collections.abc import Callable
+from contextvars import ContextVar
+from time import perf_counter
+
+from pydantic import BaseModel
+
+from db_2025.common.queries import registry
+
+"""
+Timing of repository calls.
+
+`@instrumented('subscriptions')` on a repository class wraps each of its public async methods; every call
+records its latency (histogram), the number of rows it returned, and errors, under the name
+'subscriptions.<method>'. The pool returned by common.db.get_db_connection_pool adds the time spent
+waiting for a free connection to the repository call that asked for it (see `current_call`).
+
+The data is available in-process (`snapshot()`), as Prometheus text (`prometheus_text()`, served on /metrics
+by the FastAPI apps), and can be forwarded elsewhere by observers (`add_observer`).
+"""
+
+BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name of the repository call running in the current task (read by the instrumented pool)
+current_call: ContextVar[str | None] = ContextVar('current_call', default=None)
+
+
+class Histogram(BaseModel):
+    counts: list[int] = [0] * (len(BUCKETS_S) + 1)  # the last bucket is +Inf
+    count: int = 0
+    sum_s: float = 0
+
+    def observe(self, value_s: float):
+        self.counts[bisect_left(BUCKETS_S, value_s)] += 1
+        self.count += 1
+        self.sum_s += value_s
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-quantile (inf if it is above the largest bucket).
+        """
+        if not self.count:
+            return 0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS_S + (float('inf'),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class CallMetrics(BaseModel):
+    latency: Histogram = Histogram()
+    pool_wait: Histogram = Histogram()
+    rows: int = 0
+    errors: int = 0
+
+
+Observer = Callable[[str, float, int, bool], None]  # (call name, duration [s], rows, failed)
+
+metrics: dict[str, CallMetrics] = {}
+observers: list[Observer] = []
+collectors: list[Callable[[], list[str]]] = []  # extra Prometheus lines, e.g. of the pools (common.db)
+
+
+def add_observer(observer: Observer):
+    observers.append(observer)
+
+
+def add_collector(collector: Callable[[], list[str]]):
+    collectors.append(collector)
+
+
+def remove_collector(collector: Callable[[], list[str]]):
+    if collector in collectors:
+        collectors.remove(collector)
+
+
+def reset():
+    metrics.clear()
+
+
+def _metrics(name: str) -> CallMetrics:
+    if name not in metrics:
+        metrics[name] = CallMetrics()
+    return metrics[name]
+
+
+def record_call(name: str, duration_s: float, rows: int, failed: bool = False):
+    m = _metrics(name)
+    m.latency.observe(duration_s)
+    m.rows += rows
+    m.errors += failed
+    for observer in observers:
+        observer(name, duration_s, rows, failed)
+
+
+def record_pool_wait(duration_s: float):
+    _metrics(current_call.get() or 'unknown').pool_wait.observe(duration_s)
+
+
+def row_count(result) -> int:
+    """
+    Rows returned by a repository method: length of lists (and of the items of (items, next_cursor) pages),
+    1 for a single object, 0 for None / False.
+    """
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])
+    if isinstance(result, (list, dict)):
+        return len(result)
+    if result is None or result is False:
+        return 0
+    return 1
+
+
+def _wrap(name: str, method):
+    if inspect.isasyncgenfunction(method):
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            # duration covers the whole iteration, including time spent by the consumer; current_call is set
+            # only while the generator runs (the consumer may finish, or close it, in another context)
+            st, rows, failed = perf_counter(), 0, True
+            try:
+                async with contextlib.aclosing(method(*args, **kwargs)) as gen:  # closed (connection released) at once
+                    while True:
+                        token = current_call.set(name)
+                        try:
+                            item = await anext(gen)
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            current_call.reset(token)
+                        rows += row_count(item) if isinstance(item, list) else 1
+                        yield item
+                failed = False
+            except GeneratorExit:  # the consumer stopped early (break, aclose)
+                failed = False
+                raise
+            finally:
+                record_call(name, perf_counter() - st, rows, failed)
+        wrapper.__instrumented__ = method
+        return wrapper
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = current_call.set(name)
+        st = perf_counter()
+        try:
+            result = await method(*args, **kwargs)
+        except Exception:
+            record_call(name, perf_counter() - st, 0, failed=True)
+            raise
+        finally:
+            current_call.reset(token)
+        record_call(name, perf_counter() - st, row_count(result))
+        return result
+    wrapper.__instrumented__ = method
+    return wrapper
+
+
+def instrumented(prefix: str):
+    """
+    Class decorator: records every call of the public async methods as '<prefix>.<method name>'.
+    """
+
+    def decorate(cls):
+        # inherited methods too (e.g. of common.repository.CrudRepository), under the name of this class
+        for attr, method in inspect.getmembers(cls, inspect.isfunction):
+            if attr.startswith('_'):
+                continue
+            method = getattr(method, '__instrumented__', method)  # already wrapped for a base class
+            if inspect.iscoroutinefunction(method) or inspect.isasyncgenfunction(method):
+                setattr(cls, attr, _wrap(f'{prefix}.{attr}', method))
+        return cls
+
+    return decorate
+
+
+def snapshot() -> dict[str, dict]:
+    """
+    Per repository call: number of calls, errors, rows, average / p95 latency and pool wait [ms];
+    the most expensive calls (total time) first.
+    """
+    result = {}
+    for name, m in sorted(metrics.items(), key=lambda x: -x[1].latency.sum_s):
+        calls = m.latency.count
+        result[name] = {
+            'calls': calls,
+            'errors': m.errors,
+            'rows': m.rows,
+            'avg_ms': round(m.latency.sum_s / calls * 1000, 3) if calls else 0,
+            'p95_ms': m.latency.quantile(0.95) * 1000,
+            'total_s': round(m.latency.sum_s, 3),
+            'pool_wait_avg_ms': round(m.pool_wait.sum_s / m.pool_wait.count * 1000, 3) if m.pool_wait.count else 0,
+            'pool_wait_p95_ms': m.pool_wait.quantile(0.95) * 1000,
+        }
+    return result
+
+
+def histogram_lines(metric: str, label: str, h: Histogram) -> list[str]:
+    lines, cumulative = [], 0
+    for bound, n in zip(BUCKETS_S + ('+Inf',), h.counts):
+        cumulative += n
+        lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}')
+    lines.append(f'{metric}_sum{{{label}}} {h.sum_s}')
+    lines.append(f'{metric}_count{{{label}}} {h.count}')
+    return lines
+
+
+def prometheus_text() -> str:
+    """
+    Metrics of repository calls, of named statements (see common.queries) and of the collectors (pools)
+    in the Prometheus text format.
+    """
+    lines = ['# HELP repo_call_duration_seconds Duration of repository calls.',
+             '# TYPE repo_call_duration_seconds histogram']
+    for name, m in metrics.items():
+        lines += histogram_lines('repo_call_duration_seconds', f'call="{name}"', m.latency)
+    lines += ['# HELP db_pool_wait_seconds Time spent waiting for a pool connection.',
+              '# TYPE db_pool_wait_seconds histogram']
+    for name, m in metrics.items():
+        if m.pool_wait.count:
+            lines += histogram_lines('db_pool_wait_seconds', f'call="{name}"', m.pool_wait)
+    lines += ['# HELP repo_call_rows_total Rows returned by repository calls.', '# TYPE repo_call_rows_total counter']
+    lines += [f'repo_call_rows_total{{call="{name}"}} {m.rows}' for name, m in metrics.items()]
+    lines += ['# HELP repo_call_errors_total Failed repository calls.', '# TYPE repo_call_errors_total counter']
+    lines += [f'repo_call_errors_total{{call="{name}"}} {m.errors}' for name, m in metrics.items()]
+
+    executed = [(name, s) for name, s in registry.stats.items() if s.calls]
+    lines += ['# HELP db_statement_calls_total Executions of named statements.',
+              '# TYPE db_statement_calls_total counter']
+    lines += [f'db_statement_calls_total{{statement="{name}"}} {s.calls}' for name, s in executed]
+    lines += ['# HELP db_statement_seconds_total Time spent in named statements.',
+              '# TYPE db_statement_seconds_total counter']
+    lines += [f'db_statement_seconds_total{{statement="{name}"}} {s.total_s}' for name, s in executed]
+    for collect in collectors:
+        lines += collect()
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,143 @@
+from time import perf_counter
+
+from asyncpg import Connection, Record, PostgresError
+from asyncpg.prepared_stmt import PreparedStatement
+from loguru import logger
+from pydantic import BaseModel
+
+"""
+Registry of named SQL statements.
+
+Repositories register their statements once (at import), and run them by name:
+
+    registry.add('subscriptions.get_user', "SELECT * FROM users WHERE id = $1", hot=True)
+    ...
+    row = await registry.fetchrow(conn, 'subscriptions.get_user', user_id)
+
+Hot statements are prepared on every new pool connection (see `prepare_hot`, used as the pool `init` hook
+in common.db), so their first execution on a connection does not pay for parsing and planning either.
+A pool prepares only the hot statements of its app (PoolSettings.hot_prefixes, e.g. ('subscriptions',)),
+not those of every package imported into the process.
+Other statements go through asyncpg's per-connection statement cache (statement_cache_size).
+For every statement the registry counts executions (and how many used a pre-prepared statement) and time spent.
+"""
+
+
+class PreparedConnection(Connection):
+    """
+    Connection holding statements prepared by QueryRegistry.prepare_hot (name -> statement).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared: dict[str, PreparedStatement] = {}
+
+
+class QueryStats(BaseModel):
+    calls: int = 0
+    prepared_calls: int = 0  # executed through a statement prepared in prepare_hot
+    total_s: float = 0
+    max_s: float = 0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_s / self.calls * 1000 if self.calls else 0
+
+
+class QueryRegistry:
+    def __init__(self):
+        self.queries: dict[str, str] = {}
+        self.hot: set[str] = set()
+        self.stats: dict[str, QueryStats] = {}
+
+    def add(self, name: str, sql: str, hot: bool = False) -> str:
+        """
+        :param hot: prepare the statement on every new connection
+        :return: name of the statement
+        """
+        if self.queries.get(name, sql) != sql:
+            raise ValueError(f'query {name} is already registered with different SQL')
+        self.queries[name] = sql
+        self.stats.setdefault(name, QueryStats())
+        if hot:
+            self.hot.add(name)
+        return name
+
+    def add_all(self, prefix: str, queries: dict[str, str], hot: set[str] = frozenset()):
+        """
+        Registers the statements as `prefix.name`.
+
+        :param hot: names (without prefix) of the statements to prepare on every new connection
+        """
+        for name, sql in queries.items():
+            self.add(f'{prefix}.{name}', sql, hot=name in hot)
+
+    def sql(self, name: str) -> str:
+        return self.queries[name]
+
+    def hot_names(self, prefixes: tuple[str, ...] | None = None) -> list[str]:
+        """
+        :param prefixes: only statements named `prefix.*` (None: all hot statements)
+        """
+        if prefixes is None:
+            return sorted(self.hot)
+        return sorted(name for name in self.hot if name.startswith(tuple(f'{p}.' for p in prefixes)))
+
+    async def prepare_hot(self, conn: Connection, prefixes: tuple[str, ...] | None = None):
+        """
+        Pool `init` hook: prepares the hot statements (of `prefixes`, see hot_names) on a new connection
+        (a no-op unless the pool uses connection_class=PreparedConnection).
+        """
+        if not isinstance(conn, PreparedConnection):
+            return
+        for name in self.hot_names(prefixes):
+            try:
+                conn.prepared[name] = await conn.prepare(self.queries[name])
+            except PostgresError as e:  # e.g. schema not migrated yet; the statement runs unprepared
+                logger.warning(f'could not prepare {name}: {e}')
+        logger.debug(f'prepared {len(conn.prepared)} hot statements')
+
+    async def fetch(self, conn: Connection, name: str, *args) -> list[Record]:
+        return await self._run(conn, name, 'fetch', args)
+
+    async def fetchrow(self, conn: Connection, name: str, *args) -> Record | None:
+        return await self._run(conn, name, 'fetchrow', args)
+
+    async def fetchval(self, conn: Connection, name: str, *args):
+        return await self._run(conn, name, 'fetchval', args)
+
+    async def execute(self, conn: Connection, name: str, *args) -> str:
+        return await self._run(conn, name, 'execute', args)
+
+    async def _run(self, conn: Connection, name: str, method: str, args: tuple):
+        stmt = getattr(conn, 'prepared', {}).get(name)
+        st = perf_counter()
+        try:
+            if stmt is None:
+                return await getattr(conn, method)(self.queries[name], *args)
+            if method == 'execute':  # prepared statements have no execute()
+                await stmt.fetch(*args)
+                return stmt.get_statusmsg()
+            return await getattr(stmt, method)(*args)
+        finally:
+            elapsed = perf_counter() - st
+            stats = self.stats[name]
+            stats.calls += 1
+            stats.prepared_calls += stmt is not None
+            stats.total_s += elapsed
+            stats.max_s = max(stats.max_s, elapsed)
+
+    def snapshot(self) -> dict[str, dict]:
+        """
+        Statistics of the executed statements, the most expensive (total time) first.
+        """
+        executed = sorted(((name, s) for name, s in self.stats.items() if s.calls), key=lambda x: -x[1].total_s)
+        return {name: {**s.model_dump(), 'avg_ms': round(s.avg_ms, 3)} for name, s in executed}
+
+    def log_stats(self):
+        for name, s in self.snapshot().items():
+            logger.info(f"{name}: {s['calls']} calls ({s['prepared_calls']} prepared), "
+                        f"avg {s['avg_ms']:.3f}ms, max {s['max_s'] * 1000:.3f}ms")
+
+
+registry = QueryRegistry()
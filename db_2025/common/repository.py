@@ -0,0 +1,244 @@
+import os
+import types
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from datetime import date, datetime
+from uuid import UUID
+
+from asyncpg import Pool, Record
+from pydantic import VERSION as PYDANTIC_VERSION, BaseModel, TypeAdapter
+
+from db_2025.common.cursor import fetch_page
+from db_2025.common.db import PoolRouter
+from db_2025.common.fastjson import rows_json
+from db_2025.common.queries import registry
+
+"""
+Generic CRUD repository of a single table, driven by its pydantic model:
+
+    class CategoryRepository(CrudRepository):
+        model = Category
+        table = 'category'
+        order_by = ('name', 'id')   # sort key of get_all / get_page (unique, NOT NULL columns)
+        key_types = (str, UUID)     # converters of the sort key (see common.cursor)
+
+The CRUD statements are generated once, when the class is defined, and registered in the query registry
+(common.queries) as '<prefix>.create', '<prefix>.get_by_id' etc.
+
+Rows are turned into models by RowMapper: rows read from the DB are trusted, so instead of the full
+pydantic validation of `Model(**row)` the model is built directly from the row, converting only the values
+asyncpg returns in a different type than the model declares (NUMERIC -> Decimal for float fields).
+DB_VALIDATE_ROWS=1 turns the validation back on (debugging schema / model mismatches).
+"""
+
+VALIDATE_ROWS = os.getenv('DB_VALIDATE_ROWS', '0') == '1'
+
+# types asyncpg returns as they are declared in the models
+_PLAIN_TYPES = (str, int, bool, UUID, date, datetime, bytes)
+
+# instance layout of pydantic 2 models, relied upon by _new_model
+_KNOWN_LAYOUT = PYDANTIC_VERSION.startswith('2.')
+
+
+def _new_model(model: type[BaseModel], values: dict, fields_set: set[str]) -> BaseModel:
+    """
+    Instance of the model holding `values` (all its fields, by name), without validation. Does what
+    `model.model_construct` does, without its handling of defaults and aliases; the only code depending on
+    pydantic internals (checked against `Model(**row)` in tests/test_repository.py), with model_construct
+    as the fallback for other versions of pydantic.
+    """
+    if not _KNOWN_LAYOUT:
+        return model.model_construct(fields_set, **values)
+    obj = model.__new__(model)
+    object.__setattr__(obj, '__dict__', values)
+    object.__setattr__(obj, '__pydantic_fields_set__', fields_set)
+    object.__setattr__(obj, '__pydantic_extra__', None)
+    object.__setattr__(obj, '__pydantic_private__', None)
+    return obj
+
+
+def _field_converter(annotation) -> Callable | None:
+    """
+    :return: converter of a DB value to the field type (None: no conversion); ValueError if unsupported
+    """
+    if isinstance(annotation, types.UnionType):
+        args = [a for a in annotation.__args__ if a is not type(None)]
+        if len(args) == 1:
+            return _field_converter(args[0])
+    elif annotation is float:
+        return float
+    elif annotation in _PLAIN_TYPES:
+        return None
+    raise ValueError(f'no fast path for {annotation}')
+
+
+class RowMapper:
+    """
+    Precompiled conversion of DB rows to instances of a pydantic model.
+    Models with fields of other types than plain scalars (or rows whose columns differ from the fields)
+    are validated by pydantic as usual.
+    """
+
+    def __init__(self, model: type[BaseModel], validate: bool = VALIDATE_ROWS):
+        self.model = model
+        self.fields = frozenset(model.model_fields)
+        try:
+            converters = {name: _field_converter(f.annotation) for name, f in model.model_fields.items()}
+            self.converters = [(name, convert) for name, convert in converters.items() if convert]
+            self.validate = validate or bool(model.__private_attributes__)
+        except ValueError:
+            self.converters = []
+            self.validate = True
+
+    def __call__(self, record: Record | Mapping | None) -> BaseModel | None:
+        if record is None:
+            return None
+        if self.validate or frozenset(record.keys()) != self.fields:
+            return self.model(**record)
+        return self._construct(record)
+
+    def many(self, records: Sequence[Record | Mapping]) -> list[BaseModel]:
+        """
+        Columns are checked on the first row only (all rows of a result have the same ones).
+        """
+        if not records:
+            return []
+        if self.validate or frozenset(records[0].keys()) != self.fields:
+            return [self.model(**record) for record in records]
+        return [self._construct(record) for record in records]
+
+    def _construct(self, record) -> BaseModel:
+        values = dict(record)
+        for name, convert in self.converters:
+            if values[name] is not None:
+                values[name] = convert(values[name])
+        return _new_model(self.model, values, set(self.fields))
+
+
+def crud_queries(table: str, columns: Sequence[str], order_by: Sequence[str], descending: bool = False,
+                 id_column: str = 'id') -> dict[str, str]:
+    """
+    CRUD statements of the table; `columns` are the ones written by create / update (without the generated ones).
+    """
+    placeholders = ', '.join(f'${i + 1}' for i in range(len(columns)))
+    assignments = ', '.join(f'{column} = ${i + 2}' for i, column in enumerate(columns))
+    direction = ' DESC' if descending else ''
+    order = ', '.join(f'{column}{direction}' for column in order_by)
+    return {
+        'create': f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) RETURNING *",
+        'get_by_id': f"SELECT * FROM {table} WHERE {id_column} = $1",
+        'get_many': f"SELECT * FROM {table} WHERE {id_column} = ANY($1)",
+        'get_all': f"SELECT * FROM {table} ORDER BY {order} LIMIT $1 OFFSET $2",
+        'update': f"UPDATE {table} SET {assignments} WHERE {id_column} = $1 RETURNING *",
+        'delete': f"DELETE FROM {table} WHERE {id_column} = $1 RETURNING {id_column}",
+    }
+
+
+class CrudRepository:
+    model: type[BaseModel]
+    table: str
+    prefix: str  # of the statement names; by default '<package>.<table>'
+    id_column: str = 'id'
+    generated: tuple[str, ...] = ('id',)  # filled in by the DB (not written by create / update)
+    order_by: tuple[str, ...] = ('id',)
+    key_types: tuple[Callable, ...] = (int,)
+    descending: bool = False
+    hot: frozenset[str] = frozenset({'get_by_id'})  # statements prepared on every connection
+
+    columns: tuple[str, ...]
+    to_model: RowMapper
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'model' not in vars(cls):  # intermediate base class
+            return
+        if 'prefix' not in vars(cls):
+            cls.prefix = f"{cls.__module__.removeprefix('db_2025.').split('.')[0]}.{cls.table}"
+        cls.columns = tuple(name for name in cls.model.model_fields if name not in cls.generated)
+        cls.to_model = RowMapper(cls.model)
+        registry.add_all(cls.prefix, crud_queries(cls.table, cls.columns, cls.order_by, cls.descending,
+                                                  cls.id_column), hot=cls.hot)
+
+    def __init__(self, pool: Pool | PoolRouter, replica: Pool | None = None, read_your_writes_s: float = 1):
+        """
+        :param pool: pool of the primary, or a PoolRouter shared with other repositories
+        :param replica: pool of a read replica (see common.db.PoolRouter)
+        """
+        self.pool = pool if isinstance(pool, PoolRouter) else PoolRouter(pool, replica, read_your_writes_s)
+
+    async def create(self, item: BaseModel) -> BaseModel:
+        """
+        Inserts the item (its generated fields, e.g. id, are ignored) and returns it as stored.
+        """
+        return await self._insert(**{column: getattr(item, column) for column in self.columns})
+
+    async def _insert(self, **values) -> BaseModel:
+        async with self.pool.acquire() as conn:
+            row = await registry.fetchrow(conn, f'{self.prefix}.create', *(values[c] for c in self.columns))
+            return self.to_model(row)
+
+    async def get_by_id(self, id) -> BaseModel | None:
+        async with self.pool.acquire_read() as conn:
+            row = await registry.fetchrow(conn, f'{self.prefix}.get_by_id', id)
+            return self.to_model(row)
+
+    async def get_many(self, ids: Iterable) -> list[BaseModel]:
+        """
+        Items with the given ids in one query; in the order of `ids`, without duplicates and missing ones.
+        """
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return []
+        async with self.pool.acquire_read() as conn:
+            rows = await registry.fetch(conn, f'{self.prefix}.get_many', ids)
+        by_id = {item.__dict__[self.id_column]: item for item in self.to_model.many(rows)}
+        return [by_id[id] for id in ids if id in by_id]
+
+    async def get_all(self, limit: int = 10, offset: int = 0) -> list[BaseModel]:
+        async with self.pool.acquire_read() as conn:
+            rows = await registry.fetch(conn, f'{self.prefix}.get_all', limit, offset)
+            return self.to_model.many(rows)
+
+    async def get_page(self, limit: int = 10, cursor: str | None = None) -> tuple[list[BaseModel], str | None]:
+        """
+        Keyset pagination (see common.cursor) in the order of get_all.
+
+        :return: items, and the cursor of the next page (None on the last page)
+        """
+        async with self.pool.acquire_read() as conn:
+            rows, next_cursor = await fetch_page(conn, self.table, self.order_by, self.key_types, limit, cursor,
+                                                 descending=self.descending)
+            return self.to_model.many(rows), next_cursor
+
+    async def get_page_json(self, limit: int = 10, cursor: str | None = None,
+                            offset: int = 0) -> tuple[bytes, str | None]:
+        """
+        Like get_page (or get_all, if `offset` is given), but returns the page as a JSON array, encoded
+        straight from the rows (common.fastjson); with DB_VALIDATE_ROWS=1 the rows are validated by pydantic.
+
+        :return: JSON of the items, and the cursor of the next page (None on the last page, and with offset)
+        """
+        async with self.pool.acquire_read() as conn:
+            if offset:
+                rows, next_cursor = await registry.fetch(conn, f'{self.prefix}.get_all', limit, offset), None
+            else:
+                rows, next_cursor = await fetch_page(conn, self.table, self.order_by, self.key_types, limit, cursor,
+                                                     descending=self.descending)
+        if self.to_model.validate:
+            return TypeAdapter(list[self.model]).dump_json(self.to_model.many(rows)), next_cursor
+        return rows_json(rows, tuple(self.model.model_fields)), next_cursor
+
+    async def update(self, id, item: BaseModel) -> BaseModel | None:
+        """
+        Overwrites all non-generated columns of the row with the values of the item.
+        """
+        return await self._update_values(id, **{column: getattr(item, column) for column in self.columns})
+
+    async def _update_values(self, id, **values) -> BaseModel | None:
+        async with self.pool.acquire() as conn:
+            row = await registry.fetchrow(conn, f'{self.prefix}.update', id, *(values[c] for c in self.columns))
+            return self.to_model(row)
+
+    async def delete(self, id) -> bool:
+        async with self.pool.acquire() as conn:
+            row = await registry.fetchrow(conn, f'{self.prefix}.delete', id)
+            return row is not None
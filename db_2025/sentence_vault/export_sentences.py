@@ -0,0 +1,71 @@
+import csv
+import os
+from asyncio import run
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from db_2025.common.db import get_db_connection_pool
+from db_2025.common.general import ts, duration
+from db_2025.sentence_vault.model import Sentence
+from db_2025.sentence_vault.repo import Repo
+
+"""
+Exports sentences to JSONL (one Sentence per line) or CSV (with a header), e.g. as input for training jobs.
+Sentences are streamed from the DB (Repo.stream_sentences) and written batch by batch, so memory use is
+constant regardless of the number of sentences.
+"""
+
+FORMATS = ('jsonl', 'csv')
+
+
+async def export_sentences(repo: Repo, path: str, fmt: str | None = None, book_id: int | None = None,
+                           main_type: str | None = None, tense: str | None = None,
+                           prefetch: int = 10_000, log_every: int = 1_000_000) -> int:
+    """
+    Writes the sentences (optionally only of given book / type / tense) to `path`.
+    The file is written under a temporary name and renamed when complete, so a partial export never
+    looks like a finished one.
+
+    :param fmt: 'jsonl' or 'csv'; by default taken from the extension of `path`
+    :return: number of exported sentences
+    """
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in FORMATS:
+        raise ValueError(f'unknown export format {fmt!r}, expected one of {FORMATS}')
+
+    st = ts()
+    n_exported = 0
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = None
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(Sentence.model_fields)
+        async for batch in repo.stream_sentences(book_id=book_id, main_type=main_type, tense=tense,
+                                                 prefetch=prefetch):
+            if writer:
+                writer.writerows([getattr(s, name) for name in Sentence.model_fields] for s in batch)
+            else:
+                f.writelines(s.model_dump_json() + '\n' for s in batch)
+            n_exported += len(batch)
+            if n_exported // log_every != (n_exported - len(batch)) // log_every:
+                logger.info(f'exported {n_exported} sentences ({duration(st)})')
+    os.replace(tmp_path, path)
+    logger.info(f'exported {n_exported} sentences to {path} in {duration(st)}')
+    return n_exported
+
+
+async def main():
+    load_dotenv()
+    pool = await get_db_connection_pool(hot_prefixes=('sentence_vault',))
+    repo = Repo(pool)
+
+    await export_sentences(repo, 'sentences.jsonl')
+    await export_sentences(repo, 'sentences_book_1.csv', book_id=1, main_type='declarative')
+
+    await pool.close()
+
+
+if __name__ == '__main__':
+    run(main())
@@ -2,61 +2,130 @@ import asyncio
 import os
 import sys
 from asyncio import run, create_task
+from collections.abc import AsyncIterator, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
 
 from asyncpg import UniqueViolationError
 from dotenv import load_dotenv
 from loguru import logger
+from pydantic import BaseModel
 
 from db_2025.common.db import get_db_connection_pool
 from db_2025.common.general import *
+from db_2025.common.queries import registry
 from db_2025.sentence_vault.repo import Repo
 from db_2025.sentence_vault.model import *
-from db_2025.sentence_vault.sentence_analysis import extract_verbs, is_simple_declarative, infer_tense, extract_sentences, \
-    classify_sentences
+from db_2025.sentence_vault.nlp_pool import create_nlp_executor, stream_analyses
+from db_2025.sentence_vault.sentence_analysis import analyse_sentence, iter_sentences, iter_classified_sentences
+from db_2025.sentence_vault.sentence_dedup import SentenceBloomFilter
+from db_2025.sentence_vault.word_cache import WordCache
 
 
-async def save_sentence(repo: Repo, sentence: Sentence):
+def apply_analysis(sentence: Sentence, analysis: SentenceAnalysis) -> list[Word]:
+    """
+    Fills exact_type and tense of the sentence (in place).
+
+    :return: verbs found in the sentence
+    """
+    sentence.exact_type = 'simple' if analysis.is_simple else 'N/A'
+    sentence.tense = analysis.tense
+    return analysis.verbs
+
+
+def tag_sentence(sentence: Sentence) -> list[Word]:
+    """
+    Tags the sentence in the current process, and fills its exact_type and tense.
+
+    :param sentence: sentence with verbatim filled
+    :return: verbs found in the sentence
+    """
+    return apply_analysis(sentence, analyse_sentence(sentence.verbatim))  # single tokenize + tag pass
+
+
+async def save_sentence(repo: Repo, sentence: Sentence, analysis: SentenceAnalysis | None = None,
+                        word_cache: WordCache | None = None, dedup: SentenceBloomFilter | None = None):
     """
     Sentence has book_id, main_type and verbatim filled
 
     :param repo:
     :param sentence: partially filled Sentence object;
+    :param analysis: result of analyse_sentence (e.g. computed in a worker process); if None, the sentence is tagged here
+    :param word_cache: if given, verb ids are resolved through it
+    :param dedup: if given, the DB is asked for an existing sentence only when the filter reports a possible hit
     :return:
     """
-    existing = await repo.get_sentence_by_verbatim(sentence.verbatim)
-    if existing:
-        return
-    verbs = extract_verbs(sentence.verbatim)
-
-    is_simple = is_simple_declarative(sentence.verbatim)
-    sentence.exact_type = 'simple' if is_simple else 'N/A'
-    sentence.tense = infer_tense(sentence.verbatim)
+    if dedup is None or dedup.might_contain(sentence.verbatim):
+        existing = await repo.get_sentence_by_verbatim(sentence.verbatim)
+        if existing:
+            return
+    if dedup is not None:
+        dedup.add(sentence.verbatim)  # later copies of this sentence go to the DB check
+    verbs = apply_analysis(sentence, analysis) if analysis else tag_sentence(sentence)
 
     saved = await repo.create_sentence(sentence)
 
     logger.debug(f'saved sentence {saved}')
     for verb in verbs:
-        await save_verb(repo, verb, saved.id)
+        await save_verb(repo, verb, saved.id, word_cache)
 
 
-async def save_verb(repo, verb: Word, sentence_id: int):
-    try:
-        saved = await repo.create_word(verb)
-    except UniqueViolationError as e:
-        saved = await repo.get_word_by_verbatim(verb.word)
-    if not saved:
-        logger.info(f'could not save verb {verb}')
-        return
+async def save_sentences(repo: Repo, batch: list[tuple[Sentence, SentenceAnalysis]],
+                         word_cache: WordCache | None = None, dedup: SentenceBloomFilter | None = None,
+                         deduplicated: bool = False) -> int:
+    """
+    As save_sentence, for a batch of tagged sentences: sentences, words and their links are written
+    with one batch statement each (see Repo.create_sentences_batch and friends).
+
+    :param deduplicated: if True, the sentences are known to be new (see sentence_batches); the DB is not asked
+    :return: number of saved sentences
+    """
+    new: list[tuple[Sentence, list[Word]]] = []
+    seen = set()  # duplicates within the batch are not in the DB yet
+    for sentence, analysis in batch:
+        if sentence.verbatim in seen:
+            continue
+        if not deduplicated and (dedup is None or dedup.might_contain(sentence.verbatim)):
+            if await repo.get_sentence_by_verbatim(sentence.verbatim):
+                continue
+        if dedup is not None and not deduplicated:
+            dedup.add(sentence.verbatim)
+        seen.add(sentence.verbatim)
+        new.append((sentence, apply_analysis(sentence, analysis)))
+
+    saved = await repo.create_sentences_batch([sentence for sentence, _ in new])
+    links = [(s.id, verb) for s, (_, verbs) in zip(saved, new) for verb in verbs]
+    if word_cache is not None:
+        word_ids = await word_cache.get_ids([verb for _, verb in links])
+    else:
+        word_ids = await repo.get_or_create_word_ids([verb for _, verb in links])
+    await repo.create_sentence_words_batch(
+        [SentenceWords(sentence_id=sentence_id, word_id=word_id) for (sentence_id, _), word_id in zip(links, word_ids)])
+    logger.debug(f'saved {len(saved)} sentences, {len(links)} verbs')
+    return len(saved)
+
+
+async def save_verb(repo, verb: Word, sentence_id: int, word_cache: WordCache | None = None):
+    if word_cache is not None:
+        word_id = await word_cache.get_id(verb)
+    else:
+        try:
+            saved = await repo.create_word(verb)
+        except UniqueViolationError as e:
+            saved = await repo.get_word_by_verbatim(verb.word)
+        if not saved:
+            logger.info(f'could not save verb {verb}')
+            return
+        word_id = saved.id
 
     try:
-        await repo.create_sentence_words(SentenceWords(sentence_id=sentence_id, word_id=saved.id))
+        await repo.create_sentence_words(SentenceWords(sentence_id=sentence_id, word_id=word_id))
     except UniqueViolationError as e:
         pass
 
 
 async def test_zero():
     load_dotenv()
-    pool = await get_db_connection_pool()
+    pool = await get_db_connection_pool(hot_prefixes=('sentence_vault',))
     repo = Repo(pool)
     logger.info('pool created')
     sentence = "I did not seem to understand."
@@ -65,10 +134,103 @@ async def test_zero():
     await save_sentence(repo, stc)
 
 
-async def import_book(pool, file_name: str, file_path: str):
+def book_sentences(full_path: str, book_id: int) -> Iterator[Sentence]:
+    """
+    Extracts and classifies sentences of the book lazily, in file order (not tagged yet).
+    """
+    for main_type, s in iter_classified_sentences(iter_sentences(full_path)):
+        yield Sentence(book_id=book_id, main_type=main_type, verbatim=s)
+
+
+async def sentence_batches(sentences: Iterable[Sentence], batch_size: int = 500, repo: Repo | None = None,
+                           dedup: SentenceBloomFilter | None = None,
+                           db_slots: asyncio.Semaphore | None = None) -> AsyncIterator[list[Sentence]]:
+    """
+    Batches of the sentences; if `repo` is given, only of the new ones: sentences repeated in `sentences`,
+    or already in the DB (asked only on a possible hit of `dedup`, if given), are dropped, so they are not tagged.
+    """
+    seen = set()
+    batch = []
+    for sentence in sentences:
+        if repo is not None:
+            if sentence.verbatim in seen:
+                continue
+            seen.add(sentence.verbatim)
+            if dedup is None or dedup.might_contain(sentence.verbatim):
+                if await _bounded(db_slots, repo.get_sentence_by_verbatim(sentence.verbatim)):
+                    continue
+            if dedup is not None:
+                dedup.add(sentence.verbatim)  # later copies of this sentence go to the DB check
+        batch.append(sentence)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def analyse_book(full_path: str, book_id: int, executor: ProcessPoolExecutor | None = None,
+                       batch_size: int = 500, repo: Repo | None = None, dedup: SentenceBloomFilter | None = None,
+                       db_slots: asyncio.Semaphore | None = None
+                       ) -> AsyncIterator[list[tuple[Sentence, SentenceAnalysis]]]:
+    """
+    Extracts, classifies and tags sentences of the book; yields them in batches,
+    so that only a few batches are in memory at any time.
+
+    :param executor: NLP worker pool (see nlp_pool); if None, tagging runs in this process
+    :param repo: if given, only sentences not in the DB yet are tagged (see sentence_batches)
+    :return: batches of (sentence, its analysis)
+    """
+    batches = sentence_batches(book_sentences(full_path, book_id), batch_size, repo, dedup, db_slots)
+    if executor is None:
+        async for batch in batches:
+            yield [(s, analyse_sentence(s.verbatim)) for s in batch]
+    else:
+        async for batch in stream_analyses(executor, batches):
+            yield batch
+
+
+class ImportProgress(BaseModel):
+    title: str
+    status: str = 'pending'  # pending, running, done, skipped, failed
+    done: int = 0  # sentences processed so far (books are streamed, the total is not known upfront)
+
+    def __str__(self):
+        return f'{self.title}: {self.status}, {self.done} sentences'
+
+
+async def _bounded(db_slots: asyncio.Semaphore | None, coro):
+    if db_slots is None:
+        return await coro
+    async with db_slots:
+        return await coro
+
+
+async def import_book(pool, file_name: str, file_path: str, bulk: bool = False,
+                      executor: ProcessPoolExecutor | None = None,
+                      db_slots: asyncio.Semaphore | None = None,
+                      progress: ImportProgress | None = None,
+                      word_cache: WordCache | None = None,
+                      dedup: SentenceBloomFilter | None = None):
+    """
+    Imports sentences (and their verbs) of a single book. The book is marked as imported only
+    when all its sentences are saved, so an interrupted import is resumed on the next run
+    (sentences saved before the crash are skipped as duplicates).
+
+    :param bulk: if True, the book is tagged first, then COPY-ed to a staging table and saved with set-based
+                 merges (see Repo.bulk_import_sentences); else new sentences are tagged and saved in batches
+                 (see save_sentences)
+    :param executor: NLP worker pool (see nlp_pool); if None, tagging runs on the event loop
+    :param db_slots: caps the number of DB operations in flight (shared by all concurrently imported books)
+    :param progress: updated as sentences are saved
+    :param word_cache: word -> id cache (used when bulk=False)
+    :param dedup: filter of existing sentences (used when bulk=False)
+    """
+    progress = progress or ImportProgress(title=file_name)
     full_path = os.path.join(file_path, file_name)
     if not os.path.isfile(full_path):
-        logger.warning('book {file_name} not found.')
+        logger.warning(f'book {file_name} not found.')
+        progress.status = 'skipped'
         return
 
     repo = Repo(pool)
@@ -78,24 +240,89 @@ async def import_book(pool, file_name: str, file_path: str):
     if not book:
         book = Book(id=-1, title=file_name)
         book = await repo.create_book(book)
-    else:
+    elif book.imported_at:
         logger.info(f'book {book.id} already exists')
+        progress.status = 'skipped'
         return
+    else:
+        logger.warning(f'book {book.id} was not fully imported; resuming')
+    progress.status = 'running'
+
+    if bulk:
+        # tagged before the COPY, so that no connection (nor transaction) is held while the workers tag the book
+        tagged: list[tuple[Sentence, list[Word]]] = []
+        async for batch in analyse_book(full_path, book.id, executor):
+            tagged.extend((s, apply_analysis(s, a)) for s, a in batch)
+            progress.done += len(batch)
+        inserted = await _bounded(db_slots, repo.bulk_import_sentences(tagged))
+        logger.info(f'inserted {inserted} new sentences')
+    else:
+        # duplicates are dropped before tagging; with an executor, tagged batches stream back from the workers
+        # while earlier batches are being saved
+        async for batch in analyse_book(full_path, book.id, executor, repo=repo, dedup=dedup, db_slots=db_slots):
+            await _bounded(db_slots, save_sentences(repo, batch, word_cache, dedup, deduplicated=True))
+            progress.done += len(batch)
+    saved = progress.done
 
-    sentences = extract_sentences(full_path)
-    x = classify_sentences(sentences)
-    types = ['declarative', 'imperative', 'interrogative', 'exclamatory']
-    saved = 0
-    tasks = []
-    for t in types:
-        logger.info(f'processing {t}')
-        for s in x[t]:
-            stc = Sentence(book_id=book.id, main_type=t, verbatim=s)
-            tasks.append(create_task(save_sentence(repo, stc)))
-            saved += 1
-        await asyncio.gather(*tasks)
+    await repo.mark_book_imported(book.id)
+    progress.status = 'done'
     duration_s = ts() - start_ts
-    logger.info(f'saved {saved} sentences in {duration(start_ts)} ({duration_s/saved * 1000:.2f}sec/1k sentences);')
+    logger.info(f'saved {saved} sentences in {duration(start_ts)} ({duration_s / max(saved, 1) * 1000:.2f}sec/1k sentences);')
+
+
+async def _report_progress(progress: list[ImportProgress], every_s: float):
+    while True:
+        await asyncio.sleep(every_s)
+        finished = sum(p.status in ('done', 'skipped', 'failed') for p in progress)
+        logger.info(f'books finished: {finished}/{len(progress)}')
+        for p in progress:
+            if p.status == 'running':
+                logger.info(f'  {p}')
+
+
+async def import_books(pool, file_names: list[str], file_path: str, concurrency: int = 4, bulk: bool = False,
+                       executor: ProcessPoolExecutor | None = None,
+                       report_every_s: float = 30) -> list[ImportProgress]:
+    """
+    Imports many books, `concurrency` of them at a time; a slow book does not block the others.
+    DB operations of all books share one semaphore sized to the pool, so they queue here
+    and not inside the pool (where they would run into timeouts).
+    Books already imported are skipped, and books left unfinished by a crashed run are resumed.
+
+    :return: progress of each book
+    """
+    book_slots = asyncio.Semaphore(concurrency)
+    db_slots = asyncio.Semaphore(pool.get_max_size())
+    progress = [ImportProgress(title=name) for name in file_names]
+    word_cache, dedup = None, None
+    if not bulk:  # bulk imports resolve words and duplicates set-based, in the DB
+        word_cache = WordCache(Repo(pool))
+        await word_cache.warm_up()
+        dedup = await SentenceBloomFilter.load(Repo(pool))
+
+    async def import_one(p: ImportProgress):
+        async with book_slots:
+            logger.warning(f'processing {p.title}')
+            try:
+                await import_book(pool, file_name=p.title, file_path=file_path, bulk=bulk,
+                                  executor=executor, db_slots=db_slots, progress=p, word_cache=word_cache,
+                                  dedup=dedup)
+            except Exception as e:
+                p.status = 'failed'
+                logger.error(f'import of {p.title} failed: {e}')
+
+    reporter = create_task(_report_progress(progress, report_every_s))
+    try:
+        await asyncio.gather(*[import_one(p) for p in progress])
+    finally:
+        reporter.cancel()
+
+    if word_cache is not None:
+        logger.info(f'word cache: {len(word_cache)} words, hit rate {word_cache.hit_rate():.1%}')
+    failed = [p.title for p in progress if p.status == 'failed']
+    if failed:
+        logger.warning(f'{len(failed)} books failed (will be resumed on the next run): {failed}')
+    return progress
 
 
 async def main():
@@ -104,16 +331,18 @@ async def main():
     logger.info(f'running {st}')
     DIR = '/nfs1/datasets/books_first_1000'
 
-    pool = await get_db_connection_pool()
+    pool = await get_db_connection_pool(hot_prefixes=('sentence_vault',))
     MAX_BOOKS = 500
+    BOOK_CONCURRENCY = 4
+    BULK_MODE = True
+    NLP_WORKERS = os.cpu_count()
 
-    for idx, filename in enumerate(os.listdir(DIR)):
-        if idx >= MAX_BOOKS:
-            logger.info(f'processed {MAX_BOOKS} books')
-            break
-        logger.warning(f'processing {filename}')
-        await import_book(pool=pool, file_name=filename, file_path=DIR)
-    logger.info(f'imported book in {duration(st)}')
+    file_names = sorted(os.listdir(DIR))[:MAX_BOOKS]
+    with create_nlp_executor(NLP_WORKERS) as executor:
+        await import_books(pool, file_names=file_names, file_path=DIR, concurrency=BOOK_CONCURRENCY,
+                           bulk=BULK_MODE, executor=executor)
+    logger.info(f'imported {len(file_names)} books in {duration(st)}')
+    registry.log_stats()
 
 
 def adjust_logger():
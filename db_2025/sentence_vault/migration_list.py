@@ -129,7 +129,31 @@ CREATE INDEX idx_sentence_verbatim ON sentences (MD5(verbatim));
               """,
               down_sql="""
 DROP INDEX idx_sentence_verbatim;
-              """)
+              """),
+    Migration(start_version=8, produces_version=9, description='track finished book imports',
+              up_sql="""
+ALTER TABLE books ADD COLUMN imported_at TIMESTAMP NULL;
+-- books imported so far were all treated as finished
+UPDATE books SET imported_at = NOW();
+              """,
+              down_sql="""
+ALTER TABLE books DROP COLUMN imported_at;
+              """),
+    Migration(start_version=9, produces_version=10, description='indexes for keyset pagination',
+              up_sql="""
+-- row comparisons skip NULLs, so the sort key of sentences must be NOT NULL
+UPDATE sentences SET tense = 'N/A' WHERE tense IS NULL;
+ALTER TABLE sentences ALTER COLUMN tense SET DEFAULT 'N/A';
+ALTER TABLE sentences ALTER COLUMN tense SET NOT NULL;
+CREATE INDEX idx_sentences_keyset ON sentences (book_id, main_type, tense, id);
+CREATE INDEX idx_books_title_id ON books (title, id);
+              """,
+              down_sql="""
+DROP INDEX idx_books_title_id;
+DROP INDEX idx_sentences_keyset;
+ALTER TABLE sentences ALTER COLUMN tense DROP NOT NULL;
+ALTER TABLE sentences ALTER COLUMN tense DROP DEFAULT;
+              """),
 
 
 ]
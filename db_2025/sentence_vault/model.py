@@ -1,9 +1,12 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
 
 class Book(BaseModel):
     id: int
     title: str
+    imported_at: datetime | None = None  # None: import not started or not finished
 
 
 class Category(BaseModel):
@@ -40,3 +43,10 @@ class NLTK_Tokens(BaseModel):
 class SentenceWords(BaseModel):
     sentence_id: int
     word_id: int
+
+
+class SentenceAnalysis(BaseModel):
+    # result of a single tokenize + POS-tag pass over a sentence
+    verbs: list[Word]
+    tense: str
+    is_simple: bool
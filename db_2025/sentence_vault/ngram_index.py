@@ -0,0 +1,316 @@
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+
+from loguru import logger
+
+from db_2025.common.general import ts, duration
+from db_2025.sentence_vault.repo import Repo
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed by the vectorized builder
+    np = None
+
+"""
+Persistent n-gram (bigram/trigram) index for substring search; the set-based prototype is
+python_indices.extract_bigrams.
+
+File layout (little endian):
+    header:   magic 'NGRI', version (u16), n (u16), n_keys (u64), n_postings (u64), padding -> 32 bytes
+    keys:     n_keys x u64        sorted n-gram codes (21 bits per character)
+    offsets:  (n_keys + 1) x u64  postings of keys[i] are postings[offsets[i]:offsets[i + 1]]
+    postings: n_postings x u32    sorted row ids
+
+The file is memory-mapped and never parsed into Python objects, so opening it is instant and
+only the posting lists touched by queries are paged in.
+"""
+
+MAGIC = b'NGRI'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQ4x')  # 32 bytes
+CHAR_BITS = 21  # enough for any unicode code point
+MAX_N = 64 // CHAR_BITS
+
+
+def normalize(text: str) -> str:
+    return text.lower()
+
+
+def _write_index(path: str, n: int, keys: bytes, n_keys: int, offsets: bytes, postings: Iterable[bytes],
+                 n_postings: int):
+    tmp_path = f'{path}.tmp'  # readers may still have the old file mapped; replace it atomically
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, n, n_keys, n_postings))
+        f.write(keys)
+        f.write(offsets)
+        for chunk in postings:
+            f.write(chunk)
+    os.replace(tmp_path, path)
+
+
+def ngram_codes(text: str, n: int) -> set[int]:
+    """
+    Distinct n-grams of the (normalized) text, each packed into a single int.
+    """
+    codes = set()
+    for i in range(len(text) - n + 1):
+        code = 0
+        for ch in text[i:i + n]:
+            code = (code << CHAR_BITS) | ord(ch)
+        codes.add(code)
+    return codes
+
+
+class NgramIndexBuilder:
+    """
+    Collects posting lists in memory (as compact arrays of row ids), then writes the index file.
+    """
+
+    def __init__(self, n: int = 3):
+        if not 1 <= n <= MAX_N:
+            raise ValueError(f'n must be between 1 and {MAX_N}')
+        self.n = n
+        self.n_rows = 0
+        self._postings: dict[int, array] = defaultdict(lambda: array('I'))
+        self._sorted = True
+        self._last_row_id = -1
+
+    def add(self, row_id: int, text: str):
+        repeated = row_id == self._last_row_id  # e.g. several texts of one row
+        if row_id < self._last_row_id:
+            self._sorted = False
+        self._last_row_id = row_id
+        for code in ngram_codes(normalize(text), self.n):
+            rows = self._postings[code]
+            if not (repeated and rows and rows[-1] == row_id):
+                rows.append(row_id)
+        self.n_rows += 1
+
+    def write(self, path: str):
+        if not self._sorted:  # posting lists are sorted and deduplicated before their offsets are computed
+            for key, rows in self._postings.items():
+                self._postings[key] = array('I', sorted(set(rows)))
+            self._sorted = True
+        keys = sorted(self._postings)
+        offsets = array('Q', [0])
+        for key in keys:
+            offsets.append(offsets[-1] + len(self._postings[key]))
+
+        def postings():
+            for key in keys:
+                yield self._postings[key].tobytes()
+
+        _write_index(path, self.n, array('Q', keys).tobytes(), len(keys), offsets.tobytes(), postings(), offsets[-1])
+        logger.info(f'n-gram index: {self.n_rows} rows, {len(keys)} keys, {offsets[-1]} postings -> {path}')
+
+
+class NgramIndex:
+    """
+    Read-only, memory-mapped n-gram index.
+
+    `candidates` returns ids of rows containing all n-grams of the query (a superset of the rows
+    containing the query); `search` additionally checks the candidates against the texts.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.n, n_keys, n_postings = HEADER.unpack_from(self._mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not an n-gram index (version {VERSION})')
+
+        mv = memoryview(self._mm)
+        start = HEADER.size
+        self._keys = mv[start:start + 8 * n_keys].cast('Q')
+        start += 8 * n_keys
+        self._offsets = mv[start:start + 8 * (n_keys + 1)].cast('Q')
+        start += 8 * (n_keys + 1)
+        self._postings = mv[start:start + 4 * n_postings].cast('I')
+
+    @classmethod
+    def build(cls, texts: Iterable[str] | Iterable[tuple[int, str]], path: str, n: int = 3,
+              vectorized: bool | None = None) -> 'NgramIndex':
+        """
+        Builds the index file and opens it.
+
+        :param texts: strings (row id = position) or pairs (row id, string)
+        :param vectorized: use build_vectorized (needs numpy); by default it is used when numpy is installed
+        """
+        if vectorized is None:
+            vectorized = np is not None
+        if vectorized:
+            build_vectorized(list(texts), path, n)
+            return cls(path)
+
+        builder = NgramIndexBuilder(n)
+        for idx, item in enumerate(texts):
+            row_id, text = (idx, item) if isinstance(item, str) else item
+            builder.add(row_id, text)
+        builder.write(path)
+        return cls(path)
+
+    def close(self):
+        for view in (self._keys, self._offsets, self._postings):
+            view.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def postings(self, code: int) -> Sequence[int]:
+        i = bisect_left(self._keys, code)
+        if i == len(self._keys) or self._keys[i] != code:
+            return self._postings[0:0]
+        return self._postings[self._offsets[i]:self._offsets[i + 1]]
+
+    def candidates(self, substring: str) -> list[int]:
+        """
+        Ids of rows containing every n-gram of the substring.
+        Posting lists are intersected smallest first, with galloping search in the longer lists.
+        """
+        codes = ngram_codes(normalize(substring), self.n)
+        if not codes:
+            raise ValueError(f'query must be at least {self.n} characters long')
+        lists = sorted((self.postings(code) for code in codes), key=len)
+        result = list(lists[0])
+        for postings in lists[1:]:
+            if not result:
+                break
+            result = intersect(result, postings)
+        return result
+
+    def search(self, substring: str, texts: Sequence[str]) -> list[int]:
+        """
+        Ids of rows (positions in `texts`) which contain the substring (case-insensitive).
+        """
+        needle = normalize(substring)
+        return [idx for idx in self.candidates(substring) if needle in normalize(texts[idx])]
+
+
+def build_vectorized(texts: list[str] | list[tuple[int, str]], path: str, n: int = 3):
+    """
+    Same index file as NgramIndexBuilder, but built with NumPy array operations instead of a Python loop
+    per character (under 1s instead of ~6s for the 3M x 4 characters python_indices demo).
+
+    All strings are concatenated and normalized at once into one array of code points (bytes, for ASCII);
+    the n-gram starting at every position is packed into a uint64 code with shifts and ors, n-grams crossing
+    a string boundary are masked out, and (code, row) pairs are sorted and deduplicated into CSR-style
+    postings (unique codes + offsets). Strings may have any length.
+    """
+    if np is None:
+        raise RuntimeError('numpy is required for the vectorized n-gram index builder')
+    if not 1 <= n <= MAX_N:
+        raise ValueError(f'n must be between 1 and {MAX_N}')
+    st = ts()
+    if texts and not isinstance(texts[0], str):
+        row_ids = np.fromiter((row_id for row_id, _ in texts), dtype=np.uint32, count=len(texts))
+        texts = [text for _, text in texts]
+    else:
+        row_ids = np.arange(len(texts), dtype=np.uint32)
+
+    joined = ''.join(texts)
+    normalized = normalize(joined)  # one call for all strings
+    if len(normalized) != len(joined):  # some character changed its length (e.g. 'İ'), string ends moved
+        texts = [normalize(text) for text in texts]
+        normalized = ''.join(texts)
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    if normalized.isascii():  # one byte per character instead of four
+        chars = np.frombuffer(normalized.encode('ascii'), dtype=np.uint8)
+    else:
+        chars = np.frombuffer(normalized.encode('utf-32-le'), dtype='<u4')
+    del joined, normalized
+    rows = np.repeat(row_ids, lengths)
+
+    # n-grams are packed with as many bits per character as the largest code point needs (7 for ASCII),
+    # so that (code, row) usually fits into one uint64 and a single sort replaces the lexsort
+    char_bits = max(int(chars.max()).bit_length(), 1) if len(chars) else 1
+    row_bits = max(int(row_ids.max()).bit_length(), 1) if len(row_ids) else 1
+    n_grams = max(len(chars) - n + 1, 0)
+    codes = np.zeros(n_grams, dtype=np.uint64)
+    for i in range(n):
+        codes = (codes << np.uint64(char_bits)) | chars[i:i + n_grams]
+    # position p starts an n-gram only if p + n - 1 lies in the same string
+    ends = np.cumsum(lengths)
+    string_end = np.repeat(ends, lengths)[:n_grams]
+    valid = np.arange(n_grams) + n <= string_end
+    codes, rows = codes[valid], rows[:n_grams][valid]
+
+    # sort by (code, row) and drop repeated n-grams within one row
+    if n * char_bits + row_bits <= 64:
+        pairs = np.sort((codes << np.uint64(row_bits)) | rows)
+        keep = np.ones(len(pairs), dtype=bool)
+        keep[1:] = pairs[1:] != pairs[:-1]
+        pairs = pairs[keep]
+        codes, rows = pairs >> np.uint64(row_bits), pairs & np.uint64((1 << row_bits) - 1)
+    else:
+        order = np.lexsort((rows, codes))
+        codes, rows = codes[order], rows[order]
+        keep = np.ones(len(codes), dtype=bool)
+        keep[1:] = (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])
+        codes, rows = codes[keep], rows[keep]
+
+    # codes are sorted: a key starts wherever the code changes
+    new_key = np.ones(len(codes), dtype=bool)
+    new_key[1:] = codes[1:] != codes[:-1]
+    starts = np.flatnonzero(new_key)
+    keys = codes[starts]
+    if char_bits != CHAR_BITS:  # back to the file's 21 bits per character (order is preserved)
+        packed = np.zeros(len(keys), dtype=np.uint64)
+        for i in range(n):
+            shift = n - 1 - i
+            char = (keys >> np.uint64(char_bits * shift)) & np.uint64((1 << char_bits) - 1)
+            packed |= char << np.uint64(CHAR_BITS * shift)
+        keys = packed
+    offsets = np.append(starts, len(codes)).astype('<u8')
+    _write_index(path, n, keys.astype('<u8').tobytes(), len(keys), offsets.tobytes(),
+                 [rows.astype('<u4').tobytes()], len(rows))
+    logger.info(f'n-gram index (vectorized): {len(texts)} rows, {len(keys)} keys, {len(rows)} postings '
+                f'in {duration(st)} -> {path}')
+
+
+def intersect(small: Sequence[int], large: Sequence[int]) -> list[int]:
+    """
+    Intersection of two sorted sequences; for each element of `small` gallops forward in `large`,
+    so the cost is O(len(small) * log(len(large) / len(small))) instead of O(len(small) + len(large)).
+    """
+    result = []
+    lo, n = 0, len(large)
+    for x in small:
+        # exponential probe, then binary search within the last step
+        step = 1
+        hi = lo
+        while hi < n and large[hi] < x:
+            lo = hi + 1
+            hi += step
+            step *= 2
+        lo = bisect_left(large, x, lo, min(hi, n))
+        if lo == n:
+            break
+        if large[lo] == x:
+            result.append(x)
+    return result
+
+
+async def build_sentence_index(repo: Repo, path: str, n: int = 3) -> NgramIndex:
+    """
+    Builds the index over sentences.verbatim (row ids are sentence ids).
+    """
+    st = ts()
+    builder = NgramIndexBuilder(n)
+    async for sentence_id, verbatim in repo.iter_sentence_verbatims():
+        builder.add(sentence_id, verbatim)
+    builder.write(path)
+    logger.info(f'sentence index built in {duration(st)}')
+    return NgramIndex(path)
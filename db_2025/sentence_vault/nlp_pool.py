@@ -0,0 +1,75 @@
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+
+from db_2025.sentence_vault.model import Sentence, SentenceAnalysis
+from db_2025.sentence_vault.sentence_analysis import analyse_sentence, get_tagger
+
+"""
+NLP stage of the importer: POS-tagging is CPU bound, so it runs in a pool of worker processes,
+while the event loop only does DB I/O. Batches of sentences go to the workers, and analyses
+stream back (in submission order) to the async writer.
+"""
+
+
+def _init_worker():
+    get_tagger()  # load the perceptron tagger once per worker process
+
+
+def analyse_batch(sentences: list[str]) -> list[SentenceAnalysis]:
+    return [analyse_sentence(s) for s in sentences]
+
+
+def create_nlp_executor(workers: int | None = None) -> ProcessPoolExecutor:
+    """
+    :param workers: number of worker processes; defaults to the number of CPUs
+    """
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker)
+
+
+async def stream_analyses(executor: ProcessPoolExecutor, sentences: Iterable[Sentence] | AsyncIterable[list[Sentence]],
+                          batch_size: int = 500,
+                          max_in_flight: int | None = None) -> AsyncIterator[list[tuple[Sentence, SentenceAnalysis]]]:
+    """
+    Sends batches of sentences to the executor and yields (sentence, analysis) batches in input order.
+    At most `max_in_flight` batches are queued in the executor at once (default: 2 per CPU),
+    so that a lazy `sentences` iterable is not consumed faster than the workers can tag it.
+
+    :param sentences: sentences with verbatim filled, or an async iterable of batches of them
+                      (e.g. already filtered against the DB; `batch_size` is then ignored)
+    """
+    loop = asyncio.get_running_loop()
+    max_in_flight = max_in_flight or 2 * (os.cpu_count() or 1)
+    batches = _as_batches(sentences, batch_size)
+    pending: deque[tuple[list[Sentence], asyncio.Future]] = deque()
+
+    async def submit_next() -> bool:
+        batch = await anext(batches, None)
+        if batch is None:
+            return False
+        future = loop.run_in_executor(executor, analyse_batch, [s.verbatim for s in batch])
+        pending.append((batch, future))
+        return True
+
+    while len(pending) < max_in_flight and await submit_next():
+        pass
+    while pending:
+        batch, future = pending.popleft()
+        analyses = await future
+        await submit_next()
+        yield list(zip(batch, analyses))
+
+
+async def _as_batches(sentences: Iterable[Sentence] | AsyncIterable[list[Sentence]],
+                      batch_size: int) -> AsyncIterator[list[Sentence]]:
+    if isinstance(sentences, AsyncIterable):
+        async for batch in sentences:
+            if batch:
+                yield batch
+    else:
+        it = iter(sentences)
+        while batch := list(islice(it, batch_size)):
+            yield batch
@@ -0,0 +1,130 @@
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+
+from loguru import logger
+
+from db_2025.common.general import ts, duration
+from db_2025.sentence_vault.repo import Repo
+
+"""
+Prefix search (autocomplete) over a static set of strings; replaces the linear scan of
+python_indices.find_in_file.
+
+Keys are kept in one sorted list: all keys with a given prefix form a contiguous run, found with two
+binary searches, so a lookup costs O(log N + k) for k results. Python compares strings by code points,
+the same order as COLLATE "C" in Postgres, so sorted rows from the DB can be used as they are.
+"""
+
+MAX_CHAR = '\U0010ffff'
+
+
+def prefix_end(prefix: str) -> str | None:
+    """
+    Smallest string greater than every string starting with `prefix` (None if there is no such string).
+    """
+    stripped = prefix.rstrip(MAX_CHAR)
+    if not stripped:
+        return None
+    return stripped[:-1] + chr(ord(stripped[-1]) + 1)
+
+
+class PrefixIndex:
+    """
+    Sorted keys with an optional value per key (e.g. row id or word id).
+    Duplicate keys are allowed.
+    """
+
+    def __init__(self, keys: list[str], values: list[int] | None = None):
+        """
+        :param keys: keys sorted by code points (use `build` for unsorted input)
+        :param values: values of the keys (same length as keys); if None, the value of a key is its position
+        """
+        if values is not None and len(values) != len(keys):
+            raise ValueError('keys and values must have the same length')
+        self.keys = keys
+        self.values = values
+
+    @classmethod
+    def build(cls, items: Iterable[str] | Iterable[tuple[str, int]]) -> 'PrefixIndex':
+        """
+        Bulk build.
+
+        :param items: strings (value = position, as for `db: list[str]`) or pairs (string, value)
+        """
+        st = ts()
+        items = list(items)
+        if items and isinstance(items[0], str):
+            keys, values = items, range(len(items))
+        else:
+            keys, values = [key for key, _ in items], [value for _, value in items]
+        order = sorted(range(len(keys)), key=keys.__getitem__)  # stable: equal keys keep input order
+        index = cls([keys[i] for i in order], [values[i] for i in order])
+        logger.info(f'prefix index: {len(index)} keys built in {duration(st)}')
+        return index
+
+    @classmethod
+    async def from_words(cls, repo: Repo) -> 'PrefixIndex':
+        """
+        Index over words.word; values are word ids. Rows arrive sorted, so nothing is sorted here.
+        """
+        st = ts()
+        keys, values = [], []
+        async for word, word_id in repo.iter_words_by_word():
+            keys.append(word)
+            values.append(word_id)
+        logger.info(f'prefix index: {len(keys)} words loaded in {duration(st)}')
+        return cls(keys, values)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        i = bisect_left(self.keys, key)
+        return i < len(self.keys) and self.keys[i] == key
+
+    def prefix_range(self, prefix: str) -> tuple[int, int]:
+        """
+        Positions [start, end) of the keys starting with `prefix`.
+        """
+        start = bisect_left(self.keys, prefix)
+        end_key = prefix_end(prefix)
+        end = len(self.keys) if end_key is None else bisect_left(self.keys, end_key, start)
+        return start, end
+
+    def count(self, prefix: str) -> int:
+        start, end = self.prefix_range(prefix)
+        return end - start
+
+    def first(self, prefix: str) -> str | None:
+        """
+        Smallest key starting with `prefix` (find_in_file returns the first one in row order instead).
+        """
+        start, end = self.prefix_range(prefix)
+        return self.keys[start] if start < end else None
+
+    def lookup(self, prefix: str, limit: int = 10) -> list[str]:
+        """
+        Up to `limit` keys starting with `prefix`, in sorted order (autocomplete).
+        """
+        start, end = self.prefix_range(prefix)
+        return self.keys[start:min(end, start + limit)]
+
+    def lookup_items(self, prefix: str, limit: int = 10) -> list[tuple[str, int]]:
+        """
+        As `lookup`, with values (row ids / word ids).
+        """
+        start, end = self.prefix_range(prefix)
+        end = min(end, start + limit)
+        return [(self.keys[i], self._value(i)) for i in range(start, end)]
+
+    def range(self, lo: str, hi: str | None = None) -> Iterator[tuple[str, int]]:
+        """
+        Enumerates pairs (key, value) with lo <= key < hi (hi=None: to the end), in sorted order.
+        """
+        start = bisect_left(self.keys, lo)
+        end = len(self.keys) if hi is None else bisect_left(self.keys, hi, start)
+        for i in range(start, end):
+            yield self.keys[i], self._value(i)
+
+    def _value(self, i: int) -> int:
+        return i if self.values is None else self.values[i]
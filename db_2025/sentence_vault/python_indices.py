@@ -1,9 +1,12 @@
+import os
+import tempfile
+from collections import defaultdict
 from random import choice
 from string import ascii_lowercase
 
-from black.trans import defaultdict
-
 from db_2025.common.general import ts, duration
+from db_2025.sentence_vault.ngram_index import NgramIndex
+from db_2025.sentence_vault.prefix_index import PrefixIndex
 
 
 def gen_random_string(n_strings: int, length: int) -> list[str]:
@@ -56,3 +59,33 @@ if __name__ == '__main__':
     # łącznie bgrams ma ~26 * 26 * 13000 ~= 9mln elementów ... 72MB ...
     print('-----------')
     print(f'common: {fs & sk & kf}')
+
+    # to samo, z indeksem zapisanym do pliku (posting listy jako tablice uint32, mmap)
+    path = os.path.join(tempfile.gettempdir(), 'bigrams.ngri')
+    st = ts()
+    NgramIndex.build(db, path, n=2, vectorized=False).close()
+    print(f'index built (python loop) in {duration(st)}, size: {os.path.getsize(path) / 2 ** 20:.1f}MB')
+    st = ts()
+    NgramIndex.build(db, path, n=2, vectorized=True).close()
+    print(f'index built (numpy) in {duration(st)}')
+    st = ts()
+    with NgramIndex(path) as index:
+        print(f'index opened in {duration(st)}')
+        st = ts()
+        found = index.search('fskf', db)
+        print(f'found: {[db[i] for i in found]}, duration:{duration(st)}')
+
+    # wyszukiwanie po prefiksie: posortowana lista + bisect zamiast liniowego find_in_file
+    st = ts()
+    prefixes = PrefixIndex.build(db)
+    print(f'prefix index built in {duration(st)}')
+    for prefix in ['fsk', 'fsk.', 'zz']:
+        st = ts()
+        x = find_in_file(prefix, db)
+        linear = duration(st)
+        st = ts()
+        for _ in range(1000):
+            found = prefixes.lookup(prefix, limit=5)
+        per_lookup_us = (ts() - st) * 1000
+        print(f'prefix {prefix!r}: linear {x} in {linear}, index {found} ({prefixes.count(prefix)} total) '
+              f'in {per_lookup_us:.1f}us')
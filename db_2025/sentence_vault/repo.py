@@ -1,9 +1,18 @@
+from collections.abc import AsyncIterable, AsyncIterator
+
 from asyncpg import Pool, Connection
 from loguru import logger
 
-from db_2025.common.general import ts
+from db_2025.common.counts import CountService, CountMode
+from db_2025.common.cursor import fetch_page
+from db_2025.common.db import PoolRouter
+from db_2025.common.instrumentation import instrumented
+from db_2025.common.queries import registry
+from db_2025.common.repository import RowMapper
 from db_2025.sentence_vault.model import *
 
+BULK_TIMEOUT_S = 300  # bulk statements work on a whole book; command_timeout of the pool is far too short
+
 """
 AI prompt:
 
@@ -27,119 +36,329 @@ all id's in create operations should be created by the database.
 """
 
 
+# named statements (see common.queries); the hot ones are prepared on every pool connection
+QUERIES = {
+    # books
+    'create_book': "INSERT INTO books (title) VALUES ($1) RETURNING *",
+    'get_book': "SELECT * FROM books WHERE id = $1",
+    'get_all_books': "SELECT * FROM books ORDER BY title OFFSET $1 LIMIT $2",
+    'update_book': "UPDATE books SET title = $1 WHERE id = $2 RETURNING *",
+    'mark_book_imported': "UPDATE books SET imported_at = NOW() WHERE id = $1 RETURNING *",
+    'delete_book': "DELETE FROM books WHERE id = $1",
+
+    # sentences
+    'create_sentence': """
+        INSERT INTO sentences (book_id, main_type, exact_type, tense, verbatim)
+        VALUES ($1, $2, $3, $4, $5)
+        RETURNING *
+    """,
+    'create_sentences_batch': """
+        INSERT INTO sentences (book_id, main_type, exact_type, tense, verbatim)
+        SELECT book_id, main_type, exact_type, tense, verbatim
+        FROM UNNEST($1::int[], $2::text[], $3::text[], $4::text[], $5::text[])
+                 WITH ORDINALITY AS t(book_id, main_type, exact_type, tense, verbatim, ord)
+        ORDER BY ord
+        RETURNING *
+    """,
+    'get_sentence': "SELECT * FROM sentences WHERE id = $1",
+    'get_all_sentences': """
+        SELECT *
+        FROM sentences
+        ORDER BY book_id, main_type, tense, id
+        OFFSET $1 LIMIT $2
+    """,
+    'update_sentence': """
+        UPDATE sentences
+        SET book_id    = $1,
+            main_type  = $2,
+            exact_type = $3,
+            tense      = $4,
+            verbatim   = $5
+        WHERE id = $6
+        RETURNING *
+    """,
+    'delete_sentence': "DELETE FROM sentences WHERE id = $1",
+
+    # words
+    'create_word': """
+        INSERT INTO words (word, nltk_token)
+        VALUES ($1, $2)
+        RETURNING *
+    """,
+    'create_words_batch': """
+        INSERT INTO words (word, nltk_token)
+        SELECT word, nltk_token
+        FROM UNNEST($1::text[], $2::text[]) WITH ORDINALITY AS t(word, nltk_token, ord)
+        ORDER BY ord
+        RETURNING *
+    """,
+    'get_word': "SELECT * FROM words WHERE id = $1",
+    'get_all_words': """
+        SELECT *
+        FROM words
+        ORDER BY word, id
+        OFFSET $1 LIMIT $2
+    """,
+    'update_word': """
+        UPDATE words
+        SET word       = $1,
+            nltk_token = $2
+        WHERE id = $3
+        RETURNING *
+    """,
+    'delete_word': "DELETE FROM words WHERE id = $1",
+
+    # sentence_words
+    'create_sentence_words': """
+        INSERT INTO sentence_words (sentence_id, word_id)
+        VALUES ($1, $2)
+        RETURNING *
+    """,
+    'create_sentence_words_batch': """
+        INSERT INTO sentence_words (sentence_id, word_id)
+        SELECT *
+        FROM UNNEST($1::int[], $2::int[])
+        ON CONFLICT DO NOTHING
+    """,
+    'get_sentence_words': "SELECT * FROM sentence_words WHERE sentence_id = $1 AND word_id = $2",
+    'get_all_sentence_words': """
+        SELECT *
+        FROM sentence_words
+        ORDER BY sentence_id, word_id
+        OFFSET $1 LIMIT $2
+    """,
+    'delete_sentence_words': "DELETE FROM sentence_words WHERE sentence_id = $1 AND word_id = $2",
+
+    # lookups
+    'get_word_by_verbatim': "SELECT * FROM words WHERE word = $1",
+    'get_or_create_word_id': """
+        WITH inserted AS (
+            INSERT INTO words (word, nltk_token)
+            VALUES ($1, $2)
+            ON CONFLICT (word) DO NOTHING
+            RETURNING id
+        )
+        SELECT id FROM inserted
+        UNION ALL
+        SELECT id FROM words WHERE word = $1
+        LIMIT 1
+    """,
+    'get_word_id': "SELECT id FROM words WHERE word = $1",
+    'get_or_create_word_ids': """
+        WITH input AS (SELECT *
+                       FROM UNNEST($1::text[], $2::text[]) WITH ORDINALITY AS t(word, nltk_token, ord)),
+             inserted AS (
+                 INSERT INTO words (word, nltk_token)
+                     SELECT DISTINCT ON (word) word, nltk_token
+                     FROM input
+                     ORDER BY word, ord
+                     ON CONFLICT (word) DO NOTHING
+                     RETURNING id, word)
+        SELECT COALESCE(inserted.id, words.id) AS id
+        FROM input
+                 LEFT JOIN inserted ON inserted.word = input.word
+                 LEFT JOIN words ON words.word = input.word
+        ORDER BY input.ord
+    """,
+    'get_word_ids_by_word': "SELECT word, id FROM words WHERE word = ANY($1)",
+    'get_word_ids': "SELECT word, id FROM words ORDER BY id LIMIT $1",
+    'get_sentence_by_verbatim': "SELECT * FROM sentences WHERE verbatim = $1 AND MD5(verbatim) = MD5($1);",
+    'get_book_by_title': "SELECT * FROM books WHERE title = $1",
+}
+registry.add_all('sentence_vault', QUERIES,
+                 hot={'get_book_by_title', 'get_sentence_by_verbatim', 'get_word_by_verbatim', 'get_word_id'})
+
+# rows -> models without re-validating trusted DB data (see common.repository)
+to_book = RowMapper(Book)
+to_sentence = RowMapper(Sentence)
+to_word = RowMapper(Word)
+to_sentence_words = RowMapper(SentenceWords)
+
+
+@instrumented('sentence_vault')
 class Repo:
-    def __init__(self, pool: Pool):
-        self.pool = pool
-
-    async def _execute_query(self, conn: Connection, query: str, *args):
-        try:
-            st = ts()
-            res = await conn.fetch(query, *args)
-            dur = ts() - st
-            logger.trace(f"Query execution time: {dur} seconds")
-            return res
-
-        except Exception as e:
-            # logger.error(f"Query execution failed: {query}, Error: {str(e)}")
-            raise
-
-    async def _execute_non_query(self, conn: Connection, query: str, *args):
+    def __init__(self, pool: Pool, counts: CountService | None = None, replica: Pool | None = None,
+                 read_your_writes_s: float = 1):
+        """
+        :param replica: pool of a read replica; reads go there, except within `read_your_writes_s`
+                        after a write of the same task (see common.db.PoolRouter)
+        """
+        self.pool = PoolRouter(pool, replica, read_your_writes_s)
+        self.counts = counts or CountService(replica or pool)
+
+    async def _execute_query(self, conn: Connection, name: str, *args):
+        """
+        Runs the named statement (see QUERIES); timings are collected by the query registry.
+        """
+        return await registry.fetch(conn, name, *args)
+
+    async def _execute_non_query(self, conn: Connection, name: str, *args):
         try:
-            await conn.execute(query, *args)
+            await registry.execute(conn, name, *args)
         except Exception as e:
-            logger.error(f"Non-query execution failed: {query}, Error: {str(e)}")
+            logger.error(f"Non-query execution failed: {name}, Error: {str(e)}")
             raise
 
     # Book CRUD
     async def create_book(self, book: Book) -> Book:
         async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "INSERT INTO books (title) VALUES ($1) RETURNING *",
-                book.title
-            )
-            return Book(**row)
+            row = await registry.fetchrow(conn, 'sentence_vault.create_book', book.title)
+            return to_book(row)
 
     async def get_book(self, id: int) -> Book | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM books WHERE id = $1", id)
-            return Book(**row) if row else None
+        async with self.pool.acquire_read() as conn:
+            row = await registry.fetchrow(conn, 'sentence_vault.get_book', id)
+            return to_book(row)
 
     async def get_all_books(self, offset: int = 0, limit: int = 10) -> list[Book]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT * FROM books ORDER BY title OFFSET $1 LIMIT $2",
-                offset, limit
-            )
-            return [Book(**row) for row in rows]
+        async with self.pool.acquire_read() as conn:
+            rows = await registry.fetch(conn, 'sentence_vault.get_all_books', offset, limit)
+            return to_book.many(rows)
 
-    async def get_books_count(self) -> int:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval("SELECT COUNT(*) FROM books")
+    async def get_books_page(self, limit: int = 10, cursor: str | None = None) -> tuple[list[Book], str | None]:
+        """
+        Keyset pagination (see common.cursor) in the order of get_all_books.
+
+        :return: books, and the cursor of the next page (None on the last page)
+        """
+        async with self.pool.acquire_read() as conn:
+            rows, next_cursor = await fetch_page(conn, 'books', ('title', 'id'), (str, int), limit, cursor)
+            return to_book.many(rows), next_cursor
+
+    async def get_books_count(self, mode: CountMode = CountMode.EXACT) -> int:
+        return await self.counts.count('books', mode)
 
     async def update_book(self, book: Book) -> Book | None:
         async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "UPDATE books SET title = $1 WHERE id = $2 RETURNING *",
-                book.title, book.id
-            )
-            return Book(**row) if row else None
+            row = await registry.fetchrow(conn, 'sentence_vault.update_book', book.title, book.id)
+            return to_book(row)
+
+    async def mark_book_imported(self, id: int) -> Book | None:
+        async with self.pool.acquire() as conn:
+            row = await registry.fetchrow(conn, 'sentence_vault.mark_book_imported', id)
+            return to_book(row)
 
     async def delete_book(self, id: int) -> bool:
         async with self.pool.acquire() as conn:
-            result = await conn.execute("DELETE FROM books WHERE id = $1", id)
+            result = await registry.execute(conn, 'sentence_vault.delete_book', id)
             return result != "DELETE 0"
 
     # Sentence CRUD Operations
     async def create_sentence(self, sentence: Sentence) -> Sentence:
-        query = """
-                INSERT INTO sentences (book_id, main_type, exact_type, tense, verbatim)
-                VALUES ($1, $2, $3, $4, $5)
-                RETURNING * \
-                """
         async with self.pool.acquire() as conn:
             record = await self._execute_query(
                 conn,
-                query,
+                'sentence_vault.create_sentence',
                 sentence.book_id,
                 sentence.main_type,
                 sentence.exact_type,
                 sentence.tense,
                 sentence.verbatim
             )
-            return Sentence(**record[0])
+            return to_sentence(record[0])
 
-    async def get_sentence(self, sentence_id: int) -> Sentence | None:
-        query = "SELECT * FROM sentences WHERE id = $1"
+    async def create_sentences_batch(self, sentences: list[Sentence]) -> list[Sentence]:
+        """
+        Inserts all sentences in one statement (columns passed as arrays and UNNEST-ed).
+
+        :return: saved sentences, in input order (ids are assigned in that order)
+        """
+        if not sentences:
+            return []
         async with self.pool.acquire() as conn:
-            records = await self._execute_query(conn, query, sentence_id)
-            return Sentence(**records[0]) if records else None
+            records = await self._execute_query(
+                conn,
+                'sentence_vault.create_sentences_batch',
+                [s.book_id for s in sentences],
+                [s.main_type for s in sentences],
+                [s.exact_type for s in sentences],
+                [s.tense for s in sentences],
+                [s.verbatim for s in sentences]
+            )
+            return sorted(to_sentence.many(records), key=lambda s: s.id)
+
+    async def get_sentence(self, sentence_id: int) -> Sentence | None:
+        async with self.pool.acquire_read() as conn:
+            records = await self._execute_query(conn, 'sentence_vault.get_sentence', sentence_id)
+            return to_sentence(records[0]) if records else None
 
     async def get_all_sentences(self, offset: int = 0, limit: int = 100) -> list[Sentence]:
-        query = """
-                SELECT *
-                FROM sentences
-                ORDER BY book_id, main_type, tense, id
-                OFFSET $1 LIMIT $2 \
-                """
-        async with self.pool.acquire() as conn:
-            records = await self._execute_query(conn, query, offset, limit)
-            return [Sentence(**record) for record in records]
+        async with self.pool.acquire_read() as conn:
+            records = await self._execute_query(conn, 'sentence_vault.get_all_sentences', offset, limit)
+            return to_sentence.many(records)
+
+    async def get_sentences_page(self, limit: int = 100,
+                                 cursor: str | None = None) -> tuple[list[Sentence], str | None]:
+        """
+        Keyset pagination (see common.cursor) in the order of get_all_sentences;
+        deep pages are as fast as the first one.
+
+        :return: sentences, and the cursor of the next page (None on the last page)
+        """
+        async with self.pool.acquire_read() as conn:
+            rows, next_cursor = await fetch_page(conn, 'sentences', ('book_id', 'main_type', 'tense', 'id'),
+                                                 (int, str, str, int), limit, cursor)
+            return to_sentence.many(rows), next_cursor
+
+    async def stream_sentences(self, book_id: int | None = None, main_type: str | None = None,
+                               tense: str | None = None, prefetch: int = 10_000,
+                               batch_size: int = 1_000) -> AsyncIterator[list[Sentence]]:
+        """
+        All sentences (optionally only of given book / type / tense), in the order of get_all_sentences,
+        streamed through a server-side cursor: memory use does not depend on the number of sentences.
+        The cursor lives in a transaction, so the whole stream sees one snapshot of the table.
+
+        :param prefetch: rows fetched from the server per round trip
+        :return: batches of up to `batch_size` sentences
+        """
+        filters, args = [], []
+        for column, value in (('book_id', book_id), ('main_type', main_type), ('tense', tense)):
+            if value is not None:
+                args.append(value)
+                filters.append(f'{column} = ${len(args)}')
+        where = f"WHERE {' AND '.join(filters)}" if filters else ''
+        query = f"SELECT * FROM sentences {where} ORDER BY book_id, main_type, tense, id"
+
+        async with self.pool.acquire_read() as conn:
+            async with conn.transaction():
+                batch = []
+                async for record in conn.cursor(query, *args, prefetch=prefetch):
+                    batch.append(to_sentence(record))
+                    if len(batch) == batch_size:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+
+    async def get_sentences_count(self, mode: CountMode = CountMode.EXACT) -> int:
+        return await self.counts.count('sentences', mode)
+
+    async def iter_sentence_digests(self, prefetch: int = 10_000) -> AsyncIterator[bytes]:
+        """
+        MD5 digests (16 raw bytes) of all sentence verbatims, streamed through a server-side cursor.
+        Read from the primary, like the other lookups the importer runs before writing (no replication lag).
+        """
+        query = "SELECT decode(MD5(verbatim), 'hex') AS digest FROM sentences"
+        async with self.pool.acquire_primary_read() as conn:
+            async with conn.transaction():
+                async for record in conn.cursor(query, prefetch=prefetch):
+                    yield record['digest']
+
+    async def iter_sentence_verbatims(self, prefetch: int = 10_000) -> AsyncIterator[tuple[int, str]]:
+        """
+        Pairs (id, verbatim) of all sentences, ordered by id, streamed through a server-side cursor.
+        """
+        query = "SELECT id, verbatim FROM sentences ORDER BY id"
+        async with self.pool.acquire_read() as conn:
+            async with conn.transaction():
+                async for record in conn.cursor(query, prefetch=prefetch):
+                    yield record['id'], record['verbatim']
 
     async def update_sentence(self, sentence_id: int, sentence: Sentence) -> Sentence | None:
-        query = """
-                UPDATE sentences
-                SET book_id    = $1,
-                    main_type  = $2,
-                    exact_type = $3,
-                    tense      = $4,
-                    verbatim   = $5
-                WHERE id = $6
-                RETURNING * \
-                """
         async with self.pool.acquire() as conn:
             records = await self._execute_query(
                 conn,
-                query,
+                'sentence_vault.update_sentence',
                 sentence.book_id,
                 sentence.main_type,
                 sentence.exact_type,
@@ -147,126 +366,299 @@ class Repo:
                 sentence.verbatim,
                 sentence_id
             )
-            return Sentence(**records[0]) if records else None
+            return to_sentence(records[0]) if records else None
 
     async def delete_sentence(self, sentence_id: int) -> bool:
-        query = "DELETE FROM sentences WHERE id = $1"
         async with self.pool.acquire() as conn:
-            await self._execute_non_query(conn, query, sentence_id)
+            await self._execute_non_query(conn, 'sentence_vault.delete_sentence', sentence_id)
             return True
 
     # Word CRUD Operations
     async def create_word(self, word: Word) -> Word:
-        query = """
-                INSERT INTO words (word, nltk_token)
-                VALUES ($1, $2)
-                RETURNING * \
-                """
         async with self.pool.acquire() as conn:
             record = await self._execute_query(
                 conn,
-                query,
+                'sentence_vault.create_word',
                 word.word,
                 word.nltk_token
             )
-            return Word(**record[0])
+            return to_word(record[0])
 
-    async def get_word(self, word_id: int) -> Word | None:
-        query = "SELECT * FROM words WHERE id = $1"
+    async def create_words_batch(self, words: list[Word]) -> list[Word]:
+        """
+        Inserts all words in one statement; fails (as create_word) if any of them already exists.
+
+        :return: saved words, in input order
+        """
+        if not words:
+            return []
         async with self.pool.acquire() as conn:
-            records = await self._execute_query(conn, query, word_id)
-            return Word(**records[0]) if records else None
+            records = await self._execute_query(
+                conn,
+                'sentence_vault.create_words_batch',
+                [w.word for w in words],
+                [w.nltk_token for w in words]
+            )
+            return sorted(to_word.many(records), key=lambda w: w.id)
+
+    async def get_word(self, word_id: int) -> Word | None:
+        async with self.pool.acquire_read() as conn:
+            records = await self._execute_query(conn, 'sentence_vault.get_word', word_id)
+            return to_word(records[0]) if records else None
 
     async def get_all_words(self, offset: int = 0, limit: int = 100) -> list[Word]:
-        query = """
-                SELECT *
-                FROM words
-                ORDER BY word, id
-                OFFSET $1 LIMIT $2 \
-                """
-        async with self.pool.acquire() as conn:
-            records = await self._execute_query(conn, query, offset, limit)
-            return [Word(**record) for record in records]
+        async with self.pool.acquire_read() as conn:
+            records = await self._execute_query(conn, 'sentence_vault.get_all_words', offset, limit)
+            return to_word.many(records)
+
+    async def get_words_page(self, limit: int = 100, cursor: str | None = None) -> tuple[list[Word], str | None]:
+        """
+        Keyset pagination (see common.cursor) in the order of get_all_words.
+
+        :return: words, and the cursor of the next page (None on the last page)
+        """
+        async with self.pool.acquire_read() as conn:
+            rows, next_cursor = await fetch_page(conn, 'words', ('word', 'id'), (str, int), limit, cursor)
+            return to_word.many(rows), next_cursor
 
     async def update_word(self, word_id: int, word: Word) -> Word | None:
-        query = """
-                UPDATE words
-                SET word       = $1,
-                    nltk_token = $2
-                WHERE id = $3
-                RETURNING * \
-                """
         async with self.pool.acquire() as conn:
             records = await self._execute_query(
                 conn,
-                query,
+                'sentence_vault.update_word',
                 word.word,
                 word.nltk_token,
                 word_id
             )
-            return Word(**records[0]) if records else None
+            return to_word(records[0]) if records else None
 
     async def delete_word(self, word_id: int) -> bool:
-        query = "DELETE FROM words WHERE id = $1"
         async with self.pool.acquire() as conn:
-            await self._execute_non_query(conn, query, word_id)
+            await self._execute_non_query(conn, 'sentence_vault.delete_word', word_id)
             return True
 
     # SentenceWords CRUD Operations
     async def create_sentence_words(self, sentence_words: SentenceWords) -> SentenceWords:
-        query = """
-                INSERT INTO sentence_words (sentence_id, word_id)
-                VALUES ($1, $2)
-                RETURNING * \
-                """
         async with self.pool.acquire() as conn:
             record = await self._execute_query(
                 conn,
-                query,
+                'sentence_vault.create_sentence_words',
                 sentence_words.sentence_id,
                 sentence_words.word_id
             )
-            return SentenceWords(**record[0])
+            return to_sentence_words(record[0])
 
-    async def get_sentence_words(self, sentence_id: int, word_id: int) -> SentenceWords | None:
-        query = "SELECT * FROM sentence_words WHERE sentence_id = $1 AND word_id = $2"
+    async def create_sentence_words_batch(self, sentence_words: list[SentenceWords]) -> int:
+        """
+        Inserts all links in one statement; links which already exist are skipped.
+
+        :return: number of inserted links
+        """
+        if not sentence_words:
+            return 0
         async with self.pool.acquire() as conn:
-            records = await self._execute_query(conn, query, sentence_id, word_id)
-            return SentenceWords(**records[0]) if records else None
+            status = await registry.execute(
+                conn,
+                'sentence_vault.create_sentence_words_batch',
+                [sw.sentence_id for sw in sentence_words],
+                [sw.word_id for sw in sentence_words]
+            )
+            return int(status.split()[-1])
+
+    async def get_sentence_words(self, sentence_id: int, word_id: int) -> SentenceWords | None:
+        async with self.pool.acquire_read() as conn:
+            records = await self._execute_query(conn, 'sentence_vault.get_sentence_words', sentence_id, word_id)
+            return to_sentence_words(records[0]) if records else None
 
     async def get_all_sentence_words(self, offset: int = 0, limit: int = 100) -> list[SentenceWords]:
-        query = """
-                SELECT *
-                FROM sentence_words
-                ORDER BY sentence_id, word_id
-                OFFSET $1 LIMIT $2 \
-                """
-        async with self.pool.acquire() as conn:
-            records = await self._execute_query(conn, query, offset, limit)
-            return [SentenceWords(**record) for record in records]
+        async with self.pool.acquire_read() as conn:
+            records = await self._execute_query(conn, 'sentence_vault.get_all_sentence_words', offset, limit)
+            return to_sentence_words.many(records)
+
+    async def get_sentence_words_page(self, limit: int = 100,
+                                      cursor: str | None = None) -> tuple[list[SentenceWords], str | None]:
+        """
+        Keyset pagination (see common.cursor) in the order of get_all_sentence_words.
+
+        :return: links, and the cursor of the next page (None on the last page)
+        """
+        async with self.pool.acquire_read() as conn:
+            rows, next_cursor = await fetch_page(conn, 'sentence_words', ('sentence_id', 'word_id'), (int, int),
+                                                 limit, cursor)
+            return to_sentence_words.many(rows), next_cursor
 
     async def delete_sentence_words(self, sentence_id: int, word_id: int) -> bool:
-        query = "DELETE FROM sentence_words WHERE sentence_id = $1 AND word_id = $2"
         async with self.pool.acquire() as conn:
-            await self._execute_non_query(conn, query, sentence_id, word_id)
+            await self._execute_non_query(conn, 'sentence_vault.delete_sentence_words', sentence_id, word_id)
             return True
 
     # extra
 
     async def get_word_by_verbatim(self, word_verbatim: str) -> Word | None:
-        query = "SELECT * FROM words WHERE word = $1"
+        async with self.pool.acquire_primary_read() as conn:
+            records = await self._execute_query(conn, 'sentence_vault.get_word_by_verbatim', word_verbatim)
+            return to_word(records[0]) if records else None
+
+    async def get_or_create_word_id(self, word: Word) -> int:
+        """
+        Id of the word, inserting it if it does not exist yet; one round trip, and no
+        UniqueViolationError when another importer inserts the same word concurrently.
+        """
         async with self.pool.acquire() as conn:
-            records = await self._execute_query(conn, query, word_verbatim)
-            return Word(**records[0]) if records else None
+            word_id = await registry.fetchval(conn, 'sentence_vault.get_or_create_word_id', word.word, word.nltk_token)
+            if word_id is None:
+                # inserted by a concurrent transaction which committed after our snapshot was taken
+                word_id = await registry.fetchval(conn, 'sentence_vault.get_word_id', word.word)
+            return word_id
+
+    async def get_or_create_word_ids(self, words: list[Word]) -> list[int]:
+        """
+        Batch version of get_or_create_word_id: ids of the words (in input order; repeated words get the same id),
+        with missing words inserted, in one round trip (plus one more if other transactions raced us).
+        """
+        if not words:
+            return []
+        async with self.pool.acquire() as conn:
+            records = await self._execute_query(conn, 'sentence_vault.get_or_create_word_ids', [w.word for w in words], [w.nltk_token for w in words])
+            ids = [record['id'] for record in records]
+            # words inserted by concurrent transactions are not visible to the statement above
+            missing = list({w.word for w, word_id in zip(words, ids) if word_id is None})
+            if missing:
+                records = await self._execute_query(conn, 'sentence_vault.get_word_ids_by_word', missing)
+                found = {record['word']: record['id'] for record in records}
+                ids = [found[w.word] if word_id is None else word_id for w, word_id in zip(words, ids)]
+            return ids
+
+    async def get_word_ids(self, limit: int) -> dict[str, int]:
+        """
+        Mapping word -> id for the first `limit` words (in insertion order; frequent words come first).
+        """
+        async with self.pool.acquire_read() as conn:
+            records = await self._execute_query(conn, 'sentence_vault.get_word_ids', limit)
+            return {record['word']: record['id'] for record in records}
+
+    async def iter_words_by_word(self, prefetch: int = 10_000) -> AsyncIterator[tuple[str, int]]:
+        """
+        Pairs (word, id) of all words, ordered by code points of the word (COLLATE "C", the order of Python's str),
+        streamed through a server-side cursor.
+        """
+        query = 'SELECT word, id FROM words ORDER BY word COLLATE "C", id'
+        async with self.pool.acquire_read() as conn:
+            async with conn.transaction():
+                async for record in conn.cursor(query, prefetch=prefetch):
+                    yield record['word'], record['id']
 
     async def get_sentence_by_verbatim(self, sentence_verbatim: str) -> Sentence | None:
-        query = "SELECT * FROM sentences WHERE verbatim = $1 AND MD5(verbatim) = MD5($1);"
-        async with self.pool.acquire() as conn:
-            records = await self._execute_query(conn, query, sentence_verbatim)
-            return Sentence(**records[0]) if records else None
+        async with self.pool.acquire_primary_read() as conn:
+            records = await self._execute_query(conn, 'sentence_vault.get_sentence_by_verbatim', sentence_verbatim)
+            return to_sentence(records[0]) if records else None
 
     async def get_book_by_title(self, title: str) -> Book | None:
-        query = "SELECT * FROM books WHERE title = $1"
+        async with self.pool.acquire_primary_read() as conn:
+            records = await self._execute_query(conn, 'sentence_vault.get_book_by_title', title)
+            return to_book(records[0]) if records else None
+
+    # bulk ingestion
+
+    async def bulk_import_sentences(
+            self,
+            analysed: list[tuple[Sentence, list[Word]]] | AsyncIterable[list[tuple[Sentence, list[Word]]]]
+    ) -> int:
+        """
+        Saves many (already tagged) sentences together with their verbs in a handful of round trips.
+
+        Rows are COPY-ed into a temporary staging table and merged into `words`, `sentences` and
+        `sentence_words` with set-based statements, all in one transaction. Sentences already present
+        in the DB (or repeated within the batch) are skipped, as in `import_book.save_sentence`.
+
+        :param analysed: pairs (sentence with book_id, main_type, exact_type, tense and verbatim filled; its verbs);
+                         either a list, or an async iterable of batches (COPY-ed as they arrive, so that
+                         the whole book never has to be held in memory; the connection and the transaction
+                         are then held until the iterable is exhausted, so it should not wait for tagging)
+        :return: number of newly inserted sentences
+        """
         async with self.pool.acquire() as conn:
-            records = await self._execute_query(conn, query, title)
-            return Book(**records[0]) if records else None
+            async with conn.transaction():
+                await conn.execute("""
+                    CREATE TEMP TABLE stage_sentences (
+                        ord        INTEGER,
+                        book_id    INTEGER,
+                        main_type  VARCHAR(50),
+                        exact_type VARCHAR(100),
+                        tense      VARCHAR(50),
+                        verbatim   TEXT,
+                        verbs      TEXT[],
+                        verb_tags  TEXT[]
+                    ) ON COMMIT DROP;
+                    CREATE TEMP TABLE stage_links (
+                        sentence_id INTEGER,
+                        verbatim    TEXT
+                    ) ON COMMIT DROP;
+                """)
+                n_staged = 0
+                async for batch in _as_batches(analysed):
+                    records = [
+                        (n_staged + i, s.book_id, s.main_type, s.exact_type, s.tense, s.verbatim,
+                         [v.word for v in verbs], [v.nltk_token for v in verbs])
+                        for i, (s, verbs) in enumerate(batch)
+                    ]
+                    await conn.copy_records_to_table(
+                        'stage_sentences',
+                        records=records,
+                        columns=['ord', 'book_id', 'main_type', 'exact_type', 'tense', 'verbatim', 'verbs',
+                                 'verb_tags'],
+                        timeout=BULK_TIMEOUT_S,
+                    )
+                    n_staged += len(records)
+                await conn.execute("ANALYZE stage_sentences")
+
+                # words: ordered by word, so that concurrent importers lock rows in the same order
+                await conn.execute("""
+                    INSERT INTO words (word, nltk_token)
+                    SELECT DISTINCT ON (v.word) v.word, v.nltk_token
+                    FROM stage_sentences s,
+                         unnest(s.verbs, s.verb_tags) AS v(word, nltk_token)
+                    ORDER BY v.word
+                    ON CONFLICT (word) DO NOTHING
+                """, timeout=BULK_TIMEOUT_S)
+
+                # sentences: no unique constraint on verbatim, so dedup goes through the MD5 index
+                status = await conn.execute("""
+                    WITH inserted AS (
+                        INSERT INTO sentences (book_id, main_type, exact_type, tense, verbatim)
+                        SELECT d.book_id, d.main_type, d.exact_type, d.tense, d.verbatim
+                        FROM (SELECT DISTINCT ON (verbatim) *
+                              FROM stage_sentences
+                              ORDER BY verbatim, ord) d
+                        WHERE NOT EXISTS (SELECT 1
+                                          FROM sentences x
+                                          WHERE MD5(x.verbatim) = MD5(d.verbatim)
+                                            AND x.verbatim = d.verbatim)
+                        ORDER BY d.ord
+                        RETURNING id, verbatim
+                    )
+                    INSERT INTO stage_links (sentence_id, verbatim)
+                    SELECT id, verbatim FROM inserted
+                """, timeout=BULK_TIMEOUT_S)
+
+                await conn.execute("""
+                    INSERT INTO sentence_words (sentence_id, word_id)
+                    SELECT DISTINCT l.sentence_id, w.id
+                    FROM stage_links l
+                    JOIN stage_sentences s ON s.verbatim = l.verbatim
+                    CROSS JOIN LATERAL unnest(s.verbs) AS v(word)
+                    JOIN words w ON w.word = v.word
+                    ON CONFLICT DO NOTHING
+                """, timeout=BULK_TIMEOUT_S)
+
+        inserted = int(status.split()[-1])
+        logger.debug(f'bulk import: {inserted} of {n_staged} sentences inserted')
+        return inserted
+
+
+async def _as_batches(items: list | AsyncIterable[list]) -> AsyncIterator[list]:
+    if isinstance(items, list):
+        yield items
+    else:
+        async for batch in items:
+            yield batch
@@ -1,8 +1,13 @@
 import re
-from nltk import pos_tag, word_tokenize
+from collections.abc import Iterable, Iterator
+from functools import cache
+
+from nltk import word_tokenize
+from nltk.tag import PerceptronTagger
+from nltk.tokenize.punkt import PunktTokenizer
 import nltk
 
-from db_2025.sentence_vault.model import Word
+from db_2025.sentence_vault.model import Word, SentenceAnalysis
 
 
 def setup_nltk():
@@ -13,6 +18,14 @@ def setup_nltk():
     nltk.download('averaged_perceptron_tagger_eng')
 
 
+@cache
+def get_tagger() -> PerceptronTagger:
+    """
+    Perceptron tagger (the one used by nltk.pos_tag), loaded once per process.
+    """
+    return PerceptronTagger()
+
+
 def extract_sentences(file_path: str) -> list[str]:
     """
     Extracts and returns sentences from a text file. This function reads the content
@@ -35,7 +48,88 @@ def extract_sentences(file_path: str) -> list[str]:
     return sentences
 
 
-def classify_sentences(sentences: list[str]) -> dict[str, list[str]]:
+def iter_sentences(file_path: str, chunk_size: int = 2 ** 20, max_sentence: int = 2 ** 16) -> Iterator[str]:
+    """
+    Streaming version of extract_sentences: reads the file in chunks of `chunk_size` characters
+    and yields sentences one by one, so memory use does not depend on the size of the file.
+
+    The last two sentences of each chunk are carried over and tokenized again together with the next
+    chunk: the last one may be incomplete, and where the one before it ends may depend on how the last
+    one goes on (e.g. a chunk ending in 'U.S.?' is split after 'U.S.'). A run of text without sentence boundaries longer than
+    `max_sentence` characters is cut at its last space (so that it is not re-tokenized with every chunk).
+
+    :param file_path: The file path of the text file from which sentences are to be extracted.
+    :param chunk_size: number of characters read at once
+    :param max_sentence: longest carried-over text
+    :return: iterator over sentences of the file
+    """
+    tokenizer = _get_sentence_tokenizer()
+    carry = ''
+    with open(file_path, 'r', encoding='utf-8') as file:
+        while chunk := file.read(chunk_size):
+            # Replace newlines and multiple spaces with a single space
+            text = re.sub(r'\s+', ' ', carry + chunk).lstrip()  # a sentence starts here
+            spans = list(tokenizer.span_tokenize(text))
+            if len(spans) < 3:
+                carry = text
+                if len(carry) > max_sentence:
+                    cut = carry.rfind(' ', 0, len(carry) - 1)
+                    cut = cut if cut > 0 else len(carry)
+                    if head := carry[:cut].strip():
+                        yield head
+                    carry = carry[cut:]
+                continue
+            for start, end in spans[:-2]:
+                yield text[start:end]
+            carry = text[spans[-2][0]:]  # keeps trailing whitespace, which separates it from the next chunk
+    carry = carry.strip()
+    if carry:
+        yield from tokenizer.tokenize(carry)
+
+
+@cache
+def _get_sentence_tokenizer() -> PunktTokenizer:
+    return PunktTokenizer('english')  # the tokenizer used by nltk.sent_tokenize
+
+
+def classify_sentence(sentence: str) -> str | None:
+    """
+    Main type of the sentence ('declarative', 'interrogative', 'imperative' or 'exclamatory'),
+    based on its ending punctuation or structural characteristics; None for sentences shorter
+    than 20 characters (which are ignored).
+    """
+    if len(sentence) < 20:
+        return None
+    sentence = sentence.strip()
+    # Interrogative: Ends with '?'
+    if sentence.endswith('?'):
+        return 'interrogative'
+    # Exclamatory: Ends with '!'
+    elif sentence.endswith('!'):
+        return 'exclamatory'
+    # Imperative: Starts with a verb or lacks a subject (heuristic)
+    elif (sentence.split()[0].lower() in [
+        'go', 'come', 'stop', 'run', 'look', 'listen', 'do', 'be', 'take', 'give']
+          or len(sentence.split()) < 3):
+        return 'imperative'
+    # Declarative: Default for sentences ending with '.'
+    else:
+        return 'declarative'
+
+
+def iter_classified_sentences(sentences: Iterable[str]) -> Iterator[tuple[str, str]]:
+    """
+    Lazy version of classify_sentences (main types only).
+
+    :return: iterator over pairs (main type, stripped sentence); short sentences are skipped
+    """
+    for sentence in sentences:
+        main_type = classify_sentence(sentence)
+        if main_type is not None:
+            yield main_type, sentence.strip()
+
+
+def classify_sentences(sentences: list[str], with_simple: bool = True) -> dict[str, list[str]]:
     """
     Classifies a list of sentences into various grammatical categories. The function
     analyzes each sentence in the input list and categorizes it based on its ending
@@ -45,46 +139,44 @@ def classify_sentences(sentences: list[str]) -> dict[str, list[str]]:
 
     :param sentences: A list of sentences to be classified
     :type sentences: list[str]
+    :param with_simple: if False, the 'simple' list is left empty; this skips POS-tagging
+                        of every declarative sentence (callers that tag sentences anyway
+                        should use analyse_sentence instead)
 
     :return: A dictionary where the keys are sentence types ('declarative',
              'interrogative', 'imperative', 'exclamatory', and 'simple'),
              and the values are lists of sentences belonging to each category
     :rtype: dict[str, list[str]]
     """
-    declarative = []
-    interrogative = []
-    imperative = []
-    exclamatory = []
-    simple = []
-
-    for sentence in sentences:
-        if len(sentence) < 20:
-            continue
-        sentence = sentence.strip()
-        # Interrogative: Ends with '?'
-        if sentence.endswith('?'):
-            interrogative.append(sentence)
-        # Exclamatory: Ends with '!'
-        elif sentence.endswith('!'):
-            exclamatory.append(sentence)
-        # Imperative: Starts with a verb or lacks a subject (heuristic)
-        elif (sentence.split()[0].lower() in [
-            'go', 'come', 'stop', 'run', 'look', 'listen', 'do', 'be', 'take', 'give']
-              or len(sentence.split()) < 3):
-            imperative.append(sentence)
-        # Declarative: Default for sentences ending with '.'
-        else:
-            declarative.append(sentence)
-            if is_simple_declarative(sentence):
-                simple.append(sentence)
-
-    return {
-        'declarative': declarative,
-        'interrogative': interrogative,
-        'imperative': imperative,
-        'exclamatory': exclamatory,
-        'simple': simple,
+    result = {
+        'declarative': [],
+        'interrogative': [],
+        'imperative': [],
+        'exclamatory': [],
+        'simple': [],
     }
+    for main_type, sentence in iter_classified_sentences(sentences):
+        result[main_type].append(sentence)
+        if main_type == 'declarative' and with_simple and is_simple_declarative(sentence):
+            result['simple'].append(sentence)
+
+    return result
+
+
+def analyse_sentence(sentence: str) -> SentenceAnalysis:
+    """
+    Tokenizes and POS-tags the sentence once, and derives from the tags everything
+    we store about it: its verbs, tense and whether it is a simple declarative.
+
+    :param sentence: single sentence
+    :return: SentenceAnalysis (verbs, tense, is_simple)
+    """
+    tagged = get_tagger().tag(word_tokenize(sentence)) if isinstance(sentence, str) else []
+    return SentenceAnalysis(
+        verbs=_verbs_from_tags(tagged),
+        tense=_tense_from_tags(tagged),
+        is_simple=_is_simple_declarative_from_tags(sentence, tagged),
+    )
 
 
 def is_simple_declarative(input_str):
@@ -92,6 +184,20 @@ def is_simple_declarative(input_str):
     Check if a string is a simple declarative statement.
     Returns True if the string meets all conditions, False otherwise.
     """
+    if not isinstance(input_str, str) or not input_str.strip().endswith('.'):
+        return False  # cheap checks first; no need to tag
+    return analyse_sentence(input_str).is_simple
+
+
+def extract_verbs(sentence: str) -> list[Word]:
+    return analyse_sentence(sentence).verbs
+
+
+def infer_tense(sentence: str) -> str:
+    return analyse_sentence(sentence).tense
+
+
+def _is_simple_declarative_from_tags(input_str, tagged: list[tuple[str, str]]) -> bool:
     # Ensure input is a non-empty string
     if not isinstance(input_str, str) or not input_str.strip():
         return False
@@ -101,9 +207,11 @@ def is_simple_declarative(input_str):
     if not input_str.endswith('.'):
         return False
 
-    # Tokenize and POS tag
-    tokens = word_tokenize(input_str[:-1])  # Remove period for processing
-    tagged = pos_tag(tokens)
+    # Drop the final period (tagged separately by nltk)
+    if tagged and tagged[-1][0] == '.':
+        tagged = tagged[:-1]
+    if not tagged:
+        return False
 
     # 1. Express a complete thought (has subject and predicate)
     has_subject = False
@@ -144,12 +252,7 @@ def is_simple_declarative(input_str):
     return True
 
 
-def extract_verbs(sentence: str) -> list[Word]:
-    # Tokenize the sentence into words
-    tokens = nltk.word_tokenize(sentence)
-    # Perform POS tagging
-    tagged = nltk.pos_tag(tokens)
-
+def _verbs_from_tags(tagged: list[tuple[str, str]]) -> list[Word]:
     # List to store verb objects
     verbs = []
     # Verb tags in NLTK start with 'VB' (e.g., VB, VBD, VBG, VBN, VBP, VBZ)
@@ -162,10 +265,7 @@ def extract_verbs(sentence: str) -> list[Word]:
     return verbs
 
 
-def infer_tense(sentence: str) -> str:
-    tokens = word_tokenize(sentence)
-    tagged = pos_tag(tokens)
-
+def _tense_from_tags(tagged: list[tuple[str, str]]) -> str:
     # Initialize tense indicators
     past = False
     present = False
@@ -0,0 +1,66 @@
+import hashlib
+import math
+
+from loguru import logger
+
+from db_2025.common.general import ts, duration
+from db_2025.sentence_vault.repo import Repo
+
+
+class SentenceBloomFilter:
+    """
+    Bloom filter over MD5 digests of sentence verbatims (same digests as the `MD5(verbatim)` index).
+
+    `might_contain` never gives false negatives, so the DB has to be asked only on a (possible) hit;
+    for sentences not seen before (most of a new book) the lookup round trip is skipped.
+    Memory: ~1.2 bytes per sentence at 1% false positives, i.e. ~60MB for 50M sentences.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float = 0.01):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.n_bits = max(8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.n_items = 0
+        self._bits = bytearray((self.n_bits + 7) // 8)
+
+    @staticmethod
+    def digest(verbatim: str) -> bytes:
+        return hashlib.md5(verbatim.encode('utf-8')).digest()
+
+    def add(self, verbatim: str):
+        self.add_digest(self.digest(verbatim))
+
+    def might_contain(self, verbatim: str) -> bool:
+        return self.might_contain_digest(self.digest(verbatim))
+
+    def add_digest(self, digest: bytes):
+        for pos in self._positions(digest):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.n_items += 1
+
+    def might_contain_digest(self, digest: bytes) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+    def size_mb(self) -> float:
+        return len(self._bits) / 2 ** 20
+
+    def _positions(self, digest: bytes):
+        # md5 is already uniform: use its two halves for double hashing
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.n_bits for i in range(self.n_hashes))
+
+    @classmethod
+    async def load(cls, repo: Repo, fp_rate: float = 0.01, growth: float = 1.5) -> 'SentenceBloomFilter':
+        """
+        Builds the filter from all sentences in the DB, with room for `growth` times as many sentences.
+        """
+        st = ts()
+        n_sentences = await repo.get_sentences_count()
+        bloom = cls(capacity=max(int(n_sentences * growth), 100_000), fp_rate=fp_rate)
+        async for digest in repo.iter_sentence_digests():
+            bloom.add_digest(digest)
+        logger.info(f'sentence filter: loaded {bloom.n_items} digests in {duration(st)}, '
+                    f'{bloom.size_mb():.1f}MB, {bloom.n_hashes} hashes')
+        return bloom
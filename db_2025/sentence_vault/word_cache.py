@@ -0,0 +1,121 @@
+import asyncio
+from collections import OrderedDict
+
+from loguru import logger
+
+from db_2025.sentence_vault.model import Word
+from db_2025.sentence_vault.repo import Repo
+
+
+class WordCache:
+    """
+    In-process LRU cache word -> id in front of the `words` table.
+
+    Misses are resolved with a single INSERT ... ON CONFLICT DO NOTHING (see Repo.get_or_create_word_id),
+    so the cache stays correct when several importers insert words in parallel: ids of existing rows never change.
+    Concurrent misses for the same word (within this process) share one query.
+    """
+
+    def __init__(self, repo: Repo, max_size: int = 200_000):
+        self.repo = repo
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._ids: OrderedDict[str, int] = OrderedDict()
+        self._pending: dict[str, asyncio.Future] = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    async def warm_up(self, n_words: int | None = None) -> int:
+        """
+        Loads up to `n_words` (default: max_size) words from the DB.
+
+        :return: number of cached words
+        """
+        ids = await self.repo.get_word_ids(limit=min(n_words or self.max_size, self.max_size))
+        for word, word_id in ids.items():
+            self._put(word, word_id)
+        logger.info(f'word cache: pre-loaded {len(ids)} words')
+        return len(self._ids)
+
+    async def get_id(self, word: Word) -> int:
+        word_id = self._ids.get(word.word)
+        if word_id is not None:
+            self._ids.move_to_end(word.word)
+            self.hits += 1
+            return word_id
+
+        self.misses += 1
+        pending = self._pending.get(word.word)
+        if pending is not None:
+            return await pending
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[word.word] = future
+        try:
+            word_id = await self.repo.get_or_create_word_id(word)
+            self._put(word.word, word_id)
+            future.set_result(word_id)
+            return word_id
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # marked as retrieved: no other task may be waiting for it
+            raise
+        finally:
+            del self._pending[word.word]
+
+    async def get_ids(self, words: list[Word]) -> list[int]:
+        """
+        Ids of the words (in input order); all misses are resolved with one Repo.get_or_create_word_ids call.
+        """
+        ids: dict[str, int] = {}
+        waiting: dict[str, asyncio.Future] = {}  # misses already being resolved by other tasks
+        missing: dict[str, Word] = {}
+        for word in words:
+            if word.word in ids or word.word in waiting or word.word in missing:
+                continue
+            word_id = self._ids.get(word.word)
+            if word_id is not None:
+                self._ids.move_to_end(word.word)
+                self.hits += 1
+                ids[word.word] = word_id
+            elif word.word in self._pending:
+                self.misses += 1
+                waiting[word.word] = self._pending[word.word]
+            else:
+                self.misses += 1
+                missing[word.word] = word
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {w: loop.create_future() for w in missing}
+            self._pending.update(futures)
+            try:
+                new_ids = await self.repo.get_or_create_word_ids(list(missing.values()))
+                for (w, future), word_id in zip(futures.items(), new_ids):
+                    self._put(w, word_id)
+                    future.set_result(word_id)
+                    ids[w] = word_id
+            except Exception as e:
+                for future in futures.values():
+                    if not future.done():
+                        future.set_exception(e)
+                        future.exception()  # marked as retrieved: no other task may be waiting for it
+                raise
+            finally:
+                for w in futures:
+                    del self._pending[w]
+        for w, future in waiting.items():
+            ids[w] = await future
+        return [ids[word.word] for word in words]
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _put(self, word: str, word_id: int):
+        self._ids[word] = word_id
+        self._ids.move_to_end(word)
+        if len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
@@ -1,17 +1,27 @@
-from fastapi import FastAPI, HTTPException, Depends, Query
+import asyncio
+from collections.abc import Awaitable
+
+from fastapi import FastAPI, HTTPException, Depends, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from contextlib import asynccontextmanager
 from typing import Optional
 import asyncpg
 import os
 from dotenv import load_dotenv
+from datetime import date
 from uuid import UUID
 
 from loguru import logger
 
-from repo import Repo
-from db_2025.subscriptions.model import User, Plan, Invoice, ExtraService, Subscription
+from repo import Repo, Loaders
+from db_2025.common.counts import CountMode
+from db_2025.common.db import get_db_connection_pool, get_replica_pool
+from db_2025.common.instrumentation import prometheus_text, snapshot
+from db_2025.subscriptions.model import User, Plan, Invoice, ExtraService, Subscription, SubscriptionDetails
+from db_2025.subscriptions.model import OverdueInvoice, UserReceivables, AgingBucket, UserBillingSummary
+from db_2025.subscriptions.partitions import InvoicePartitions
 
 """
 Created with AI via prompt:
@@ -28,22 +38,28 @@ load_dotenv()
 
 # Global repository instance
 repo: Optional[Repo] = None
+HOT_PREFIXES = ('subscriptions',)  # hot statements of the query registry prepared on every connection
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global repo
     # Startup
-    database_url = os.getenv("DB_URL")
-    pool = await asyncpg.create_pool(database_url)
-    logger.info("database connected!")
-    repo = Repo(pool)
+    pool = await get_db_connection_pool(hot_prefixes=HOT_PREFIXES)  # prepares the app's hot statements
+    replica = await get_replica_pool(hot_prefixes=HOT_PREFIXES)  # None unless DB_REPLICA_URL is set
+    repo = Repo(pool, replica=replica)
+    try:
+        await InvoicePartitions(pool).create_ahead()
+    except asyncpg.PostgresError as e:  # e.g. DB not migrated to partitioned invoices yet
+        logger.warning(f'could not create partitions of invoices: {e}')
 
     yield
 
     # Shutdown
     if pool:
         await pool.close()
+    if replica:
+        await replica.close()
 
 
 app = FastAPI(
@@ -60,6 +76,11 @@ def get_repo() -> Repo:
     return repo
 
 
+def get_loaders(repo: Repo = Depends(get_repo)) -> Loaders:
+    # new for every request, so that loaded objects are not shared between requests
+    return repo.loaders()
+
+
 # Define the origins that should be allowed (e.g., your Next.js frontend)
 origins = [
     "http://localhost:3000",  # Your Next.js frontend
@@ -72,9 +93,48 @@ app.add_middleware(
     allow_credentials=True,  # Allow cookies or auth headers (if needed)
     allow_methods=["*"],  # Allow all HTTP methods (GET, POST, etc.)
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Next-Cursor"],  # lets the frontend read the cursor of the next page
 )
 
 
+async def json_page(page: Awaitable[tuple[bytes, str | None]]) -> Response:
+    """
+    Awaits a repo.get_page_json call and returns the JSON as it is (no second validation / serialization
+    pass through response_model, which only documents the response); the cursor of the next page goes
+    to the X-Next-Cursor header (no header on the last page).
+    """
+    try:
+        content, next_cursor = await page
+    except ValueError as e:  # malformed cursor
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+async def subscription_details(loaders: Loaders, subscription: Subscription,
+                               invoices: bool = False) -> SubscriptionDetails:
+    """
+    The subscription with its user, plan (and invoices); lookups of concurrent calls are batched by the loaders.
+    """
+    loads = [loaders.users.load(subscription.user_id), loaders.plans.load(subscription.plan_id)]
+    if invoices:
+        loads.append(loaders.invoices_of_subscription.load(subscription.id))
+    user, plan, *rest = await asyncio.gather(*loads)
+    return SubscriptionDetails(**subscription.model_dump(), user=user, plan=plan, invoices=rest[0] if rest else None)
+
+
+# Metrics endpoints
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Timings of repository calls and statements, in the Prometheus text format."""
+    return prometheus_text()
+
+
+@app.get("/metrics/snapshot")
+async def metrics_snapshot():
+    return snapshot()
+
+
 # User endpoints
 @app.post("/users/", response_model=User, status_code=201)
 async def create_user(user: User, repo: Repo = Depends(get_repo)):
@@ -92,18 +152,28 @@ async def get_user(user_id: int, repo: Repo = Depends(get_repo)):
     return user
 
 
+@app.get("/users/{user_id}/billing-summary", response_model=UserBillingSummary)
+async def get_billing_summary(user_id: int, repo: Repo = Depends(get_repo)):
+    """Active subscriptions, next renewal and unpaid total of the user, in one row lookup."""
+    summary = await repo.get_billing_summary(user_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="User not found")
+    return summary
+
+
 @app.get("/users/", response_model=list[User])
 async def get_all_users(
         limit: int = Query(10, ge=1, le=100),
-        offset: int = Query(0, ge=0),
+        offset: int = Query(0, ge=0, description="deprecated, use cursor"),
+        cursor: str | None = Query(None, description="X-Next-Cursor header of the previous page"),
         repo: Repo = Depends(get_repo)
 ):
-    return await repo.get_all_users(limit, offset)
+    return await json_page(repo.get_page_json('users', limit, cursor, offset))
 
 
 @app.get("/users/count/")
-async def get_users_count(repo: Repo = Depends(get_repo)):
-    count = await repo.get_users_count()
+async def get_users_count(mode: CountMode = Query(CountMode.CACHED), repo: Repo = Depends(get_repo)):
+    count = await repo.get_users_count(mode)
     return {"count": count}
 
 
@@ -143,15 +213,16 @@ async def get_plan(plan_id: UUID, repo: Repo = Depends(get_repo)):
 @app.get("/plans/", response_model=list[Plan])
 async def get_all_plans(
         limit: int = Query(10, ge=1, le=100),
-        offset: int = Query(0, ge=0),
+        offset: int = Query(0, ge=0, description="deprecated, use cursor"),
+        cursor: str | None = Query(None, description="X-Next-Cursor header of the previous page"),
         repo: Repo = Depends(get_repo)
 ):
-    return await repo.get_all_plans(limit, offset)
+    return await json_page(repo.get_page_json('plans', limit, cursor, offset))
 
 
 @app.get("/plans/count/")
-async def get_plans_count(repo: Repo = Depends(get_repo)):
-    count = await repo.get_plans_count()
+async def get_plans_count(mode: CountMode = Query(CountMode.EXACT), repo: Repo = Depends(get_repo)):
+    count = await repo.get_plans_count(mode)
     return {"count": count}
 
 
@@ -181,8 +252,10 @@ async def create_invoice(invoice: Invoice, repo: Repo = Depends(get_repo)):
 
 
 @app.get("/invoices/{invoice_id}", response_model=Invoice)
-async def get_invoice(invoice_id: UUID, repo: Repo = Depends(get_repo)):
-    invoice = await repo.get_invoice(invoice_id)
+async def get_invoice(invoice_id: UUID,
+                      issue_date: date | None = Query(None, description="if known, only its partition is read"),
+                      repo: Repo = Depends(get_repo)):
+    invoice = await repo.get_invoice(invoice_id, issue_date)
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     return invoice
@@ -191,15 +264,26 @@ async def get_invoice(invoice_id: UUID, repo: Repo = Depends(get_repo)):
 @app.get("/invoices/", response_model=list[Invoice])
 async def get_all_invoices(
         limit: int = Query(10, ge=1, le=100),
-        offset: int = Query(0, ge=0),
+        offset: int = Query(0, ge=0, description="deprecated, use cursor"),
+        cursor: str | None = Query(None, description="X-Next-Cursor header of the previous page"),
         repo: Repo = Depends(get_repo)
 ):
-    return await repo.get_all_invoices(limit, offset)
+    return await json_page(repo.get_page_json('invoices', limit, cursor, offset))
+
+
+@app.get("/invoices/issued/", response_model=list[Invoice])
+async def get_invoices_issued_between(
+        start: date,
+        end: date = Query(..., description="exclusive"),
+        limit: int = Query(100, ge=1, le=1000),
+        repo: Repo = Depends(get_repo)
+):
+    return await repo.get_invoices_issued_between(start, end, limit)
 
 
 @app.get("/invoices/count/")
-async def get_invoices_count(repo: Repo = Depends(get_repo)):
-    count = await repo.get_invoices_count()
+async def get_invoices_count(mode: CountMode = Query(CountMode.ESTIMATE), repo: Repo = Depends(get_repo)):
+    count = await repo.get_invoices_count(mode)
     return {"count": count}
 
 
@@ -239,15 +323,16 @@ async def get_extra_service(service_id: UUID, repo: Repo = Depends(get_repo)):
 @app.get("/extra-services/", response_model=list[ExtraService])
 async def get_all_extra_services(
         limit: int = Query(10, ge=1, le=100),
-        offset: int = Query(0, ge=0),
+        offset: int = Query(0, ge=0, description="deprecated, use cursor"),
+        cursor: str | None = Query(None, description="X-Next-Cursor header of the previous page"),
         repo: Repo = Depends(get_repo)
 ):
-    return await repo.get_all_extra_services(limit, offset)
+    return await json_page(repo.get_page_json('extra_services', limit, cursor, offset))
 
 
 @app.get("/extra-services/count/")
-async def get_extra_services_count(repo: Repo = Depends(get_repo)):
-    count = await repo.get_extra_services_count()
+async def get_extra_services_count(mode: CountMode = Query(CountMode.EXACT), repo: Repo = Depends(get_repo)):
+    count = await repo.get_extra_services_count(mode)
     return {"count": count}
 
 
@@ -287,15 +372,43 @@ async def get_subscription(subscription_id: UUID, repo: Repo = Depends(get_repo)
 @app.get("/subscriptions/", response_model=list[Subscription])
 async def get_all_subscriptions(
         limit: int = Query(10, ge=1, le=100),
-        offset: int = Query(0, ge=0),
+        offset: int = Query(0, ge=0, description="deprecated, use cursor"),
+        cursor: str | None = Query(None, description="X-Next-Cursor header of the previous page"),
         repo: Repo = Depends(get_repo)
 ):
-    return await repo.get_all_subscriptions(limit, offset)
+    return await json_page(repo.get_page_json('subscriptions', limit, cursor, offset))
+
+
+@app.get("/subscriptions/details/", response_model=list[SubscriptionDetails])
+async def get_subscriptions_details(
+        response: Response,
+        limit: int = Query(10, ge=1, le=100),
+        cursor: str | None = Query(None, description="X-Next-Cursor header of the previous page"),
+        invoices: bool = Query(False, description="include the invoices of the subscriptions"),
+        repo: Repo = Depends(get_repo),
+        loaders: Loaders = Depends(get_loaders)
+):
+    """Page of subscriptions with their users and plans; a constant number of queries, whatever the limit."""
+    try:
+        subscriptions, next_cursor = await repo.get_subscriptions_page(limit, cursor)
+    except ValueError as e:  # malformed cursor
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return await asyncio.gather(*(subscription_details(loaders, s, invoices) for s in subscriptions))
+
+
+@app.get("/subscriptions/{subscription_id}/details", response_model=SubscriptionDetails)
+async def get_subscription_details(subscription_id: UUID, loaders: Loaders = Depends(get_loaders)):
+    subscription = await loaders.subscriptions.load(subscription_id)
+    if not subscription:
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return await subscription_details(loaders, subscription, invoices=True)
 
 
 @app.get("/subscriptions/count/")
-async def get_subscriptions_count(repo: Repo = Depends(get_repo)):
-    count = await repo.get_subscriptions_count()
+async def get_subscriptions_count(mode: CountMode = Query(CountMode.CACHED), repo: Repo = Depends(get_repo)):
+    count = await repo.get_subscriptions_count(mode)
     return {"count": count}
 
 
@@ -315,6 +428,28 @@ async def delete_subscription(subscription_id: UUID, repo: Repo = Depends(get_re
         raise HTTPException(status_code=404, detail="Subscription not found")
 
 
+# Receivables endpoints
+@app.get("/receivables/users/", response_model=list[UserReceivables])
+async def get_users_receivables(
+        limit: int = Query(100, ge=1, le=1000),
+        as_of: date | None = Query(None, description="default: today"),
+        repo: Repo = Depends(get_repo)
+):
+    """Users with overdue invoices and their outstanding amounts, the largest overdue amounts first."""
+    return await repo.receivables.get_users_receivables(limit, as_of)
+
+
+@app.get("/receivables/users/{user_id}/overdue", response_model=list[OverdueInvoice])
+async def get_overdue_invoices(user_id: int, as_of: date | None = Query(None, description="default: today"),
+                               repo: Repo = Depends(get_repo)):
+    return await repo.receivables.get_overdue_invoices(user_id, as_of)
+
+
+@app.get("/receivables/aging/", response_model=list[AgingBucket])
+async def get_aging(as_of: date | None = Query(None, description="default: today"), repo: Repo = Depends(get_repo)):
+    return await repo.receivables.get_aging(as_of)
+
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
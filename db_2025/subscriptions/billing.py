@@ -0,0 +1,161 @@
+import asyncio
+import sys
+from asyncio import run
+from datetime import date
+
+import asyncpg
+from dotenv import load_dotenv
+from loguru import logger
+
+from db_2025.common.db import get_db_connection_pool
+from db_2025.common.general import ts, duration
+from db_2025.common.instrumentation import instrumented
+from db_2025.common.queries import registry
+from db_2025.subscriptions.model import BillingRun
+from db_2025.subscriptions.partitions import InvoicePartitions
+
+"""
+Billing runs: invoices of all subscriptions due on a day, generated in the DB.
+
+A subscription is due when its renewal_date is on or before the run date (and not after its end_date).
+For each due subscription one invoice is issued (issue_date = run date, due_date = run date +
+plan.payment_term_days), and its renewal_date is advanced by the plan's billing_interval ('1M', '3M', '12M').
+
+Subscriptions are processed in chunks of user ids, each with one set-based statement (INSERT ... SELECT
+of the invoices and UPDATE of the subscriptions, in one transaction), several chunks at a time.
+If a chunk fails, the other workers are cancelled (their current chunks roll back) and the run fails.
+
+Cost of the billing summaries (migration 5 -> 6): the chunk statement fires the statement-level triggers
+of both invoices and subscriptions, so the summary of every billed user is recomputed twice per chunk, in
+the chunk's transaction (each a few index lookups: the user's subscriptions and unpaid invoices). That adds
+two index-driven passes over the billed users to the one of the billing statement, so expect a run to take
+up to ~2-3x as long as with the triggers disabled (an estimate; not measured on 5M subscriptions yet).
+
+Runs are idempotent: invoices are unique per (subscription_id, issue_date), and only subscriptions whose
+invoice was actually inserted are renewed, so re-running a date (e.g. after a crash) only finishes
+what is left. A finished run (see table billing_runs) is not repeated unless forced.
+
+    python -m db_2025.subscriptions.billing [YYYY-MM-DD]
+"""
+
+BILL_CHUNK = registry.add('subscriptions.billing.bill_chunk', """
+WITH due AS (
+    SELECT s.id, s.user_id, s.renewal_date, p.payment_term_days,
+           make_interval(months => rtrim(p.billing_interval, 'M')::int) AS step
+    FROM subscriptions s
+    JOIN plans p ON p.id = s.plan_id
+    WHERE s.user_id >= $2 AND s.user_id < $3
+      AND s.renewal_date <= $1 AND s.renewal_date <= s.end_date
+      AND p.billing_interval ~ '^[0-9]+M$'  -- other (legacy) intervals are not billed
+    FOR UPDATE OF s
+), issued AS (
+    INSERT INTO invoices (is_paid, due_date, issue_date, user_id, subscription_id)
+    SELECT false, $1::date + payment_term_days, $1, user_id, id FROM due
+    ON CONFLICT (subscription_id, issue_date) DO NOTHING
+    RETURNING subscription_id
+), renewed AS (
+    UPDATE subscriptions s
+    SET renewal_date = (due.renewal_date + due.step)::date
+    FROM due JOIN issued ON issued.subscription_id = due.id
+    WHERE s.id = due.id
+    RETURNING s.id
+)
+SELECT (SELECT COUNT(*) FROM issued) AS invoices, (SELECT COUNT(*) FROM renewed) AS subscriptions
+""")
+
+START_RUN = registry.add('subscriptions.billing.start_run', """
+INSERT INTO billing_runs (run_date) VALUES ($1)
+ON CONFLICT (run_date) DO UPDATE SET started_at = CASE WHEN $2 THEN now() ELSE billing_runs.started_at END
+RETURNING *
+""")
+
+ADD_PROGRESS = registry.add('subscriptions.billing.add_progress', """
+UPDATE billing_runs SET subscriptions = subscriptions + $2, invoices = invoices + $3 WHERE run_date = $1
+""")
+
+FINISH_RUN = registry.add('subscriptions.billing.finish_run', """
+UPDATE billing_runs SET finished_at = now() WHERE run_date = $1 RETURNING *
+""")
+
+
+@instrumented('subscriptions.billing')
+class BillingEngine:
+    def __init__(self, pool: asyncpg.Pool, chunk_size: int = 10_000, workers: int = 4):
+        """
+        :param chunk_size: user ids per chunk (one transaction)
+        :param workers: chunks processed concurrently (each holds a connection of the pool)
+        """
+        self.pool = pool
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+    async def get_run(self, run_date: date) -> BillingRun | None:
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow("SELECT * FROM billing_runs WHERE run_date = $1", run_date)
+            return BillingRun(**row) if row else None
+
+    async def run(self, run_date: date, force: bool = False) -> BillingRun:
+        """
+        Bills the subscriptions due on `run_date`; returns at once if the run of the date has already finished
+        (unless `force`; a forced run only bills what became due since, e.g. newly added subscriptions).
+        """
+        async with self.pool.acquire() as conn:
+            started = BillingRun(**await registry.fetchrow(conn, START_RUN, run_date, force))
+            if started.finished_at and not force:
+                logger.info(f'billing run of {run_date} already finished at {started.finished_at}')
+                return started
+            first, last = await conn.fetchrow("SELECT MIN(user_id), MAX(user_id) FROM subscriptions")
+
+        await InvoicePartitions(self.pool).create_ahead(run_date)  # invoices of the run go to their month's partition
+        st = ts()
+        if first is not None:
+            chunks = asyncio.Queue()
+            for lo in range(first, last + 1, self.chunk_size):
+                chunks.put_nowait((lo, lo + self.chunk_size))
+            n_chunks = chunks.qsize()
+            try:
+                async with asyncio.TaskGroup() as workers:  # a failed worker cancels the others
+                    for _ in range(min(self.workers, n_chunks)):
+                        workers.create_task(self._worker(run_date, chunks))
+            except ExceptionGroup as e:
+                raise e.exceptions[0]
+            logger.info(f'billed {n_chunks} chunks of {self.chunk_size} users in {duration(st)}')
+
+        async with self.pool.acquire() as conn:
+            finished = BillingRun(**await registry.fetchrow(conn, FINISH_RUN, run_date))
+        logger.info(f'billing run of {run_date}: {finished.invoices} invoices, '
+                    f'{finished.subscriptions} subscriptions renewed')
+        return finished
+
+    async def bill_chunk(self, run_date: date, first_user_id: int, end_user_id: int) -> tuple[int, int]:
+        """
+        Bills the due subscriptions of users in [first_user_id, end_user_id) in one transaction.
+
+        :return: issued invoices, renewed subscriptions
+        """
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                row = await registry.fetchrow(conn, BILL_CHUNK, run_date, first_user_id, end_user_id)
+                if row['invoices']:
+                    await registry.execute(conn, ADD_PROGRESS, run_date, row['subscriptions'], row['invoices'])
+        return row['invoices'], row['subscriptions']
+
+    async def _worker(self, run_date: date, chunks: asyncio.Queue):
+        while not chunks.empty():
+            lo, hi = chunks.get_nowait()
+            invoices, _ = await self.bill_chunk(run_date, lo, hi)
+            logger.debug(f'users {lo}..{hi - 1}: {invoices} invoices')
+
+
+async def main():
+    load_dotenv()
+    run_date = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else date.today()
+    pool = await get_db_connection_pool(hot_prefixes=('subscriptions',))
+    try:
+        await BillingEngine(pool).run(run_date)
+    finally:
+        await pool.close()
+
+
+if __name__ == '__main__':
+    run(main())
@@ -91,6 +91,341 @@ DROP TABLE IF EXISTS users;
         
         """,
     ),
+    Migration(
+        start_version=2,
+        produces_version=3,
+        description='indexes for keyset pagination',
+        up_sql="""
+CREATE INDEX idx_users_name_id ON users (name, id);
+CREATE INDEX idx_plans_name_id ON plans (name, id);
+CREATE INDEX idx_extra_services_name_id ON extra_services (name, id);
+CREATE INDEX idx_invoices_issue_date_id ON invoices (issue_date DESC, id DESC);
+CREATE INDEX idx_subscriptions_renewal_date_id ON subscriptions (renewal_date DESC, id DESC);
+        """,
+        down_sql="""
+DROP INDEX IF EXISTS idx_users_name_id;
+DROP INDEX IF EXISTS idx_plans_name_id;
+DROP INDEX IF EXISTS idx_extra_services_name_id;
+DROP INDEX IF EXISTS idx_invoices_issue_date_id;
+DROP INDEX IF EXISTS idx_subscriptions_renewal_date_id;
+        """,
+    ),
+    Migration(
+        start_version=3,
+        produces_version=4,
+        description='billing runs',
+        up_sql="""
+-- at most one invoice per subscription and issue date: re-running a billing run issues no duplicates
+ALTER TABLE invoices ADD CONSTRAINT uq_invoices_subscription_issue_date UNIQUE (subscription_id, issue_date);
+CREATE INDEX idx_subscriptions_user_id_renewal_date ON subscriptions (user_id, renewal_date);
+
+CREATE TABLE billing_runs (
+    run_date DATE PRIMARY KEY,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    finished_at TIMESTAMPTZ NULL,
+    subscriptions INT NOT NULL DEFAULT 0,
+    invoices INT NOT NULL DEFAULT 0
+);
+        """,
+        down_sql="""
+DROP TABLE IF EXISTS billing_runs;
+DROP INDEX IF EXISTS idx_subscriptions_user_id_renewal_date;
+ALTER TABLE invoices DROP CONSTRAINT IF EXISTS uq_invoices_subscription_issue_date;
+        """,
+    ),
+    Migration(
+        start_version=4,
+        produces_version=5,
+        description='partial indexes of unpaid invoices (receivables)',
+        up_sql="""
+-- only unpaid invoices are indexed: a small, hot part of the table
+CREATE INDEX idx_invoices_unpaid_due_date ON invoices (due_date) WHERE NOT is_paid;
+CREATE INDEX idx_invoices_unpaid_user_id_due_date ON invoices (user_id, due_date) WHERE NOT is_paid;
+        """,
+        down_sql="""
+DROP INDEX IF EXISTS idx_invoices_unpaid_due_date;
+DROP INDEX IF EXISTS idx_invoices_unpaid_user_id_due_date;
+        """,
+    ),
+    Migration(
+        start_version=5,
+        produces_version=6,
+        description='per-user billing summary, maintained by triggers',
+        up_sql="""
+CREATE TABLE user_billing_summary (
+    user_id INT PRIMARY KEY,
+    active_subscriptions INT NOT NULL,  -- end_date not passed (at the time of the last refresh)
+    next_renewal_date DATE NULL,
+    unpaid_invoices INT NOT NULL,
+    unpaid_total NUMERIC(12, 2) NOT NULL,  -- prices of plans / extra services of the unpaid invoices
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    CONSTRAINT fk_user_summary FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- recomputes the summaries of the users (of all users if NULL)
+CREATE FUNCTION refresh_user_billing_summary(ids INT[]) RETURNS void LANGUAGE sql AS $$
+    INSERT INTO user_billing_summary AS b (user_id, active_subscriptions, next_renewal_date, unpaid_invoices,
+                                           unpaid_total, updated_at)
+    SELECT u.id, COALESCE(s.active, 0), s.next_renewal_date, COALESCE(i.unpaid, 0), COALESCE(i.total, 0), now()
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*) AS active, MIN(renewal_date) FILTER (WHERE renewal_date <= end_date) AS next_renewal_date
+        FROM subscriptions
+        WHERE user_id = u.id AND end_date >= CURRENT_DATE
+    ) s ON true
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*) AS unpaid, SUM(COALESCE(p.price, e.price)) AS total
+        FROM invoices inv
+        LEFT JOIN subscriptions sub ON sub.id = inv.subscription_id
+        LEFT JOIN plans p ON p.id = sub.plan_id
+        LEFT JOIN extra_services e ON e.id = inv.extra_service_id
+        WHERE inv.user_id = u.id AND NOT inv.is_paid
+    ) i ON true
+    WHERE ids IS NULL OR u.id = ANY(ids)
+    ON CONFLICT (user_id) DO UPDATE SET
+        active_subscriptions = EXCLUDED.active_subscriptions, next_renewal_date = EXCLUDED.next_renewal_date,
+        unpaid_invoices = EXCLUDED.unpaid_invoices, unpaid_total = EXCLUDED.unpaid_total,
+        updated_at = EXCLUDED.updated_at;
+$$;
+
+-- statement level: a set-based write (e.g. a billing run) refreshes each of its users once
+CREATE FUNCTION user_billing_summary_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_user_billing_summary(ARRAY(SELECT DISTINCT user_id FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_user_billing_summary(ARRAY(SELECT DISTINCT user_id FROM old_rows));
+    ELSE
+        PERFORM refresh_user_billing_summary(ARRAY(SELECT user_id FROM new_rows UNION SELECT user_id FROM old_rows));
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER trg_subscriptions_summary_insert AFTER INSERT ON subscriptions
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION user_billing_summary_changed();
+CREATE TRIGGER trg_subscriptions_summary_update AFTER UPDATE ON subscriptions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_billing_summary_changed();
+CREATE TRIGGER trg_subscriptions_summary_delete AFTER DELETE ON subscriptions
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION user_billing_summary_changed();
+CREATE TRIGGER trg_invoices_summary_insert AFTER INSERT ON invoices
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION user_billing_summary_changed();
+CREATE TRIGGER trg_invoices_summary_update AFTER UPDATE ON invoices
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_billing_summary_changed();
+CREATE TRIGGER trg_invoices_summary_delete AFTER DELETE ON invoices
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION user_billing_summary_changed();
+
+SELECT refresh_user_billing_summary(NULL);
+        """,
+        down_sql="""
+DROP TRIGGER IF EXISTS trg_subscriptions_summary_insert ON subscriptions;
+DROP TRIGGER IF EXISTS trg_subscriptions_summary_update ON subscriptions;
+DROP TRIGGER IF EXISTS trg_subscriptions_summary_delete ON subscriptions;
+DROP TRIGGER IF EXISTS trg_invoices_summary_insert ON invoices;
+DROP TRIGGER IF EXISTS trg_invoices_summary_update ON invoices;
+DROP TRIGGER IF EXISTS trg_invoices_summary_delete ON invoices;
+DROP FUNCTION IF EXISTS user_billing_summary_changed();
+DROP FUNCTION IF EXISTS refresh_user_billing_summary(INT[]);
+DROP TABLE IF EXISTS user_billing_summary;
+        """,
+    ),
+    Migration(
+        start_version=6,
+        produces_version=7,
+        description='monthly range partitions of invoices (by issue_date)',
+        up_sql="""
+-- the old table gives up its index names, then is copied into the partitioned one and dropped
+ALTER TABLE invoices RENAME TO invoices_unpartitioned;
+ALTER TABLE invoices_unpartitioned DROP CONSTRAINT invoices_pkey;
+ALTER TABLE invoices_unpartitioned DROP CONSTRAINT uq_invoices_subscription_issue_date;
+DROP INDEX idx_invoices_user_id;
+DROP INDEX idx_invoices_subscription_id;
+DROP INDEX idx_invoices_extra_service_id;
+DROP INDEX idx_invoices_issue_date_id;
+DROP INDEX idx_invoices_unpaid_due_date;
+DROP INDEX idx_invoices_unpaid_user_id_due_date;
+
+CREATE TABLE invoices (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    is_paid BOOLEAN NOT NULL,
+    due_date DATE NOT NULL,
+    issue_date DATE NOT NULL,
+    user_id INT NOT NULL,
+    subscription_id UUID NULL,
+    extra_service_id UUID NULL,
+    PRIMARY KEY (id, issue_date),  -- unique constraints of a partitioned table must include the partition key
+    CONSTRAINT uq_invoices_subscription_issue_date UNIQUE (subscription_id, issue_date),
+    CONSTRAINT fk_user_invoice FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+    CONSTRAINT fk_subscription FOREIGN KEY(subscription_id) REFERENCES subscriptions(id) ON DELETE CASCADE,
+    CONSTRAINT fk_extra_service FOREIGN KEY(extra_service_id) REFERENCES extra_services(id) ON DELETE CASCADE,
+    CONSTRAINT check_subscription_or_extra_service CHECK (
+        (subscription_id IS NULL AND extra_service_id IS NOT NULL) OR
+        (subscription_id IS NOT NULL AND extra_service_id IS NULL)
+    )
+) PARTITION BY RANGE (issue_date);
+
+-- catches issue dates without a partition; should stay empty (see partitions.py)
+CREATE TABLE invoices_default PARTITION OF invoices DEFAULT;
+
+-- creates the missing monthly partitions invoices_YYYY_MM of the months from first_day to last_day
+CREATE FUNCTION create_invoice_partitions(first_day DATE, last_day DATE) RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    month DATE := date_trunc('month', first_day)::date;
+    created INT := 0;
+BEGIN
+    WHILE month <= last_day LOOP
+        IF to_regclass('invoices_' || to_char(month, 'YYYY_MM')) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF invoices FOR VALUES FROM (%L) TO (%L)',
+                           'invoices_' || to_char(month, 'YYYY_MM'), month, (month + interval '1 month')::date);
+            created := created + 1;
+        END IF;
+        month := (month + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END
+$$;
+
+SELECT create_invoice_partitions(
+    COALESCE((SELECT MIN(issue_date) FROM invoices_unpartitioned), CURRENT_DATE),
+    GREATEST((SELECT MAX(issue_date) FROM invoices_unpartitioned), (CURRENT_DATE + interval '3 months')::date)
+);
+
+INSERT INTO invoices SELECT id, is_paid, due_date, issue_date, user_id, subscription_id, extra_service_id
+FROM invoices_unpartitioned;
+DROP TABLE invoices_unpartitioned;  -- with its summary triggers
+
+-- created on every partition
+CREATE INDEX idx_invoices_user_id ON invoices(user_id);
+CREATE INDEX idx_invoices_subscription_id ON invoices(subscription_id);
+CREATE INDEX idx_invoices_extra_service_id ON invoices(extra_service_id);
+CREATE INDEX idx_invoices_issue_date_id ON invoices (issue_date DESC, id DESC);
+CREATE INDEX idx_invoices_unpaid_due_date ON invoices (due_date) WHERE NOT is_paid;
+CREATE INDEX idx_invoices_unpaid_user_id_due_date ON invoices (user_id, due_date) WHERE NOT is_paid;
+
+CREATE TRIGGER trg_invoices_summary_insert AFTER INSERT ON invoices
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION user_billing_summary_changed();
+CREATE TRIGGER trg_invoices_summary_update AFTER UPDATE ON invoices
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_billing_summary_changed();
+CREATE TRIGGER trg_invoices_summary_delete AFTER DELETE ON invoices
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION user_billing_summary_changed();
+        """,
+        down_sql="""
+ALTER TABLE invoices RENAME TO invoices_partitioned;
+ALTER TABLE invoices_partitioned DROP CONSTRAINT invoices_pkey;
+ALTER TABLE invoices_partitioned DROP CONSTRAINT uq_invoices_subscription_issue_date;
+DROP INDEX idx_invoices_user_id;
+DROP INDEX idx_invoices_subscription_id;
+DROP INDEX idx_invoices_extra_service_id;
+DROP INDEX idx_invoices_issue_date_id;
+DROP INDEX idx_invoices_unpaid_due_date;
+DROP INDEX idx_invoices_unpaid_user_id_due_date;
+
+CREATE TABLE invoices (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    is_paid BOOLEAN NOT NULL,
+    due_date DATE NOT NULL,
+    issue_date DATE NOT NULL,
+    user_id INT NOT NULL,
+    subscription_id UUID NULL,
+    extra_service_id UUID NULL,
+    CONSTRAINT uq_invoices_subscription_issue_date UNIQUE (subscription_id, issue_date),
+    CONSTRAINT fk_user_invoice FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+    CONSTRAINT fk_subscription FOREIGN KEY(subscription_id) REFERENCES subscriptions(id) ON DELETE CASCADE,
+    CONSTRAINT fk_extra_service FOREIGN KEY(extra_service_id) REFERENCES extra_services(id) ON DELETE CASCADE,
+    CONSTRAINT check_subscription_or_extra_service CHECK (
+        (subscription_id IS NULL AND extra_service_id IS NOT NULL) OR
+        (subscription_id IS NOT NULL AND extra_service_id IS NULL)
+    )
+);
+-- detached partitions (archived invoices) are not copied back
+INSERT INTO invoices SELECT id, is_paid, due_date, issue_date, user_id, subscription_id, extra_service_id
+FROM invoices_partitioned;
+DROP TABLE invoices_partitioned;  -- with all its partitions
+DROP FUNCTION IF EXISTS create_invoice_partitions(DATE, DATE);
+
+CREATE INDEX idx_invoices_user_id ON invoices(user_id);
+CREATE INDEX idx_invoices_subscription_id ON invoices(subscription_id);
+CREATE INDEX idx_invoices_extra_service_id ON invoices(extra_service_id);
+CREATE INDEX idx_invoices_issue_date_id ON invoices (issue_date DESC, id DESC);
+CREATE INDEX idx_invoices_unpaid_due_date ON invoices (due_date) WHERE NOT is_paid;
+CREATE INDEX idx_invoices_unpaid_user_id_due_date ON invoices (user_id, due_date) WHERE NOT is_paid;
+
+CREATE TRIGGER trg_invoices_summary_insert AFTER INSERT ON invoices
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION user_billing_summary_changed();
+CREATE TRIGGER trg_invoices_summary_update AFTER UPDATE ON invoices
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_billing_summary_changed();
+CREATE TRIGGER trg_invoices_summary_delete AFTER DELETE ON invoices
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION user_billing_summary_changed();
+        """,
+    ),
+    Migration(
+        start_version=7,
+        produces_version=8,
+        description='billing summary refresh locks the summary rows before recomputing them',
+        up_sql="""
+-- Concurrent writes for one user (READ COMMITTED) used to recompute its summary each from a snapshot
+-- without the other's uncommitted rows, and the later upsert overwrote the earlier one: a lost update.
+-- Now the summary rows are locked first (created if missing, in user_id order to avoid deadlocks), and
+-- recomputed by a following statement, whose snapshot includes the transaction the lock waited for.
+CREATE OR REPLACE FUNCTION refresh_user_billing_summary(ids INT[]) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO user_billing_summary (user_id, active_subscriptions, unpaid_invoices, unpaid_total)
+    SELECT id, 0, 0, 0 FROM users WHERE ids IS NULL OR id = ANY(ids) ORDER BY id
+    ON CONFLICT (user_id) DO NOTHING;
+    PERFORM 1 FROM user_billing_summary WHERE ids IS NULL OR user_id = ANY(ids) ORDER BY user_id FOR UPDATE;
+
+    UPDATE user_billing_summary b
+    SET active_subscriptions = COALESCE(s.active, 0), next_renewal_date = s.next_renewal_date,
+        unpaid_invoices = COALESCE(i.unpaid, 0), unpaid_total = COALESCE(i.total, 0), updated_at = now()
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*) AS active, MIN(renewal_date) FILTER (WHERE renewal_date <= end_date) AS next_renewal_date
+        FROM subscriptions
+        WHERE user_id = u.id AND end_date >= CURRENT_DATE
+    ) s ON true
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*) AS unpaid, SUM(COALESCE(p.price, e.price)) AS total
+        FROM invoices inv
+        LEFT JOIN subscriptions sub ON sub.id = inv.subscription_id
+        LEFT JOIN plans p ON p.id = sub.plan_id
+        LEFT JOIN extra_services e ON e.id = inv.extra_service_id
+        WHERE inv.user_id = u.id AND NOT inv.is_paid
+    ) i ON true
+    WHERE b.user_id = u.id AND (ids IS NULL OR u.id = ANY(ids));
+END
+$$;
+        """,
+        down_sql="""
+CREATE OR REPLACE FUNCTION refresh_user_billing_summary(ids INT[]) RETURNS void LANGUAGE sql AS $$
+    INSERT INTO user_billing_summary AS b (user_id, active_subscriptions, next_renewal_date, unpaid_invoices,
+                                           unpaid_total, updated_at)
+    SELECT u.id, COALESCE(s.active, 0), s.next_renewal_date, COALESCE(i.unpaid, 0), COALESCE(i.total, 0), now()
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*) AS active, MIN(renewal_date) FILTER (WHERE renewal_date <= end_date) AS next_renewal_date
+        FROM subscriptions
+        WHERE user_id = u.id AND end_date >= CURRENT_DATE
+    ) s ON true
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*) AS unpaid, SUM(COALESCE(p.price, e.price)) AS total
+        FROM invoices inv
+        LEFT JOIN subscriptions sub ON sub.id = inv.subscription_id
+        LEFT JOIN plans p ON p.id = sub.plan_id
+        LEFT JOIN extra_services e ON e.id = inv.extra_service_id
+        WHERE inv.user_id = u.id AND NOT inv.is_paid
+    ) i ON true
+    WHERE ids IS NULL OR u.id = ANY(ids)
+    ON CONFLICT (user_id) DO UPDATE SET
+        active_subscriptions = EXCLUDED.active_subscriptions, next_renewal_date = EXCLUDED.next_renewal_date,
+        unpaid_invoices = EXCLUDED.unpaid_invoices, unpaid_total = EXCLUDED.unpaid_total,
+        updated_at = EXCLUDED.updated_at;
+$$;
+        """,
+    ),
 
 
 ]
@@ -11,7 +11,7 @@ from db_2025.subscriptions.migration_list import migrations
 async def main():
     load_dotenv()
 
-    pool = await get_db_connection_pool()
+    pool = await get_db_connection_pool(hot_prefixes=())  # the schema may not exist yet
     ver = await get_current_version(pool)
     logger.info(f'current version: {ver}')
 
@@ -1,4 +1,4 @@
-from datetime import date
+from datetime import date, datetime
 from uuid import UUID
 
 from pydantic import BaseModel
@@ -42,3 +42,47 @@ class Subscription(BaseModel):
     plan_id: UUID
     renewal_date: date  # on or after the next invoice issued
     end_date: date  # no renewals after this date
+
+
+class BillingRun(BaseModel):
+    run_date: date
+    started_at: datetime
+    finished_at: datetime | None = None  # None: running, or interrupted (a new run of the date resumes it)
+    subscriptions: int = 0  # renewed subscriptions
+    invoices: int = 0  # issued invoices
+
+
+class OverdueInvoice(Invoice):
+    amount: float | None = None  # price of the plan / extra service
+    days_overdue: int
+
+
+class UserReceivables(BaseModel):
+    user_id: int
+    invoices: int  # unpaid
+    outstanding: float  # amount of the unpaid invoices
+    overdue: float  # of which past due
+    oldest_due_date: date
+
+
+class AgingBucket(BaseModel):
+    bucket: str  # 'current' (not yet due), '1-30', '31-60', '61-90', '90+' days overdue
+    invoices: int
+    amount: float
+
+
+class UserBillingSummary(BaseModel):
+    # row of user_billing_summary, kept up to date by triggers on subscriptions and invoices
+    user_id: int
+    active_subscriptions: int = 0
+    next_renewal_date: date | None = None
+    unpaid_invoices: int = 0
+    unpaid_total: float = 0
+    updated_at: datetime | None = None  # None: user without subscriptions and invoices (no row)
+
+
+class SubscriptionDetails(Subscription):
+    # subscription with its related objects, for views (not a table)
+    user: User | None = None
+    plan: Plan | None = None
+    invoices: list[Invoice] | None = None  # None: not loaded
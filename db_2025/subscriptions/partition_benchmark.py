@@ -0,0 +1,114 @@
+import json
+import sys
+from asyncio import run
+from datetime import date
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from db_2025.common.cursor import keyset_query
+from db_2025.common.db import get_db_connection_pool
+from db_2025.common.general import ts, duration
+from db_2025.subscriptions.partitions import add_months
+
+"""
+Date-range queries on invoices, as a plain table vs. partitioned by month (see partitions.py).
+
+Builds both variants of the table in the schema partition_bench (dropped afterwards), with the same rows
+(`n_rows` invoices spread over `months` months) and indexes, then times the queries and reports
+the buffers they touched (EXPLAIN ANALYZE).
+
+    python -m db_2025.subscriptions.partition_benchmark [n_rows] [months]
+"""
+
+SCHEMA = 'partition_bench'
+FIRST_MONTH = date(2020, 1, 1)
+BULK_TIMEOUT_S = 1800  # loading, indexing and vacuuming millions of rows; command_timeout of the pool is far too short
+
+COLUMNS = """
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    is_paid BOOLEAN NOT NULL,
+    due_date DATE NOT NULL,
+    issue_date DATE NOT NULL,
+    user_id INT NOT NULL,
+    subscription_id UUID NULL,
+    extra_service_id UUID NULL
+"""
+
+QUERIES = {
+    'count of a month': "SELECT COUNT(*) FROM {table} WHERE issue_date >= $1 AND issue_date < $2",
+    'page of a month': "SELECT * FROM {table} WHERE issue_date >= $1 AND issue_date < $2 "
+                       "ORDER BY issue_date DESC, id DESC LIMIT 100",
+    'unpaid of a month': "SELECT COUNT(*) FROM {table} WHERE issue_date >= $1 AND issue_date < $2 AND NOT is_paid",
+}
+
+
+async def create_tables(conn, n_rows: int, months: int):
+    last_day = add_months(FIRST_MONTH, months)
+    await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}", timeout=BULK_TIMEOUT_S)
+    await conn.execute(f"CREATE TABLE {SCHEMA}.plain ({COLUMNS}, PRIMARY KEY (id, issue_date))")
+    await conn.execute(f"CREATE TABLE {SCHEMA}.partitioned ({COLUMNS}, PRIMARY KEY (id, issue_date)) "
+                       f"PARTITION BY RANGE (issue_date)")
+    for i in range(months):
+        month = add_months(FIRST_MONTH, i)
+        await conn.execute(f"CREATE TABLE {SCHEMA}.partitioned_{month:%Y_%m} PARTITION OF {SCHEMA}.partitioned "
+                           f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')")
+    st = ts()
+    await conn.execute(f"""
+        INSERT INTO {SCHEMA}.plain (is_paid, due_date, issue_date, user_id, subscription_id)
+        SELECT random() < 0.95, d + 14, d, (random() * 100000)::int, gen_random_uuid()
+        FROM (SELECT $1::date + (random() * ($2::date - $1::date - 1))::int AS d FROM generate_series(1, $3)) g
+    """, FIRST_MONTH, last_day, n_rows, timeout=BULK_TIMEOUT_S)
+    await conn.execute(f"INSERT INTO {SCHEMA}.partitioned SELECT * FROM {SCHEMA}.plain", timeout=BULK_TIMEOUT_S)
+    for table in ('plain', 'partitioned'):
+        await conn.execute(f"CREATE INDEX ON {SCHEMA}.{table} (issue_date DESC, id DESC)", timeout=BULK_TIMEOUT_S)
+        await conn.execute(f"CREATE INDEX ON {SCHEMA}.{table} (due_date) WHERE NOT is_paid", timeout=BULK_TIMEOUT_S)
+        await conn.execute(f"VACUUM ANALYZE {SCHEMA}.{table}", timeout=BULK_TIMEOUT_S)
+    logger.info(f'{n_rows} invoices in {months} months loaded in {duration(st)}')
+
+
+async def measure(conn, sql: str, args: tuple, repeat: int = 20) -> tuple[float, int]:
+    """
+    :return: average time [ms], and shared buffers touched by one execution
+    """
+    stmt = await conn.prepare(sql)
+    await stmt.fetch(*args)  # warm up the cache
+    st = ts()
+    for _ in range(repeat):
+        await stmt.fetch(*args)
+    avg_ms = (ts() - st) / repeat * 1000
+    plan = json.loads(await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", *args))[0]['Plan']
+    return avg_ms, plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0)
+
+
+async def main():
+    load_dotenv()
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    months = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    pool = await get_db_connection_pool()
+    try:
+        async with pool.acquire() as conn:
+            await create_tables(conn, n_rows, months)
+            month = add_months(FIRST_MONTH, months // 2)
+            cases = [(name, sql, (month, add_months(month, 1))) for name, sql in QUERIES.items()]
+            # keyset page (common.cursor) starting in the middle of the table: after the last row before the month
+            last = await conn.fetchrow(f"SELECT issue_date, id FROM {SCHEMA}.plain WHERE issue_date < $1 "
+                                       f"ORDER BY issue_date DESC, id DESC LIMIT 1", month)
+            if last is not None:  # None with a single month
+                cases.append(('keyset page', keyset_query('{table}', ('issue_date', 'id'), after=True, descending=True),
+                              (100, last['issue_date'], last['id'])))
+            for name, sql, args in cases:
+                plain = await measure(conn, sql.format(table=f'{SCHEMA}.plain'), args)
+                partitioned = await measure(conn, sql.format(table=f'{SCHEMA}.partitioned'), args)
+                print(f'{name:20} plain: {plain[0]:8.2f}ms {plain[1]:7} buffers | '
+                      f'partitioned: {partitioned[0]:8.2f}ms {partitioned[1]:7} buffers')
+    finally:
+        try:
+            async with pool.acquire() as conn:  # also after a failure: do not leave millions of rows behind
+                await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE", timeout=BULK_TIMEOUT_S)
+        finally:
+            await pool.close()
+
+
+if __name__ == '__main__':
+    run(main())
@@ -0,0 +1,136 @@
+import re
+import sys
+from asyncio import run
+from datetime import date
+
+import asyncpg
+from dotenv import load_dotenv
+from loguru import logger
+from pydantic import BaseModel
+
+from db_2025.common.db import get_db_connection_pool
+
+"""
+Maintenance of the monthly partitions of invoices (migration 6 -> 7).
+
+invoices is partitioned by RANGE (issue_date), one partition per month (invoices_YYYY_MM), plus
+invoices_default for dates without a partition. Partitions are created ahead (`months_ahead`), so that
+the default partition stays empty: a month cannot get its partition while the default one holds its rows.
+
+Old partitions are detached (`retention_months`): they stay as standalone tables (an archive, which may
+be dropped), and vacuum / indexes of invoices only deal with the recent months. A partition holding
+unpaid invoices is never detached.
+
+Queries filtering on issue_date (keyset pages of invoices, Repo.get_invoices_issued_between, lookups by
+id and issue_date) only read the partitions of the matching months.
+
+    python -m db_2025.subscriptions.partitions [retention_months]
+"""
+
+PARTITION_NAME = re.compile(r'^invoices_(\d{4})_(\d{2})$')
+
+
+class Partition(BaseModel):
+    name: str
+    month: date  # first day
+    rows: int  # estimate (pg_class.reltuples; -1 if never analyzed)
+
+
+def add_months(day: date, months: int) -> date:
+    """
+    :return: first day of the month `months` after the month of `day`
+    """
+    n = day.year * 12 + day.month - 1 + months
+    return date(n // 12, n % 12 + 1, 1)
+
+
+class InvoicePartitions:
+    def __init__(self, pool: asyncpg.Pool, months_ahead: int = 3, retention_months: int | None = None):
+        """
+        :param months_ahead: partitions of the following months are created in advance
+        :param retention_months: partitions of months older than that are detached (None: never)
+        """
+        self.pool = pool
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+
+    async def get_partitions(self) -> list[Partition]:
+        """
+        Monthly partitions of invoices, the oldest first.
+        """
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT c.relname AS name, c.reltuples::bigint AS rows
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'invoices'::regclass
+            """)
+        partitions = []
+        for row in rows:
+            if m := PARTITION_NAME.match(row['name']):
+                partitions.append(Partition(name=row['name'], month=date(int(m[1]), int(m[2]), 1), rows=row['rows']))
+        return sorted(partitions, key=lambda p: p.month)
+
+    async def create_ahead(self, today: date | None = None) -> int:
+        """
+        Creates the missing partitions from the month of `today` to `months_ahead` months later.
+
+        :return: number of created partitions
+        """
+        today = today or date.today()
+        async with self.pool.acquire() as conn:
+            created = await conn.fetchval("SELECT create_invoice_partitions($1, $2)", today,
+                                          add_months(today, self.months_ahead))
+            in_default = await conn.fetchval("SELECT EXISTS (SELECT 1 FROM invoices_default)")
+        if created:
+            logger.info(f'created {created} partitions of invoices')
+        if in_default:
+            logger.warning('invoices_default is not empty: invoices issued in months without a partition')
+        return created
+
+    async def detach_old(self, today: date | None = None, drop: bool = False) -> list[str]:
+        """
+        Detaches the partitions of months older than `retention_months` (and drops them, if `drop`),
+        except the ones holding unpaid invoices.
+
+        :return: names of the detached partitions
+        """
+        if self.retention_months is None:
+            return []
+        first_kept = add_months(today or date.today(), -self.retention_months)
+        detached = []
+        for partition in await self.get_partitions():
+            if partition.month >= first_kept:
+                break
+            async with self.pool.acquire() as conn:
+                if await conn.fetchval(f"SELECT EXISTS (SELECT 1 FROM {partition.name} WHERE NOT is_paid)"):
+                    logger.warning(f'{partition.name} has unpaid invoices, not detached')
+                    continue
+                await conn.execute(f"ALTER TABLE invoices DETACH PARTITION {partition.name}")
+                if drop:
+                    await conn.execute(f"DROP TABLE {partition.name}")
+            logger.info(f"{'dropped' if drop else 'detached'} {partition.name} (~{partition.rows} rows)")
+            detached.append(partition.name)
+        return detached
+
+    async def maintain(self, today: date | None = None) -> list[str]:
+        """
+        Creates the partitions ahead and detaches the old ones; to be run daily (e.g. from cron or at app start).
+
+        :return: names of the detached partitions
+        """
+        await self.create_ahead(today)
+        return await self.detach_old(today)
+
+
+async def main():
+    load_dotenv()
+    retention_months = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    pool = await get_db_connection_pool()
+    try:
+        await InvoicePartitions(pool, retention_months=retention_months).maintain()
+    finally:
+        await pool.close()
+
+
+if __name__ == '__main__':
+    run(main())
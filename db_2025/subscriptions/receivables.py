@@ -0,0 +1,89 @@
+from datetime import date
+
+import asyncpg
+
+from db_2025.common.db import PoolRouter
+from db_2025.common.instrumentation import instrumented
+from db_2025.common.queries import registry
+from db_2025.subscriptions.model import OverdueInvoice, UserReceivables, AgingBucket
+
+"""
+Receivables: unpaid invoices, and the amounts owed.
+
+An invoice has no amount of its own; it is the price of the plan of its subscription, or of its extra service.
+All queries read unpaid invoices only, through the partial indexes `... WHERE NOT is_paid` (migration 4 -> 5),
+so they do not scan the (mostly paid) rest of the table. Dates are compared with `as_of` (today by default).
+"""
+
+UNPAID = """
+    SELECT i.*, COALESCE(p.price, e.price) AS amount
+    FROM invoices i
+    LEFT JOIN subscriptions s ON s.id = i.subscription_id
+    LEFT JOIN plans p ON p.id = s.plan_id
+    LEFT JOIN extra_services e ON e.id = i.extra_service_id
+    WHERE NOT i.is_paid
+"""
+
+registry.add_all('subscriptions.receivables', {
+    'overdue_of_user': f"""
+        SELECT u.*, $2::date - u.due_date AS days_overdue
+        FROM ({UNPAID} AND i.user_id = $1 AND i.due_date < $2) u
+        ORDER BY u.due_date, u.id
+    """,
+    'by_user': f"""
+        SELECT user_id, COUNT(*) AS invoices, COALESCE(SUM(amount), 0) AS outstanding,
+               COALESCE(SUM(amount) FILTER (WHERE due_date < $1), 0) AS overdue, MIN(due_date) AS oldest_due_date
+        FROM ({UNPAID}) u
+        GROUP BY user_id
+        HAVING MIN(due_date) < $1
+        ORDER BY overdue DESC, user_id
+        LIMIT $2
+    """,
+    'aging': f"""
+        SELECT CASE
+                   WHEN due_date >= $1 THEN 'current'
+                   WHEN $1 - due_date <= 30 THEN '1-30'
+                   WHEN $1 - due_date <= 60 THEN '31-60'
+                   WHEN $1 - due_date <= 90 THEN '61-90'
+                   ELSE '90+'
+               END AS bucket,
+               COUNT(*) AS invoices, COALESCE(SUM(amount), 0) AS amount
+        FROM ({UNPAID}) u
+        GROUP BY 1
+    """,
+})
+
+AGING_BUCKETS = ('current', '1-30', '31-60', '61-90', '90+')
+
+
+@instrumented('subscriptions.receivables')
+class Receivables:
+    def __init__(self, pool: asyncpg.Pool | PoolRouter):
+        self.pool = pool if isinstance(pool, PoolRouter) else PoolRouter(pool)
+
+    async def get_overdue_invoices(self, user_id: int, as_of: date | None = None) -> list[OverdueInvoice]:
+        """
+        Unpaid invoices of the user past their due date, the oldest first.
+        """
+        async with self.pool.acquire_read() as conn:
+            rows = await registry.fetch(conn, 'subscriptions.receivables.overdue_of_user', user_id,
+                                        as_of or date.today())
+            return [OverdueInvoice(**row) for row in rows]
+
+    async def get_users_receivables(self, limit: int = 100, as_of: date | None = None) -> list[UserReceivables]:
+        """
+        Users with overdue invoices, and their outstanding amounts; the largest overdue amounts first.
+        """
+        async with self.pool.acquire_read() as conn:
+            rows = await registry.fetch(conn, 'subscriptions.receivables.by_user', as_of or date.today(), limit)
+            return [UserReceivables(**row) for row in rows]
+
+    async def get_aging(self, as_of: date | None = None) -> list[AgingBucket]:
+        """
+        Unpaid invoices and their amounts by days past due (all buckets, in AGING_BUCKETS order).
+        """
+        async with self.pool.acquire_read() as conn:
+            rows = await registry.fetch(conn, 'subscriptions.receivables.aging', as_of or date.today())
+        found = {row['bucket']: row for row in rows}
+        return [AgingBucket(**found[b]) if b in found else AgingBucket(bucket=b, invoices=0, amount=0)
+                for b in AGING_BUCKETS]
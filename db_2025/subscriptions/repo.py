@@ -3,7 +3,14 @@ from asyncio import run
 import asyncpg
 from dotenv import load_dotenv
 
+from db_2025.common.counts import CountService, CountMode
+from db_2025.common.dataloader import DataLoader, by_key
+from db_2025.common.db import PoolRouter
+from db_2025.common.instrumentation import instrumented
+from db_2025.common.queries import registry
+from db_2025.common.repository import CrudRepository
 from db_2025.subscriptions.model import *
+from db_2025.subscriptions.receivables import Receivables
 
 """
 AI generated repository, using prompt:
@@ -19,221 +26,328 @@ a count method, returning the number of rows in the table.
 
 """
 
+# one CrudRepository per table; their statements are named 'subscriptions.<table>.<operation>'
+class UserTable(CrudRepository):
+    model = User
+    table = 'users'
+    prefix = 'subscriptions.users'
+    order_by = ('name', 'id')
+    key_types = (str, int)
+
+
+class PlanTable(CrudRepository):
+    model = Plan
+    table = 'plans'
+    prefix = 'subscriptions.plans'
+    order_by = ('name', 'id')
+    key_types = (str, UUID)
+
+
+class InvoiceTable(CrudRepository):
+    model = Invoice
+    table = 'invoices'
+    prefix = 'subscriptions.invoices'
+    order_by = ('issue_date', 'id')
+    key_types = (date.fromisoformat, UUID)
+    descending = True
+
+    async def get_by_subscriptions(self, subscription_ids: list[UUID]) -> dict[UUID, list[Invoice]]:
+        """
+        Invoices of the subscriptions in one query, by subscription (newest first).
+        """
+        async with self.pool.acquire_read() as conn:
+            rows = await registry.fetch(conn, 'subscriptions.invoices.get_by_subscriptions', list(subscription_ids))
+        invoices = {id: [] for id in subscription_ids}
+        for invoice in self.to_model.many(rows):
+            invoices[invoice.subscription_id].append(invoice)
+        return invoices
+
+    async def get_by_id_and_issue_date(self, id: UUID, issue_date: date) -> Invoice | None:
+        """
+        As get_by_id, reading only the partition of the issue date (get_by_id looks into all of them).
+        """
+        async with self.pool.acquire_read() as conn:
+            row = await registry.fetchrow(conn, 'subscriptions.invoices.get_by_id_and_issue_date', id, issue_date)
+            return self.to_model(row)
+
+    async def get_issued_between(self, start: date, end: date, limit: int = 100) -> list[Invoice]:
+        """
+        Invoices issued on `start` .. `end` (exclusive), the newest first; reads only the partitions of these months.
+        """
+        async with self.pool.acquire_read() as conn:
+            rows = await registry.fetch(conn, 'subscriptions.invoices.get_issued_between', start, end, limit)
+            return self.to_model.many(rows)
+
+
+registry.add('subscriptions.invoices.get_by_subscriptions',
+             "SELECT * FROM invoices WHERE subscription_id = ANY($1) ORDER BY issue_date DESC, id DESC")
+registry.add('subscriptions.invoices.get_by_id_and_issue_date',
+             "SELECT * FROM invoices WHERE id = $1 AND issue_date = $2", hot=True)
+registry.add('subscriptions.invoices.get_issued_between',
+             "SELECT * FROM invoices WHERE issue_date >= $1 AND issue_date < $2"
+             " ORDER BY issue_date DESC, id DESC LIMIT $3")
+
+registry.add('subscriptions.user_billing_summary.get', "SELECT * FROM user_billing_summary WHERE user_id = $1",
+             hot=True)
+registry.add('subscriptions.user_billing_summary.refresh', "SELECT refresh_user_billing_summary($1)")
+
+
+class ExtraServiceTable(CrudRepository):
+    model = ExtraService
+    table = 'extra_services'
+    prefix = 'subscriptions.extra_services'
+    order_by = ('name', 'id')
+    key_types = (str, UUID)
+
+
+class SubscriptionTable(CrudRepository):
+    model = Subscription
+    table = 'subscriptions'
+    prefix = 'subscriptions.subscriptions'
+    order_by = ('renewal_date', 'id')
+    key_types = (date.fromisoformat, UUID)
+    descending = True
+
+
+@instrumented('subscriptions')
 class Repo:
-    def __init__(self, pool: asyncpg.Pool):
-        self.pool = pool
+    def __init__(self, pool: asyncpg.Pool, counts: CountService | None = None, replica: asyncpg.Pool | None = None,
+                 read_your_writes_s: float = 1):
+        """
+        :param replica: pool of a read replica; reads go there, except within `read_your_writes_s`
+                        after a write of the same task (see common.db.PoolRouter)
+        """
+        self.pool = PoolRouter(pool, replica, read_your_writes_s)
+        self.counts = counts or CountService(replica or pool)
+        self.users = UserTable(self.pool)
+        self.plans = PlanTable(self.pool)
+        self.invoices = InvoiceTable(self.pool)
+        self.extra_services = ExtraServiceTable(self.pool)
+        self.subscriptions = SubscriptionTable(self.pool)
+        self.receivables = Receivables(self.pool)
+        self.tables: dict[str, CrudRepository] = {
+            'users': self.users, 'plans': self.plans, 'invoices': self.invoices,
+            'extra_services': self.extra_services, 'subscriptions': self.subscriptions,
+        }
+
+    def loaders(self) -> 'Loaders':
+        """
+        New set of dataloaders; one per request (their cache is not invalidated by writes).
+        """
+        return Loaders(self)
+
+    async def get_page_json(self, table: str, limit: int = 10, cursor: str | None = None,
+                            offset: int = 0) -> tuple[bytes, str | None]:
+        """
+        Page of the table (in the order of its get_all_*) as JSON, without building models;
+        for list endpoints (see CrudRepository.get_page_json).
+        """
+        if table not in self.tables:
+            raise ValueError(f'unknown table: {table}')
+        return await self.tables[table].get_page_json(limit, cursor, offset)
 
     # User CRUD
     async def create_user(self, user: User) -> User:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "INSERT INTO users (name) VALUES ($1) RETURNING *",
-                user.name
-            )
-            return User(**row)
+        return await self.users.create(user)
 
     async def get_user(self, id: int) -> User | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM users WHERE id = $1", id)
-            return User(**row) if row else None
+        return await self.users.get_by_id(id)
+
+    async def get_many_users(self, ids: list[int]) -> list[User]:
+        return await self.users.get_many(ids)
 
     async def get_all_users(self, limit: int = 10, offset: int = 0) -> list[User]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT * FROM users ORDER BY name LIMIT $1 OFFSET $2",
-                limit, offset
-            )
-            return [User(**row) for row in rows]
+        return await self.users.get_all(limit, offset)
 
-    async def get_users_count(self) -> int:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval("SELECT COUNT(*) FROM users")
+    async def get_users_page(self, limit: int = 10, cursor: str | None = None) -> tuple[list[User], str | None]:
+        """
+        Keyset pagination (see common.cursor) in the order of get_all_users.
+
+        :return: users, and the cursor of the next page (None on the last page)
+        """
+        return await self.users.get_page(limit, cursor)
+
+    async def get_users_count(self, mode: CountMode = CountMode.EXACT) -> int:
+        return await self.counts.count('users', mode)
 
     async def update_user(self, user: User) -> User | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "UPDATE users SET name = $1 WHERE id = $2 RETURNING *",
-                user.name, user.id
-            )
-            return User(**row) if row else None
+        return await self.users.update(user.id, user)
 
     async def delete_user(self, id: int) -> bool:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "DELETE FROM users WHERE id = $1 RETURNING id",
-                id
-            )
-            return bool(row)
+        return await self.users.delete(id)
 
     # Plan CRUD
     async def create_plan(self, plan: Plan) -> Plan:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "INSERT INTO plans (name, price, payment_term_days, billing_interval) VALUES ($1, $2, $3, $4) RETURNING *",
-                plan.name, plan.price, plan.payment_term_days, plan.billing_interval
-            )
-            return Plan(**row)
+        return await self.plans.create(plan)
 
     async def get_plan(self, id: UUID) -> Plan | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM plans WHERE id = $1", id)
-            return Plan(**row) if row else None
+        return await self.plans.get_by_id(id)
+
+    async def get_many_plans(self, ids: list[UUID]) -> list[Plan]:
+        return await self.plans.get_many(ids)
 
     async def get_all_plans(self, limit: int = 10, offset: int = 0) -> list[Plan]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT * FROM plans ORDER BY name LIMIT $1 OFFSET $2",
-                limit, offset
-            )
-            return [Plan(**row) for row in rows]
+        return await self.plans.get_all(limit, offset)
 
-    async def get_plans_count(self) -> int:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval("SELECT COUNT(*) FROM plans")
+    async def get_plans_page(self, limit: int = 10, cursor: str | None = None) -> tuple[list[Plan], str | None]:
+        """
+        Keyset pagination (see common.cursor) in the order of get_all_plans.
+
+        :return: plans, and the cursor of the next page (None on the last page)
+        """
+        return await self.plans.get_page(limit, cursor)
+
+    async def get_plans_count(self, mode: CountMode = CountMode.EXACT) -> int:
+        return await self.counts.count('plans', mode)
 
     async def update_plan(self, plan: Plan) -> Plan | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "UPDATE plans SET name = $1, price = $2, payment_term_days = $3, billing_interval = $4 WHERE id = $5 RETURNING *",
-                plan.name, plan.price, plan.payment_term_days, plan.billing_interval, plan.id
-            )
-            return Plan(**row) if row else None
+        return await self.plans.update(plan.id, plan)
 
     async def delete_plan(self, id: UUID) -> bool:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "DELETE FROM plans WHERE id = $1 RETURNING id",
-                id
-            )
-            return bool(row)
+        return await self.plans.delete(id)
 
     # Invoice CRUD
     async def create_invoice(self, invoice: Invoice) -> Invoice:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "INSERT INTO invoices (is_paid, due_date, issue_date, user_id, subscription_id, extra_service_id) VALUES ($1, $2, $3, $4, $5, $6) RETURNING *",
-                invoice.is_paid, invoice.due_date, invoice.issue_date, invoice.user_id,
-                invoice.subscription_id, invoice.extra_service_id
-            )
-            return Invoice(**row)
-
-    async def get_invoice(self, id: UUID) -> Invoice | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM invoices WHERE id = $1", id)
-            return Invoice(**row) if row else None
+        return await self.invoices.create(invoice)
+
+    async def get_invoice(self, id: UUID, issue_date: date | None = None) -> Invoice | None:
+        """
+        :param issue_date: if known, only the partition of its month is read (see partitions.py)
+        """
+        if issue_date:
+            return await self.invoices.get_by_id_and_issue_date(id, issue_date)
+        return await self.invoices.get_by_id(id)
+
+    async def get_invoices_issued_between(self, start: date, end: date, limit: int = 100) -> list[Invoice]:
+        return await self.invoices.get_issued_between(start, end, limit)
+
+    async def get_many_invoices(self, ids: list[UUID]) -> list[Invoice]:
+        return await self.invoices.get_many(ids)
 
     async def get_all_invoices(self, limit: int = 10, offset: int = 0) -> list[Invoice]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT * FROM invoices ORDER BY issue_date DESC LIMIT $1 OFFSET $2",
-                limit, offset
-            )
-            return [Invoice(**row) for row in rows]
+        return await self.invoices.get_all(limit, offset)
 
-    async def get_invoices_count(self) -> int:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval("SELECT COUNT(*) FROM invoices")
+    async def get_invoices_of_subscriptions(self, subscription_ids: list[UUID]) -> dict[UUID, list[Invoice]]:
+        return await self.invoices.get_by_subscriptions(subscription_ids)
+
+    async def get_invoices_page(self, limit: int = 10, cursor: str | None = None) -> tuple[list[Invoice], str | None]:
+        """
+        Keyset pagination (see common.cursor) in the order of get_all_invoices.
+
+        :return: invoices, and the cursor of the next page (None on the last page)
+        """
+        return await self.invoices.get_page(limit, cursor)
+
+    async def get_invoices_count(self, mode: CountMode = CountMode.EXACT) -> int:
+        return await self.counts.count('invoices', mode)
 
     async def update_invoice(self, invoice: Invoice) -> Invoice | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "UPDATE invoices SET is_paid = $1, due_date = $2, issue_date = $3, user_id = $4, subscription_id = $5, extra_service_id = $6 WHERE id = $7 RETURNING *",
-                invoice.is_paid, invoice.due_date, invoice.issue_date, invoice.user_id,
-                invoice.subscription_id, invoice.extra_service_id, invoice.id
-            )
-            return Invoice(**row) if row else None
+        return await self.invoices.update(invoice.id, invoice)
 
     async def delete_invoice(self, id: UUID) -> bool:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "DELETE FROM invoices WHERE id = $1 RETURNING id",
-                id
-            )
-            return bool(row)
+        return await self.invoices.delete(id)
 
     # ExtraService CRUD
     async def create_extra_service(self, extra_service: ExtraService) -> ExtraService:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "INSERT INTO extra_services (name, price, payment_term_days) VALUES ($1, $2, $3) RETURNING *",
-                extra_service.name, extra_service.price, extra_service.payment_term_days
-            )
-            return ExtraService(**row)
+        return await self.extra_services.create(extra_service)
 
     async def get_extra_service(self, id: UUID) -> ExtraService | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM extra_services WHERE id = $1", id)
-            return ExtraService(**row) if row else None
+        return await self.extra_services.get_by_id(id)
+
+    async def get_many_extra_services(self, ids: list[UUID]) -> list[ExtraService]:
+        return await self.extra_services.get_many(ids)
 
     async def get_all_extra_services(self, limit: int = 10, offset: int = 0) -> list[ExtraService]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT * FROM extra_services ORDER BY name LIMIT $1 OFFSET $2",
-                limit, offset
-            )
-            return [ExtraService(**row) for row in rows]
+        return await self.extra_services.get_all(limit, offset)
 
-    async def get_extra_services_count(self) -> int:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval("SELECT COUNT(*) FROM extra_services")
+    async def get_extra_services_page(self, limit: int = 10,
+                                      cursor: str | None = None) -> tuple[list[ExtraService], str | None]:
+        """
+        Keyset pagination (see common.cursor) in the order of get_all_extra_services.
+
+        :return: extra services, and the cursor of the next page (None on the last page)
+        """
+        return await self.extra_services.get_page(limit, cursor)
+
+    async def get_extra_services_count(self, mode: CountMode = CountMode.EXACT) -> int:
+        return await self.counts.count('extra_services', mode)
 
     async def update_extra_service(self, extra_service: ExtraService) -> ExtraService | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "UPDATE extra_services SET name = $1, price = $2, payment_term_days = $3 WHERE id = $4 RETURNING *",
-                extra_service.name, extra_service.price, extra_service.payment_term_days, extra_service.id
-            )
-            return ExtraService(**row) if row else None
+        return await self.extra_services.update(extra_service.id, extra_service)
 
     async def delete_extra_service(self, id: UUID) -> bool:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "DELETE FROM extra_services WHERE id = $1 RETURNING id",
-                id
-            )
-            return bool(row)
+        return await self.extra_services.delete(id)
 
     # Subscription CRUD
     async def create_subscription(self, subscription: Subscription) -> Subscription:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "INSERT INTO subscriptions (user_id, plan_id, renewal_date, end_date) VALUES ($1, $2, $3, $4) RETURNING *",
-                subscription.user_id, subscription.plan_id, subscription.renewal_date, subscription.end_date
-            )
-            return Subscription(**row)
+        return await self.subscriptions.create(subscription)
 
     async def get_subscription(self, id: UUID) -> Subscription | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM subscriptions WHERE id = $1", id)
-            return Subscription(**row) if row else None
+        return await self.subscriptions.get_by_id(id)
+
+    async def get_many_subscriptions(self, ids: list[UUID]) -> list[Subscription]:
+        return await self.subscriptions.get_many(ids)
 
     async def get_all_subscriptions(self, limit: int = 10, offset: int = 0) -> list[Subscription]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT * FROM subscriptions ORDER BY renewal_date DESC LIMIT $1 OFFSET $2",
-                limit, offset
-            )
-            return [Subscription(**row) for row in rows]
+        return await self.subscriptions.get_all(limit, offset)
 
-    async def get_subscriptions_count(self) -> int:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval("SELECT COUNT(*) FROM subscriptions")
+    async def get_subscriptions_page(self, limit: int = 10,
+                                     cursor: str | None = None) -> tuple[list[Subscription], str | None]:
+        """
+        Keyset pagination (see common.cursor) in the order of get_all_subscriptions.
+
+        :return: subscriptions, and the cursor of the next page (None on the last page)
+        """
+        return await self.subscriptions.get_page(limit, cursor)
+
+    async def get_subscriptions_count(self, mode: CountMode = CountMode.EXACT) -> int:
+        return await self.counts.count('subscriptions', mode)
 
     async def update_subscription(self, subscription: Subscription) -> Subscription | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "UPDATE subscriptions SET user_id = $1, plan_id = $2, renewal_date = $3, end_date = $4 WHERE id = $5 RETURNING *",
-                subscription.user_id, subscription.plan_id, subscription.renewal_date, subscription.end_date, subscription.id
-            )
-            return Subscription(**row) if row else None
+        return await self.subscriptions.update(subscription.id, subscription)
 
     async def delete_subscription(self, id: UUID) -> bool:
+        return await self.subscriptions.delete(id)
+
+    # Billing summaries (see migrations 5 -> 6 and 7 -> 8)
+    async def get_billing_summary(self, user_id: int) -> UserBillingSummary | None:
+        """
+        :return: summary of the user; None if there is no such user
+        """
+        async with self.pool.acquire_read() as conn:
+            row = await registry.fetchrow(conn, 'subscriptions.user_billing_summary.get', user_id)
+        if row:
+            return UserBillingSummary(**row)
+        if await self.get_user(user_id):
+            return UserBillingSummary(user_id=user_id)  # no subscriptions / invoices yet
+        return None
+
+    async def refresh_billing_summaries(self, user_ids: list[int] | None = None):
+        """
+        Recomputes the summaries of the users (of all users if None); writes keep them up to date, but
+        `active_subscriptions` depends on the current date, and price changes of plans are not tracked,
+        so a full refresh should run daily. The summary rows are locked until it finishes, so writes of
+        the refreshed users wait for it.
+        """
         async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "DELETE FROM subscriptions WHERE id = $1 RETURNING id",
-                id
-            )
-            return bool(row)
+            await registry.execute(conn, 'subscriptions.user_billing_summary.refresh', user_ids)
+
+
+class Loaders:
+    """
+    Dataloaders of the repo (see common.dataloader): single-id lookups of one event-loop tick are fetched
+    in one query, e.g. the plans of a page of subscriptions:
+
+        plans = await loaders.plans.load_many(s.plan_id for s in subscriptions)
+    """
+
+    def __init__(self, repo: Repo):
+        self.users = DataLoader(by_key(repo.get_many_users))
+        self.plans = DataLoader(by_key(repo.get_many_plans))
+        self.invoices = DataLoader(by_key(repo.get_many_invoices))
+        self.extra_services = DataLoader(by_key(repo.get_many_extra_services))
+        self.subscriptions = DataLoader(by_key(repo.get_many_subscriptions))
+        self.invoices_of_subscription = DataLoader(repo.get_invoices_of_subscriptions)
 
 
 async def main():
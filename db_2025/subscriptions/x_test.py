@@ -1,4 +1,7 @@
+import asyncio
+
 import pytest
+import pytest_asyncio
 import asyncpg
 from datetime import date, datetime
 from decimal import Decimal
@@ -8,13 +11,16 @@ import os
 from dotenv import load_dotenv
 
 from repo import Repo
+from db_2025.subscriptions.billing import BillingEngine
 from db_2025.subscriptions.model import User, Plan, Invoice, ExtraService, Subscription
 
 # Load environment variables for database connection
 load_dotenv()
 
+pytestmark = pytest.mark.asyncio
 
-@pytest.fixture
+
+@pytest_asyncio.fixture
 async def db_pool():
     """Create a test database connection pool."""
     # You'll need to set up test database credentials in your .env file
@@ -26,17 +32,18 @@ async def db_pool():
     await pool.close()
 
 
-@pytest.fixture
+@pytest_asyncio.fixture
 async def repo(db_pool):
     """Create a repository instance with the test database pool."""
     return Repo(db_pool)
 
 
-@pytest.fixture
+@pytest_asyncio.fixture
 async def clean_db(db_pool):
     """Clean the database before each test."""
     async with db_pool.acquire() as conn:
         # Clean up all tables in reverse order to respect foreign key constraints
+        await conn.execute("DELETE FROM billing_runs")
         await conn.execute("DELETE FROM invoices")
         await conn.execute("DELETE FROM subscriptions")
         await conn.execute("DELETE FROM extra_services")
@@ -54,10 +61,11 @@ def sample_user():
 def sample_plan():
     """Create a sample plan for testing."""
     return Plan(
+        id=uuid4(),
         name="Basic Plan",
         price=Decimal("19.99"),
         payment_term_days=30,
-        billing_interval=30
+        billing_interval="1M"
     )
 
 
@@ -65,6 +73,7 @@ def sample_plan():
 def sample_extra_service():
     """Create a sample extra service for testing."""
     return ExtraService(
+        id=uuid4(),
         name="Premium Support",
         price=Decimal("9.99"),
         payment_term_days=7
@@ -266,6 +275,23 @@ class TestInvoiceOperations:
         assert all_invoices[0].issue_date == date(2023, 1, 10)
         assert all_invoices[1].issue_date == date(2023, 1, 1)
 
+    async def test_get_invoices_issued_between(self, repo, clean_db, sample_user, sample_extra_service):
+        """Test date-range reads of invoices (which read only the partitions of the range)."""
+        created_user = await repo.create_user(sample_user)
+        service = await repo.create_extra_service(sample_extra_service)
+        created = [
+            await repo.create_invoice(Invoice(id=uuid4(), is_paid=False, due_date=issue_date, issue_date=issue_date,
+                                              user_id=created_user.id, extra_service_id=service.id))
+            for issue_date in (date(2025, 1, 31), date(2025, 2, 1), date(2025, 3, 1))
+        ]
+
+        february = await repo.get_invoices_issued_between(date(2025, 2, 1), date(2025, 3, 1))
+        assert [i.id for i in february] == [created[1].id]
+
+        found = await repo.get_invoice(created[0].id, issue_date=date(2025, 1, 31))
+        assert found.id == created[0].id
+        assert await repo.get_invoice(created[0].id, issue_date=date(2025, 2, 1)) is None
+
 
 class TestExtraServiceOperations:
     """Test suite for ExtraService CRUD operations."""
@@ -340,6 +366,139 @@ class TestSubscriptionOperations:
         assert all_subscriptions[1].renewal_date == date(2023, 1, 1)
 
 
+class TestBatchLoading:
+    """Test suite for get_many_* and the dataloaders."""
+
+    async def test_get_many_plans(self, repo, clean_db):
+        """Test that get_many_plans returns the plans in the order of the ids, skipping unknown ones."""
+        plans = [
+            await repo.create_plan(Plan(id=uuid4(), name=f"Plan {i}", price=Decimal("9.99"), payment_term_days=30,
+                                        billing_interval="1M"))
+            for i in range(3)
+        ]
+        ids = [plans[2].id, uuid4(), plans[0].id, plans[2].id]
+
+        found = await repo.get_many_plans(ids)
+        assert [p.id for p in found] == [plans[2].id, plans[0].id]
+        assert await repo.get_many_plans([]) == []
+
+    async def test_loaders_batch_lookups(self, repo, clean_db, sample_user, sample_plan):
+        """Test that concurrent loads of one tick are fetched with one query."""
+        created_user = await repo.create_user(sample_user)
+        created_plan = await repo.create_plan(sample_plan)
+        loaders = repo.loaders()
+
+        results = await asyncio.gather(*(loaders.plans.load(created_plan.id) for _ in range(10)),
+                                       loaders.users.load(created_user.id), loaders.users.load(99999))
+        assert all(p.id == created_plan.id for p in results[:10])
+        assert results[10].id == created_user.id
+        assert results[11] is None
+        assert loaders.plans.batches == 1
+        assert loaders.users.batches == 1
+
+
+class TestBilling:
+    """Test suite for billing runs."""
+
+    async def test_billing_run_is_idempotent(self, repo, db_pool, clean_db, sample_user):
+        """Test that a billing run invoices due subscriptions once and advances their renewal date."""
+        created_user = await repo.create_user(sample_user)
+        plan = await repo.create_plan(Plan(id=uuid4(), name="Quarterly", price=Decimal("30.00"), payment_term_days=14,
+                                           billing_interval="3M"))
+        due = await repo.create_subscription(Subscription(id=uuid4(), user_id=created_user.id, plan_id=plan.id,
+                                                          renewal_date=date(2025, 1, 31), end_date=date(2026, 1, 1)))
+        not_due = await repo.create_subscription(Subscription(id=uuid4(), user_id=created_user.id, plan_id=plan.id,
+                                                              renewal_date=date(2025, 2, 1), end_date=date(2026, 1, 1)))
+        engine = BillingEngine(db_pool, chunk_size=1)
+
+        first = await engine.run(date(2025, 1, 31))
+        second = await engine.run(date(2025, 1, 31), force=True)
+
+        assert first.invoices == 1 and first.subscriptions == 1
+        assert second.invoices == 1  # nothing new
+        invoices = await repo.get_invoices_of_subscriptions([due.id, not_due.id])
+        assert [i.due_date for i in invoices[due.id]] == [date(2025, 2, 14)]
+        assert invoices[not_due.id] == []
+        assert (await repo.get_subscription(due.id)).renewal_date == date(2025, 4, 30)
+
+
+class TestReceivables:
+    """Test suite for the receivables queries."""
+
+    async def test_overdue_and_aging(self, repo, clean_db, sample_user, sample_extra_service):
+        """Test that only unpaid invoices past due are overdue, priced by their extra service."""
+        created_user = await repo.create_user(sample_user)
+        service = await repo.create_extra_service(sample_extra_service)
+        for due_date, is_paid in [(date(2025, 1, 1), False), (date(2024, 10, 1), False), (date(2024, 12, 1), True),
+                                  (date(2025, 3, 1), False)]:
+            await repo.create_invoice(Invoice(id=uuid4(), is_paid=is_paid, due_date=due_date,
+                                              issue_date=date(2024, 9, 1), user_id=created_user.id,
+                                              extra_service_id=service.id))
+        as_of = date(2025, 1, 11)
+
+        overdue = await repo.receivables.get_overdue_invoices(created_user.id, as_of)
+        assert [i.days_overdue for i in overdue] == [102, 10]
+        assert overdue[0].amount == float(sample_extra_service.price)
+
+        aging = {b.bucket: b.invoices for b in await repo.receivables.get_aging(as_of)}
+        assert aging == {'current': 1, '1-30': 1, '31-60': 0, '61-90': 0, '90+': 1}
+
+
+class TestBillingSummary:
+    """Test suite for the per-user billing summary."""
+
+    async def test_summary_follows_writes(self, repo, clean_db, sample_user, sample_plan):
+        """Test that writes of subscriptions and invoices update the summary of the user."""
+        created_user = await repo.create_user(sample_user)
+        created_plan = await repo.create_plan(sample_plan)
+        empty = await repo.get_billing_summary(created_user.id)
+        assert empty.active_subscriptions == 0 and empty.unpaid_total == 0
+
+        subscription = await repo.create_subscription(Subscription(id=uuid4(), user_id=created_user.id,
+                                                                   plan_id=created_plan.id,
+                                                                   renewal_date=date(2099, 1, 1),
+                                                                   end_date=date(2099, 12, 31)))
+        invoice = await repo.create_invoice(Invoice(id=uuid4(), is_paid=False, due_date=date.today(),
+                                                    issue_date=date.today(), user_id=created_user.id,
+                                                    subscription_id=subscription.id))
+        summary = await repo.get_billing_summary(created_user.id)
+        assert summary.active_subscriptions == 1
+        assert summary.next_renewal_date == date(2099, 1, 1)
+        assert summary.unpaid_invoices == 1
+        assert summary.unpaid_total == float(sample_plan.price)
+
+        invoice.is_paid = True
+        await repo.update_invoice(invoice)
+        summary = await repo.get_billing_summary(created_user.id)
+        assert summary.unpaid_invoices == 0 and summary.unpaid_total == 0
+
+    async def test_summary_of_unknown_user(self, repo, clean_db):
+        """Test that there is no summary of a non-existent user."""
+        assert await repo.get_billing_summary(99999) is None
+
+    async def test_concurrent_writes_are_not_lost(self, repo, db_pool, clean_db, sample_user, sample_extra_service):
+        """Test that invoices of one user added by two concurrent transactions both end up in the summary."""
+        created_user = await repo.create_user(sample_user)
+        service = await repo.create_extra_service(sample_extra_service)
+        insert = ("INSERT INTO invoices (is_paid, due_date, issue_date, user_id, extra_service_id) "
+                  "VALUES (false, $1, $1, $2, $3)")
+        async with db_pool.acquire() as first, db_pool.acquire() as second:
+            first_tx, second_tx = first.transaction(), second.transaction()
+            await first_tx.start()
+            await second_tx.start()
+            await first.execute(insert, date.today(), created_user.id, service.id)  # locks the summary row
+            second_insert = asyncio.create_task(second.execute(insert, date.today(), created_user.id, service.id))
+            await asyncio.sleep(0.2)
+            assert not second_insert.done()  # waits for the lock of the summary row
+            await first_tx.commit()
+            await second_insert
+            await second_tx.commit()
+
+        summary = await repo.get_billing_summary(created_user.id)
+        assert summary.unpaid_invoices == 2
+        assert summary.unpaid_total == 2 * float(sample_extra_service.price)
+
+
 class TestIntegrationScenarios:
     """Test suite for integration scenarios involving multiple entities."""
 
@@ -0,0 +1,122 @@
+import json
+from base64 import urlsafe_b64encode
+from datetime import date
+from uuid import UUID, uuid4
+
+import asyncpg
+import pytest
+
+from db_2025.common.cursor import decode_cursor, encode_cursor, fetch_page, keyset_query
+
+TYPES = (UUID, date.fromisoformat, int)
+
+
+def raw_cursor(payload: bytes) -> str:
+    return urlsafe_b64encode(payload).decode()
+
+
+class FakeConnection:
+    """Returns the given rows (already sorted and filtered, as Postgres would) and records the queries."""
+
+    def __init__(self, rows: list[dict], error: Exception | None = None):
+        self.rows = rows
+        self.error = error
+        self.queries = []
+
+    async def fetch(self, query, *args):
+        self.queries.append((query, args))
+        if self.error:
+            raise self.error
+        return self.rows[:args[0]]
+
+
+@pytest.mark.parametrize('key', [
+    (uuid4(), date(2025, 3, 1), 7),
+    (UUID(int=0), date(1, 1, 1), -2 ** 63),
+    (UUID(int=2 ** 128 - 1), date(9999, 12, 31), 2 ** 63 - 1),
+])
+def test_round_trip(key):
+    cursor = encode_cursor(*key)
+    assert cursor.isascii() and '+' not in cursor and '/' not in cursor  # safe in a URL query
+    assert decode_cursor(cursor, TYPES) == key
+
+
+@pytest.mark.parametrize('cursor', [
+    '',
+    'not base64!',
+    'WzFd=',  # bad padding
+    raw_cursor(b'\xff\xfe'),  # not UTF-8
+    raw_cursor(b'[1, 2'),  # not JSON
+    raw_cursor(b'{"id": 1}'),
+    raw_cursor(b'"abc"'),
+    raw_cursor(b'[]'),
+    raw_cursor(b'[1, 2]'),  # too few values
+    raw_cursor(b'[1, 2, 3, 4]'),  # too many values
+    raw_cursor(b'["not a uuid", "2025-03-01", 7]'),
+    raw_cursor(b'[12, "2025-03-01", 7]'),
+    raw_cursor(b'[null, "2025-03-01", 7]'),
+    raw_cursor(b'["00000000-0000-0000-0000-000000000000", "2025-02-30", 7]'),
+    raw_cursor(b'["00000000-0000-0000-0000-000000000000", 20250301, 7]'),
+    raw_cursor(b'["00000000-0000-0000-0000-000000000000", "2025-03-01", "seven"]'),
+    raw_cursor(b'["00000000-0000-0000-0000-000000000000", "2025-03-01", [7]]'),
+    raw_cursor(b'["00000000-0000-0000-0000-000000000000", "2025-03-01", 1e999]'),
+    raw_cursor(b'["00000000-0000-0000-0000-000000000000", "2025-03-01", NaN]'),
+])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError, match='invalid cursor'):
+        decode_cursor(cursor, TYPES)
+
+
+def test_tampered_cursor():
+    cursor = encode_cursor(UUID(int=1), date(2025, 3, 1), 7)
+    for i in range(len(cursor)):
+        for c in 'A_-=':
+            tampered = cursor[:i] + c + cursor[i + 1:]
+            try:
+                key = decode_cursor(tampered, TYPES)
+            except ValueError:
+                continue
+            assert len(key) == 3  # decoded to some other key, of the right types
+            assert [type(v) for v in key] == [UUID, date, int]
+
+
+def test_keyset_query():
+    assert keyset_query('t', ('a', 'id'), after=False) == 'SELECT * FROM t ORDER BY a, id LIMIT $1'
+    assert keyset_query('t', ('a', 'b', 'id'), after=True) == \
+        'SELECT * FROM t WHERE a >= $2 AND (a, b, id) > ($2, $3, $4) ORDER BY a, b, id LIMIT $1'
+    assert keyset_query('s.t', ('a', 'id'), after=True, descending=True) == \
+        'SELECT * FROM s.t WHERE a <= $2 AND (a, id) < ($2, $3) ORDER BY a DESC, id DESC LIMIT $1'
+
+
+@pytest.mark.asyncio
+async def test_fetch_page():
+    rows = [{'day': date(2025, 3, d), 'id': d} for d in range(1, 6)]
+    conn = FakeConnection(rows)
+    page, next_cursor = await fetch_page(conn, 't', ('day', 'id'), (date.fromisoformat, int), limit=3)
+    assert page == rows[:3]
+    assert decode_cursor(next_cursor, (date.fromisoformat, int)) == (date(2025, 3, 3), 3)
+    assert conn.queries[-1] == (keyset_query('t', ('day', 'id'), after=False), (4,))
+
+    conn.rows = rows[3:]
+    page, next_cursor = await fetch_page(conn, 't', ('day', 'id'), (date.fromisoformat, int), 3, next_cursor)
+    assert page == rows[3:]
+    assert next_cursor is None
+    assert conn.queries[-1] == (keyset_query('t', ('day', 'id'), after=True), (4, date(2025, 3, 3), 3))
+
+
+@pytest.mark.asyncio
+async def test_fetch_page_rejects_bad_cursor():
+    conn = FakeConnection([])
+    with pytest.raises(ValueError, match='invalid cursor'):
+        await fetch_page(conn, 't', ('name', 'id'), (str, int), 10, raw_cursor(b'["x"]'))
+    assert conn.queries == []  # rejected before any query
+
+    # decodes, but Postgres rejects the value (the API maps ValueError to 400, not 500)
+    conn = FakeConnection([], error=asyncpg.CharacterNotInRepertoireError('invalid byte sequence'))
+    cursor = raw_cursor(json.dumps(['a\x00b', 1]).encode())
+    with pytest.raises(ValueError, match='invalid cursor'):
+        await fetch_page(conn, 't', ('name', 'id'), (str, int), 10, cursor)
+
+    # without a cursor the error is not about the cursor
+    with pytest.raises(asyncpg.CharacterNotInRepertoireError):
+        await fetch_page(conn, 't', ('name', 'id'), (str, int), 10)
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+
+import db_2025.common.db
+from db_2025.common.db import InstrumentedPool, PoolRouter, PoolSettings
+
+
+class FakePool:
+    """asyncpg pool stand-in: `size` connections; closing it while any is in use is an error."""
+
+    def __init__(self, size: int):
+        self.free = asyncio.Queue()
+        for i in range(size):
+            self.free.put_nowait(f'conn-{id(self)}-{i}')
+        self.size = size
+        self.closed = False
+
+    async def acquire(self, *, timeout=None):
+        assert not self.closed
+        return await asyncio.wait_for(self.free.get(), timeout)
+
+    async def release(self, conn, *, timeout=None):
+        assert not self.closed
+        self.free.put_nowait(conn)
+
+    async def close(self):
+        assert self.free.qsize() == self.size, 'closed with connections in use'
+        self.closed = True
+
+    def get_size(self):
+        return self.size
+
+    def get_idle_size(self):
+        return self.free.qsize()
+
+
+def instrumented(size: int = 2, name: str = 'default') -> InstrumentedPool:
+    return InstrumentedPool(FakePool(size), 'fake://', PoolSettings(min_size=1, max_size=size), name)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    async def create_pool(db_url, settings):
+        return FakePool(settings.max_size)
+
+    monkeypatch.setattr(db_2025.common.db, '_create_pool', create_pool)
+    pool = instrumented()
+    yield pool
+    db_2025.common.db._pools.remove(pool)
+
+
+@pytest.mark.asyncio
+async def test_resize_drains_old_pool(pool):
+    old = pool.pool
+    held = pool.acquire()
+    conn = await held.__aenter__()
+    detached = await pool.acquire()
+    created_before = pool.acquire()  # created before the resize, entered after it
+
+    resize = asyncio.create_task(pool.resize(max_size=4))
+    await asyncio.sleep(0.01)
+    assert pool.pool is not old and pool.settings.max_size == 4
+    assert not resize.done() and not old.closed  # waiting for the connections in use
+
+    async with created_before as c:
+        assert c not in (conn, detached)
+        assert created_before.pool is pool.pool
+
+    await held.__aexit__(None, None, None)
+    await asyncio.sleep(0.01)
+    assert not old.closed
+
+    await pool.release(detached)
+    await asyncio.wait_for(resize, 1)
+    assert old.closed
+    assert pool.in_use == 0 and pool._checked_out == {}
+
+
+@pytest.mark.asyncio
+async def test_resize_waits_for_queued_acquires(pool):
+    old = pool.pool
+    holders = [pool.acquire() for _ in range(2)]
+    conns = [await h.__aenter__() for h in holders]
+
+    async def use_connection():
+        async with pool.acquire() as c:  # queued in the old pool: both its connections are in use
+            await asyncio.sleep(0.01)
+            return c
+
+    queued = asyncio.create_task(use_connection())
+    await asyncio.sleep(0.01)
+    resize = asyncio.create_task(pool.resize(max_size=4))
+    await asyncio.sleep(0.01)
+
+    await holders[0].__aexit__(None, None, None)  # goes to the queued task, not closed under it
+    assert await asyncio.wait_for(queued, 1) == conns[0]
+    assert not old.closed
+
+    await holders[1].__aexit__(None, None, None)
+    await asyncio.wait_for(resize, 1)
+    assert old.closed
+
+
+@pytest.mark.asyncio
+async def test_resize_idle_pool_closes_at_once(pool):
+    old = pool.pool
+    async with pool.acquire():
+        pass
+    with pytest.raises(asyncio.TimeoutError):
+        async with pool.acquire(timeout=0.01), pool.acquire(timeout=0.01), pool.acquire(timeout=0.01):
+            pass
+    assert pool.timeouts == 1 and pool._checked_out == {}
+
+    await asyncio.wait_for(pool.resize(max_size=3), 1)
+    assert old.closed and pool.pool.get_size() == 3
+
+
+@pytest.fixture
+def router():
+    router = PoolRouter(instrumented(), instrumented(name='replica'), read_your_writes_s=0.05)
+    yield router
+    for p in (router.primary, router.replica):
+        db_2025.common.db._pools.remove(p)
+
+
+async def read_from(router: PoolRouter) -> str:
+    async with router.acquire_read() as conn:
+        return 'primary' if conn.startswith(f'conn-{id(router.primary.pool)}') else 'replica'
+
+
+@pytest.mark.asyncio
+async def test_router_reads_after_long_write(router):
+    assert await read_from(router) == 'replica'
+    async with router.acquire():
+        await asyncio.sleep(0.1)  # a write longer than read_your_writes_s
+    assert await read_from(router) == 'primary'  # counted from the end of the write
+    await asyncio.sleep(0.1)
+    assert await read_from(router) == 'replica'
+
+
+@pytest.mark.asyncio
+async def test_router_primary_read_is_not_a_write(router):
+    async with router.acquire_primary_read() as conn:
+        assert conn.startswith(f'conn-{id(router.primary.pool)}')
+    assert await read_from(router) == 'replica'
+
+
+@pytest.mark.asyncio
+async def test_router_write_is_task_local(router):
+    async def write():
+        async with router.acquire():
+            pass
+
+    await asyncio.create_task(write())
+    assert await read_from(router) == 'replica'  # another task's write
+    await write()
+    assert await read_from(router) == 'primary'
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from db_2025.sentence_vault.ngram_index import NgramIndex, np
+
+BUILDERS = [False] + ([True] if np is not None else [])
+
+
+def brute_force(substring: str, rows: list[tuple[int, str]]) -> list[int]:
+    needle = substring.lower()
+    return sorted({row_id for row_id, text in rows if needle in text.lower()})
+
+
+def matching(index: NgramIndex, substring: str, rows: list[tuple[int, str]]) -> list[int]:
+    texts = {}
+    for row_id, text in rows:
+        texts.setdefault(row_id, []).append(text.lower())
+    needle = substring.lower()
+    return [row_id for row_id in index.candidates(substring) if any(needle in t for t in texts[row_id])]
+
+
+@pytest.mark.parametrize('vectorized', BUILDERS)
+def test_unsorted_and_repeated_rows(tmp_path, vectorized):
+    rows = [(5, 'abc'), (1, 'abc xyz'), (5, 'abc')]
+    with NgramIndex.build(rows, str(tmp_path / 'idx'), vectorized=vectorized) as index:
+        assert index.candidates('abc') == [1, 5]
+        assert index.candidates('xyz') == [1]
+
+
+@pytest.mark.parametrize('vectorized', BUILDERS)
+def test_repeated_row_in_order(tmp_path, vectorized):
+    rows = [(1, 'abcd'), (2, 'abc'), (2, 'xabc')]
+    with NgramIndex.build(rows, str(tmp_path / 'idx'), vectorized=vectorized) as index:
+        assert index.candidates('abc') == [1, 2]
+
+
+@pytest.mark.parametrize('vectorized', BUILDERS)
+@pytest.mark.parametrize('n', [2, 3])
+def test_matches_brute_force(tmp_path, vectorized, n):
+    rnd = random.Random(n)
+    words = ['ala', 'ma', 'kota', 'Kot', 'ma', 'ale', 'żółw', 'abc', 'bca']
+    rows = [(rnd.randrange(200), ' '.join(rnd.choices(words, k=rnd.randint(0, 6)))) for _ in range(500)]
+    with NgramIndex.build(rows, str(tmp_path / 'idx'), n=n, vectorized=vectorized) as index:
+        for query in ['ala', 'kot', 'ma ', 'a m', 'żółw', 'bca', 'xyz', 'abc bca']:
+            candidates = index.candidates(query)
+            assert candidates == sorted(set(candidates))
+            assert matching(index, query, rows) == brute_force(query, rows)
@@ -0,0 +1,65 @@
+import types
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID, uuid4
+
+import pytest
+
+import db_2025.ai_proxy.repositories
+import db_2025.basics.user_repo
+import db_2025.common.repository
+import db_2025.sentence_vault.repo
+import db_2025.subscriptions.repo
+import db_2025.u2.repositories
+from db_2025.common.repository import CrudRepository, RowMapper
+from db_2025.sentence_vault.model import Book, Sentence, SentenceWords, Word
+
+# values as asyncpg returns them (NUMERIC columns of float fields come as Decimal)
+DB_VALUES = {str: 'abc', int: 7, bool: True, float: Decimal('19.99'), UUID: uuid4(), date: date(2025, 3, 1),
+             datetime: datetime(2025, 3, 1, 12, 30), bytes: b'\x00\x01'}
+
+
+def repo_models() -> list[type]:
+    models = {repo.model for repo in CrudRepository.__subclasses__()}
+    return sorted(models | {Book, Sentence, Word, SentenceWords}, key=lambda m: f'{m.__module__}.{m.__name__}')
+
+
+def sample_row(model, nulls: bool = False) -> dict:
+    row = {}
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        if isinstance(annotation, types.UnionType):
+            if nulls:
+                row[name] = None
+                continue
+            annotation = next(a for a in annotation.__args__ if a is not type(None))
+        row[name] = DB_VALUES[annotation]
+    return row
+
+
+@pytest.mark.parametrize('model', repo_models(), ids=lambda m: f'{m.__module__}.{m.__name__}')
+@pytest.mark.parametrize('nulls', [False, True])
+def test_row_mapper_matches_validation(model, nulls):
+    mapper = RowMapper(model, validate=False)
+    row = sample_row(model, nulls)
+    expected = model(**row)
+
+    for obj in (mapper(row), mapper.many([row])[0]):
+        assert type(obj) is model
+        assert obj == expected
+        assert obj.model_dump() == expected.model_dump()
+        assert obj.model_fields_set == expected.model_fields_set
+        assert obj.model_dump_json() == expected.model_dump_json()
+        assert obj.model_copy(update={}) == expected
+
+
+def test_row_mapper_validates_other_columns():
+    mapper = RowMapper(Word, validate=False)
+    with pytest.raises(ValueError):
+        mapper({'id': 1, 'word': 'go'})
+
+
+def test_row_mapper_fallback_construct(monkeypatch):
+    monkeypatch.setattr(db_2025.common.repository, '_KNOWN_LAYOUT', False)
+    row = sample_row(Sentence)
+    assert RowMapper(Sentence, validate=False)(row) == Sentence(**row)
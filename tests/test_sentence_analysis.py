@@ -0,0 +1,58 @@
+import random
+
+import pytest
+from nltk.tokenize.punkt import PunktSentenceTokenizer
+
+from db_2025.sentence_vault import sentence_analysis
+from db_2025.sentence_vault.sentence_analysis import extract_sentences, iter_sentences
+
+WORDS = ['the', 'cat', 'sat', 'on', 'a', 'mat', 'Mr.', 'Smith', 'said', 'no', 'e.g.', 'U.S.', '3.14', 'why']
+ENDINGS = ['.', '!', '?', '...', '."', '?!']
+
+
+@pytest.fixture(autouse=True)
+def tokenizer(monkeypatch):
+    # a fixed (untrained) Punkt model, the same for both functions: the test does not depend on downloaded nltk data
+    punkt = PunktSentenceTokenizer()
+    monkeypatch.setattr(sentence_analysis, '_get_sentence_tokenizer', lambda: punkt)
+    monkeypatch.setattr(sentence_analysis.nltk, 'sent_tokenize', punkt.tokenize)
+
+
+def book_text(n_sentences: int, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    sentences = []
+    for _ in range(n_sentences):
+        words = rnd.choices(WORDS, k=rnd.randint(1, 15))
+        sentences.append(' '.join(words).capitalize() + rnd.choice(ENDINGS))
+    separators = [' ', '  ', '\n', '\n\n', ' \t ']
+    return ''.join(s + rnd.choice(separators) for s in sentences)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 1000, 2 ** 20])
+def test_same_sentences_as_extract_sentences(tmp_path, chunk_size):
+    path = tmp_path / 'book.txt'
+    path.write_text('\n  ' + book_text(500), encoding='utf-8')
+    assert list(iter_sentences(str(path), chunk_size=chunk_size)) == extract_sentences(str(path))
+
+
+@pytest.mark.parametrize('chunk_size', [64, 1000])
+def test_text_without_sentence_boundaries(tmp_path, chunk_size):
+    rnd = random.Random(1)
+    text = ' '.join(rnd.choices(['alpha', 'beta', 'gamma', 'delta'], k=20_000))
+    path = tmp_path / 'no_boundaries.txt'
+    path.write_text(text, encoding='utf-8')
+
+    parts = list(iter_sentences(str(path), chunk_size=chunk_size, max_sentence=500))
+    assert len(parts) > 1
+    assert all(len(p) <= 500 + chunk_size for p in parts)
+    assert ' '.join(parts) == text  # cut at spaces only, nothing lost
+
+
+def test_long_run_then_normal_sentences(tmp_path):
+    run = ' '.join(['word'] * 1000)
+    path = tmp_path / 'mixed.txt'
+    path.write_text(f'{run}. Then a short sentence. And another one!', encoding='utf-8')
+
+    parts = list(iter_sentences(str(path), chunk_size=100, max_sentence=300))
+    assert parts[-2:] == ['Then a short sentence.', 'And another one!']
+    assert ' '.join(parts[:-2]) == f'{run}.'
@@ -0,0 +1,33 @@
+import pytest
+
+from db_2025.sentence_vault.sentence_dedup import SentenceBloomFilter
+
+
+def sentences(prefix: str, n: int) -> list[str]:
+    return [f'{prefix} sentence number {i}.' for i in range(n)]
+
+
+@pytest.mark.parametrize('fp_rate', [0.01, 0.001])
+def test_no_false_negatives(fp_rate):
+    bloom = SentenceBloomFilter(capacity=20_000, fp_rate=fp_rate)
+    added = sentences('Added', 20_000)
+    for s in added:
+        bloom.add(s)
+    assert bloom.n_items == len(added)
+    assert all(bloom.might_contain(s) for s in added)
+    assert all(bloom.might_contain_digest(SentenceBloomFilter.digest(s)) for s in added)
+
+
+@pytest.mark.parametrize('fp_rate', [0.01, 0.001])
+def test_false_positive_rate(fp_rate):
+    bloom = SentenceBloomFilter(capacity=20_000, fp_rate=fp_rate)
+    for s in sentences('Added', 20_000):  # filled to capacity
+        bloom.add(s)
+    probes = sentences('Other', 200_000)
+    measured = sum(bloom.might_contain(s) for s in probes) / len(probes)
+    assert 0.5 * fp_rate <= measured <= 1.5 * fp_rate
+
+
+def test_empty_filter_contains_nothing():
+    bloom = SentenceBloomFilter(capacity=1000)
+    assert not any(bloom.might_contain(s) for s in sentences('Any', 1000))